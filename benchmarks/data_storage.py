@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Logs a simulated 60 s dyad tracking trial as tab separated text and as
+# compressed columns with every installed codec, then reports the bytes per
+# tick and the CPU time of the task thread and of the whole process. The
+# column files are checked against the text file.
+#
+#   python benchmarks/data_storage.py [seconds]
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+
+from asymsliderexperiment import DyadAsymForceTrackingTask  # noqa: E402
+
+from multiagentexperiment import \
+    PDTrackerAgent, \
+    SimulatedParticipant, \
+    available_codecs, \
+    load_compressed_columns  # noqa: E402
+
+
+TIMESTEP_S = 1.0 / 70.0
+
+
+def run_trial(folder, data_format, duration_s):
+    # the same reference trajectory for every run
+    np.random.seed(0)
+    params = {"k": 5.0,
+              "p1_push": 1.0, "p1_pull": 1.0,
+              "p2_push": 1.0, "p2_pull": 1.0}
+    task = DyadAsymForceTrackingTask(data_format, TIMESTEP_S, folder,
+                                     duration_s, parameters=params)
+    if data_format != "tsv":
+        task.data_format = "columns"
+        task.data_codec = data_format
+    agent = PDTrackerAgent(TIMESTEP_S, slots=2, seed=0)
+    for slot, role in enumerate(task.roles):
+        role.assign(SimulatedParticipant("p%d" % slot, agent, slot))
+
+    process_start = time.process_time()
+    thread_start = time.thread_time()
+    task.start()
+    ticks = 0
+    while task.step(task.time) != task.TASK_COMPLETED:
+        ticks += 1
+    thread_s = time.thread_time() - thread_start
+    task.close()
+    process_s = time.process_time() - process_start
+    return task, ticks + 1, thread_s, process_s
+
+
+if __name__ == "__main__":
+
+    duration_s = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    folder = tempfile.mkdtemp()
+
+    results = []
+    for data_format in ["tsv"] + available_codecs():
+        task, ticks, thread_s, process_s = run_trial(folder, data_format,
+                                                     duration_s)
+        filename = task.filename + ("" if data_format == "tsv"
+                                    else ".maecol")
+        size = os.path.getsize(filename)
+        print("%-5s %8d bytes %7.1f bytes/tick  task thread %6.1f us/tick"
+              "  process %6.1f us/tick"
+              % (data_format, size, size / ticks, thread_s / ticks * 1e6,
+                 process_s / ticks * 1e6))
+        results.append((data_format, filename))
+
+    # the text file starts with the name and parameter lines
+    text = np.genfromtxt(results[0][1], delimiter='\t', names=True,
+                         skip_header=len(task.parameters))
+    for data_format, filename in results[1:]:
+        header, columns = load_compressed_columns(filename)
+        for field in header["fields"]:
+            if not np.array_equal(columns[field], text[field], equal_nan=True):
+                print(data_format, "column", field, "differs from text")
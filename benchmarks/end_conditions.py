@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Reports the time per tick to evaluate growing numbers of end conditions by
+# polling their check(), and with a ConditionMonitor evaluating them one by
+# one and vectorized. Half of the conditions are position thresholds and half
+# in range durations, watching eight moving objects.
+#
+#   python benchmarks/end_conditions.py [ticks]
+
+import sys
+import time
+
+import numpy as np
+
+from multiagentexperiment import \
+    DynamicObject, \
+    InRangeForDuration, \
+    PositionThreshold
+from multiagentexperiment.conditionmonitor import ConditionMonitor
+
+
+TIMESTEP_S = 1.0 / 70.0
+COUNTS = [2, 8, 32, 64, 128, 256, 384, 512]
+
+
+def build_conditions(count):
+    rng = np.random.default_rng(0)
+    objects = [DynamicObject("obj%d" % ndx, 1.0) for ndx in range(8)]
+    conditions = []
+    for ndx in range(count):
+        target = objects[ndx % len(objects)]
+        if ndx % 2 == 0:
+            conditions.append(PositionThreshold(target, rng.uniform(-1.0, 1.0),
+                                                check_greater=ndx % 4 == 0))
+        else:
+            conditions.append(InRangeForDuration(target, 0.5, -0.5,
+                                                 duration_s=0.5))
+    return objects, conditions
+
+
+def time_ticks(objects, evaluate, ticks):
+    elapsed_s = 0.0
+    tasktime = 0.0
+    for tick in range(ticks):
+        for ndx, obj in enumerate(objects):
+            obj.state[0] = float(np.sin(tick * 0.01 * (ndx + 1)))
+        tasktime += TIMESTEP_S
+        start = time.perf_counter()
+        evaluate(tasktime)
+        elapsed_s += time.perf_counter() - start
+    return elapsed_s / ticks
+
+
+if __name__ == "__main__":
+
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    for count in COUNTS:
+        objects, conditions = build_conditions(count)
+        scalar = ConditionMonitor(conditions, vectorize_threshold=count + 1)
+        vectorized = ConditionMonitor(conditions, vectorize_threshold=0)
+
+        def poll(tasktime):
+            return [condition.check(TIMESTEP_S) for condition in conditions]
+
+        results = [time_ticks(objects, evaluate, ticks) for evaluate in
+                   [poll,
+                    lambda tasktime: scalar.update(tasktime, TIMESTEP_S),
+                    lambda tasktime: vectorized.update(tasktime, TIMESTEP_S)]]
+        print("%4d conditions  poll %7.2f us  scalar %7.2f us"
+              "  vectorized %7.2f us per tick"
+              % ((count,) + tuple(result * 1e6 for result in results)))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Runs the 1 kHz falcon io loop against SimulatedFalcon devices while a task
+# thread commands forces at the task rate, then reports loop period jitter and
+# the force loop latency. Needs no hardware or display.
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from multiagentexperiment import \
+    Clock, \
+    FalconHapticHandle, \
+    LatencyTracer, \
+    SimulatedFalcon, \
+    StochasticHand, \
+    load_haptic_recording
+
+
+DURATION_S = 5.0
+TASK_TIMESTEP_S = 1.0 / 70.0
+HANDLES = 2
+
+
+def simulated_device(timestep_s, device_num):
+    return SimulatedFalcon(timestep_s, device_num,
+                           hand=StochasticHand(seed=device_num))
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        DURATION_S = float(sys.argv[1])
+
+    clock = Clock()
+    tracer = LatencyTracer(clock)
+    folder = tempfile.mkdtemp()
+
+    handles = []
+    for device_num in range(HANDLES):
+        handle = FalconHapticHandle(device_num, serial="default",
+                                    device_factory=simulated_device)
+        handle.start_tracing(clock, tracer)
+        handle.start_recording(os.path.join(folder,
+                                            "handle%d.bin" % device_num))
+        handles.append(handle)
+
+    tick = 0
+    while clock.now() < DURATION_S:
+        for handle in handles:
+            sample_time, state = handle.get_sample()
+            handle.update_force(-5.0 * state[0] - 0.5 * state[1], sample_time)
+        tick += 1
+        time.sleep(max(0.0, (tick * TASK_TIMESTEP_S) - clock.now()))
+
+    for handle in handles:
+        handle.shutdown()
+
+    for device_num, handle in enumerate(handles):
+        header, samples = load_haptic_recording(handle.recorder.filename)
+        periods_ms = np.diff(samples["time"]) * 1000
+        print("handle %d: %d samples, %.1f Hz, period p50 %.3f ms,"
+              " p99 %.3f ms, max %.3f ms, dropped %d"
+              % (device_num, len(samples),
+                 len(samples) / (samples["time"][-1] - samples["time"][0]),
+                 np.percentile(periods_ms, 50),
+                 np.percentile(periods_ms, 99),
+                 np.max(periods_ms),
+                 handle.recorder.dropped))
+
+    summary = tracer.histograms["force_loop"].summary()
+    print("force loop: %d spans, mean %.3f ms, p99 %.3f ms"
+          % (summary["count"], summary["mean_s"] * 1000,
+             summary["p99_s"] * 1000))
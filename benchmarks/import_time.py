@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# Measures how long a fresh interpreter takes to import the package and
+# fails if the import pulled in the rendering or hardware backends.
+# Run with the package installed (pip install -e .).
+
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ["pyglet", "falcon_c"]
+REPEATS = 10
+BUDGET_S = 0.5
+
+PROBE = """
+import sys
+import time
+start = time.perf_counter()
+import multiagentexperiment
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy!r}
+          if any(m == name or m.startswith(name + ".") for m in sys.modules)]
+print(elapsed, ",".join(loaded))
+"""
+
+
+def measure():
+    result = subprocess.run([sys.executable, "-c",
+                             PROBE.format(heavy=HEAVY_MODULES)],
+                            check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+    elapsed, loaded = result.stdout.strip().partition(" ")[::2]
+    return float(elapsed), [name for name in loaded.split(",") if name]
+
+
+if __name__ == "__main__":
+
+    times = []
+    for repeat in range(REPEATS):
+        elapsed, loaded = measure()
+        if loaded:
+            print("importing multiagentexperiment loaded:", ", ".join(loaded))
+            sys.exit(1)
+        times.append(elapsed)
+
+    times.sort()
+    print("import multiagentexperiment: median %.1f ms, max %.1f ms"
+          % (times[len(times) // 2] * 1000, times[-1] * 1000))
+
+    if times[len(times) // 2] > BUDGET_S:
+        print("median import time exceeds budget of %.0f ms" % (BUDGET_S * 1000))
+        sys.exit(1)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Reports the memory footprint per instance of the dynamic object, constraint
+# and condition classes, and the construction time and memory of a whole
+# dyad tracking task.
+#
+#   python benchmarks/object_memory.py [instances]
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+
+from asymsliderexperiment import DyadAsymForceTrackingTask  # noqa: E402
+
+from multiagentexperiment import \
+    BindPosition, \
+    CompressionSpring, \
+    ConditionOR, \
+    Damping, \
+    DynamicObject, \
+    InRangeForDuration, \
+    PositionLimits, \
+    PositionThreshold, \
+    SpringLawSolid, \
+    TensionSpring  # noqa: E402
+
+
+TIMESTEP_S = 1.0 / 70.0
+
+target = DynamicObject("target", 1.0, initial_state=[0.0, 0.0, 0.0])
+reference = DynamicObject("reference", 1.0, initial_state=[0.0, 0.0, 0.0])
+threshold = PositionThreshold(target, 0.5)
+
+FACTORIES = [
+    ("DynamicObject",
+     lambda: DynamicObject("obj", 1.0, initial_state=[0.0, 0.0, 0.0])),
+    ("Damping", lambda: Damping(1.0, target)),
+    ("CompressionSpring",
+     lambda: CompressionSpring(target, reference, 100.0, 0.1)),
+    ("TensionSpring", lambda: TensionSpring(target, reference, 100.0, 0.1)),
+    ("BindPosition", lambda: BindPosition(target, reference)),
+    ("PositionLimits", lambda: PositionLimits(target, 1.0, -1.0)),
+    ("SpringLawSolid", lambda: SpringLawSolid(target, reference, 100.0, 0.1)),
+    ("PositionThreshold", lambda: PositionThreshold(target, 0.5)),
+    ("InRangeForDuration", lambda: InRangeForDuration(target, 0.1, -0.1)),
+    ("ConditionOR", lambda: ConditionOR([threshold, threshold])),
+]
+
+
+def measure(factory, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    instances = [factory() for _ in range(count)]
+    elapsed_s = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the list holding the instances is not part of their footprint
+    size -= sys.getsizeof(instances)
+    return size / count, elapsed_s / count
+
+
+def dyad_task():
+    params = {"k": 5.0,
+              "p1_push": 1.0, "p1_pull": 1.0,
+              "p2_push": 1.0, "p2_pull": 1.0}
+    return DyadAsymForceTrackingTask("dyad", TIMESTEP_S, None, 60.0,
+                                     parameters=params)
+
+
+if __name__ == "__main__":
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for name, factory in FACTORIES:
+        size, elapsed_s = measure(factory, count)
+        print("%-20s %6.0f bytes %6.2f us per instance"
+              % (name, size, elapsed_s * 1e6))
+
+    tasks = max(count // 1000, 10)
+    size, elapsed_s = measure(dyad_task, tasks)
+    print("%-20s %6.0f bytes %6.2f us per task" % ("dyad task", size,
+                                                   elapsed_s * 1e6))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Replays the visible states of a simulated dyad tracking trial through
+# HumanFalconParticipant.on_draw in an invisible window and reports the frame
+# timing. Pass --headless to render through EGL without a display server.
+#
+#   python benchmarks/render_replay.py [--headless] [seconds]
+
+import copy
+import os
+import sys
+
+import pyglet
+
+pyglet.options["headless"] = "--headless" in sys.argv
+pyglet.options["vsync"] = False
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+
+from asymsliderexperiment import DyadAsymForceTrackingTask  # noqa: E402
+
+from multiagentexperiment import \
+    Handle, \
+    HumanFalconParticipant, \
+    PDTrackerAgent, \
+    SimulatedParticipant  # noqa: E402
+
+
+TIMESTEP_S = 1.0 / 70.0
+
+
+class RecordingParticipant(SimulatedParticipant):
+
+    def __init__(self, name, agent, slot=0):
+        super().__init__(name, agent, slot)
+        self.messages = []
+
+    def receive_visible_state(self, message):
+        # the decoder updates the scene it was sent in place
+        self.messages.append(copy.deepcopy(message))
+        return super().receive_visible_state(message)
+
+
+def record_trial(duration_s):
+    params = {"k": 5.0,
+              "p1_push": 1.0, "p1_pull": 1.0,
+              "p2_push": 1.0, "p2_pull": 1.0}
+    task = DyadAsymForceTrackingTask("replay", TIMESTEP_S, None, duration_s,
+                                     parameters=params)
+    agent = PDTrackerAgent(TIMESTEP_S, slots=2, seed=0)
+    participants = [RecordingParticipant("p1", agent, 0),
+                    RecordingParticipant("p2", agent, 1)]
+    for role, participant in zip(task.roles, participants):
+        role.assign(participant)
+
+    task.start()
+    while task.step(task.time) != task.TASK_COMPLETED:
+        pass
+    task.close()
+    return participants[0].messages
+
+
+if __name__ == "__main__":
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    duration_s = float(args[0]) if args else 20.0
+
+    messages = record_trial(duration_s)
+
+    window = pyglet.window.Window(1920, 1080, visible=False)
+    renderer = HumanFalconParticipant("replay", TIMESTEP_S, 0,
+                                      handle=Handle(), window=window)
+    # an invisible window never receives a resize event, set up the
+    # projection the event loop would
+    window.switch_to()
+    window.on_resize(*window.get_size())
+    for message in messages:
+        renderer.receive_visible_state(message)
+        window.switch_to()
+        window.dispatch_events()
+        renderer.on_draw()
+        renderer.flip()
+    renderer.shutdown()
+
+    summary = renderer.frame_log.summary()
+    print("frames:", summary["frames"])
+    for name in ["draw", "swap"]:
+        print("%s: mean %.3f ms, p50 %.3f ms, p99 %.3f ms, max %.3f ms"
+              % (name,
+                 summary[name]["mean_s"] * 1000,
+                 summary[name]["p50_s"] * 1000,
+                 summary[name]["p99_s"] * 1000,
+                 summary[name]["max_s"] * 1000))
+    print("frame budget at %.0f Hz: %.1f ms"
+          % (1.0 / TIMESTEP_S, TIMESTEP_S * 1000))
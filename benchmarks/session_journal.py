@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Runs a simulated dyad tracking trial in real time with and without the
+# session journal and compares the task tick latency, then reports the cost
+# of the journal syncs and checks that the journal reads back.
+#
+#   python benchmarks/session_journal.py [seconds]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+
+from asymsliderexperiment import DyadAsymForceTrackingTask  # noqa: E402
+
+from multiagentexperiment import \
+    MultiAgentExperiment, \
+    PDTrackerAgent, \
+    SimulatedParticipant, \
+    load_session_journal, \
+    resume_trial_index  # noqa: E402
+
+
+TIMESTEP_S = 1.0 / 70.0
+
+
+class SimulatedDyadExperiment(MultiAgentExperiment):
+
+    def __init__(self, duration_s, journal_sync_interval_s):
+        super().__init__("JournalBench",
+                         record_participants=False,
+                         journal_sync_interval_s=journal_sync_interval_s)
+
+        params = {"k": 5.0,
+                  "p1_push": 1.0, "p1_pull": 1.0,
+                  "p2_push": 1.0, "p2_pull": 1.0}
+        self.procedure.append([DyadAsymForceTrackingTask("1-dyad",
+                                                         TIMESTEP_S,
+                                                         self.datafolder,
+                                                         duration_s,
+                                                         parameters=params)])
+
+        agent = PDTrackerAgent(TIMESTEP_S, slots=2, seed=0)
+        self.participants.append(SimulatedParticipant("p1", agent, 0))
+        self.participants.append(SimulatedParticipant("p2", agent, 1))
+        self.done = False
+
+    def completed(self):
+        super().completed()
+        self.done = True
+
+
+def run(duration_s, journal_sync_interval_s):
+    experiment = SimulatedDyadExperiment(duration_s, journal_sync_interval_s)
+    experiment.assign(verbose=False)
+
+    start = time.perf_counter()
+    tick = 0
+    while not experiment.done:
+        experiment.step(TIMESTEP_S)
+        tick += 1
+        time.sleep(max(0.0, start + tick * TIMESTEP_S - time.perf_counter()))
+    return experiment
+
+
+def report(label, histogram):
+    summary = histogram.summary()
+    print("%-22s %6d spans, mean %.3f ms, p99 %.3f ms, max %.3f ms"
+          % (label, summary["count"], summary["mean_s"] * 1000,
+             summary["p99_s"] * 1000, summary["max_s"] * 1000))
+
+
+if __name__ == "__main__":
+
+    duration_s = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+
+    os.chdir(tempfile.mkdtemp())
+    os.mkdir("data")
+
+    plain = run(duration_s, None)
+    # the data folder name has a resolution of one second
+    time.sleep(1.0)
+    journaled = run(duration_s, 0.25)
+
+    report("tick without journal", plain.tracer.histograms["task_tick"])
+    report("tick with journal", journaled.tracer.histograms["task_tick"])
+    report("journal sync", journaled.tracer.histograms["journal_sync"])
+
+    filename = journaled.datafolder + "/session.journal"
+    records = load_session_journal(filename)
+    rows = sum(1 for record in records if record["type"] == "row")
+    print("journal: %d bytes, %d records, %d rows, resume at trial %d"
+          % (os.path.getsize(filename), len(records), rows,
+             resume_trial_index(records)))
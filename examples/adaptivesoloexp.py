@@ -0,0 +1,82 @@
+
+
+
+import cProfile
+
+from asymsliderexperiment import \
+    FALCON_SERIALS, \
+    MessageTask, \
+    ResetHandleTask, \
+    SoloAsymForceTrackingTask
+
+from multiagentexperiment import \
+    HumanFalconParticipant, \
+    MultiAgentExperiment, \
+    StaircaseProcedure
+
+import pyglet
+
+
+# Solo tracking where the push gain of the handle follows a 2-down 1-up
+# staircase on the rms tracking error of the previous trial.
+class AdaptiveSoloSliderExperiment(MultiAgentExperiment):
+
+    def __init__(self):
+        super().__init__("AdaptiveSoloSlider")
+
+        self.timestep = 1.0 / 60.0
+
+        self.procedure.append([MessageTask("msgwelcome1",
+                                           "Welcome to the Experiment 1",
+                                           self.timestep, 3.0)])
+
+        self.procedure.append([ResetHandleTask("0-reset1", self.timestep)])
+
+        self.staircase = StaircaseProcedure(
+                            self.make_trial,
+                            "tracking_error_rms",
+                            threshold=0.1,
+                            start=1.0,
+                            step_success=-0.1,
+                            step_failure=0.1,
+                            successes_to_step=2,
+                            minimum=0.1,
+                            maximum=1.0,
+                            max_reversals=8,
+                            max_trials=30,
+                            reset_trial=self.make_reset_trial)
+        self.procedure.append(self.staircase)
+
+        self.procedure.append([MessageTask("msgcomplete1",
+                                           "Experiment Complete. 1",
+                                           self.timestep, 4.0)])
+
+        self.participants.append(HumanFalconParticipant(
+                                    "subject", self.timestep, 0,
+                                    falcon_serial=FALCON_SERIALS[0]))
+
+        pyglet.clock.schedule_interval(self.step, self.timestep)
+
+    def make_trial(self, push, number):
+        params = {"k": 5.0, "push": push, "pull": 1.0}
+        return [SoloAsymForceTrackingTask(str(number + 1) + "-solo",
+                                          self.timestep,
+                                          self.datafolder,
+                                          20.0,
+                                          parameters=params)]
+
+    def make_reset_trial(self, number):
+        return [ResetHandleTask(str(number + 1) + "-reset", self.timestep)]
+
+    def completed(self):
+        super().completed()
+        print("push gain threshold estimate:", self.staircase.estimate())
+        pyglet.app.exit()
+
+
+if __name__ == "__main__":
+
+    experiment = AdaptiveSoloSliderExperiment()
+    experiment.assign()
+
+    cProfile.run("pyglet.app.run()", sort="tottime")
@@ -3,27 +3,31 @@
 
 import cProfile
 import copy
+import os
 
 
-from dynamicobject import \
+from multiagentexperiment import \
     BindPosition, \
     ConditionAND, \
     Damping, \
     DynamicObject, \
-    InRangeForDuration, \
-    PositionLimits, \
-    PositionThreshold, \
-    SpringLawSolid
-
-from humanfalconparticipant import HumanFalconParticipant
-
-from multiagentexperiment import \
     FlippedPerspective, \
+    ForceStats, \
+    HandleWork, \
+    HumanFalconParticipant, \
+    InRangeForDuration, \
     MultiAgentExperiment, \
     MultiAgentTask, \
     Perspective, \
+    PositionLimits, \
+    PositionThreshold, \
     ReferenceTrajectory, \
-    Role
+    Role, \
+    SpringLawSolid, \
+    TrackingError, \
+    load_task_spec, \
+    register_spec_type, \
+    register_trajectory
 
 
 import numpy as np
@@ -31,6 +35,11 @@ import numpy as np
 import pyglet
 
 
+# Serials of the falcons by device number, as named in the calibration file
+# of the package. "default" uses the default bounds.
+FALCON_SERIALS = ("default", "default")
+
+
 def sos_gen(zero_start=2.0, soft_start_s=5.0):
 
     frequencies = np.array([1.7, 1.3, 1.1, 0.7, 0.5])
@@ -91,6 +100,18 @@ class FlippedHiddenObjectsPerspective(FlippedPerspective):
         return super().task_to_view(perspective_state)
 
 
+register_trajectory('sos', sos_gen)
+register_trajectory('flat', flat_gen)
+register_spec_type(HiddenObjectsPerspective)
+register_spec_type(FlippedHiddenObjectsPerspective)
+
+# The dyad tracking task, compiled once from its spec. It builds the same task
+# as DyadAsymForceTrackingTask.
+dyad_topology = load_task_spec(os.path.join(os.path.dirname(__file__),
+                                            'specs',
+                                            'dyadasymforcetracking.json'))
+
+
 class BlankTask(MultiAgentTask):
 
     def __init__(self, name, timestep, datafolder=None, duration=None):
@@ -222,8 +243,8 @@ class SoloAsymForceTrackingTask(MultiAgentTask):
         push = parameters.get('push', 1.0)
         pull = parameters.get('pull', 1.0)
 
-        self.add_ref(ReferenceTrajectory('sos',
-                                         trajectory_function=sos_gen()))
+        sos = ReferenceTrajectory('sos', trajectory_function=sos_gen())
+        self.add_ref(sos)
 
         obj_radius = 0.05
         rest_length = obj_radius * 8
@@ -296,6 +317,10 @@ class SoloAsymForceTrackingTask(MultiAgentTask):
 
         self.add_constraint(Damping(1, cursor))
 
+        self.add_metric(TrackingError('tracking_error', cursor, sos))
+        self.add_metric(ForceStats('handle_force', handle_obj))
+        self.add_metric(HandleWork('handle_work', handle_obj))
+
         self.roles.append(Role(handle_obj))
 
 
@@ -314,7 +339,8 @@ class DyadAsymForceTrackingTask(MultiAgentTask):
         p2_push = parameters.get('p2_push', 1.0)
         p2_pull = parameters.get('p2_pull', 1.0)
 
-        self.add_ref(ReferenceTrajectory('sos', trajectory_function = sos_gen()))
+        sos = ReferenceTrajectory('sos', trajectory_function=sos_gen())
+        self.add_ref(sos)
 
         obj_radius = 0.05
         rest_length = obj_radius * 4
@@ -449,6 +475,12 @@ class DyadAsymForceTrackingTask(MultiAgentTask):
 
         self.add_constraint(Damping(1, cursor))
 
+        self.add_metric(TrackingError('tracking_error', cursor, sos))
+        self.add_metric(ForceStats('p1_handle_force', p1_handle_obj))
+        self.add_metric(ForceStats('p2_handle_force', p2_handle_obj))
+        self.add_metric(HandleWork('p1_handle_work', p1_handle_obj))
+        self.add_metric(HandleWork('p2_handle_work', p2_handle_obj))
+
         self.roles.append(Role(p1_handle_obj,
                                perspective=HiddenObjectsPerspective(['p2_handle_draw',
                                                                      'p2_self_contact',
@@ -485,7 +517,7 @@ class AsymmetricDyadSliderExperiment(MultiAgentExperiment):
         params1 = {'k': k,
                    'p1_push': 1.0, 'p1_pull': 1.0,
                    'p2_push': 1.0, 'p2_pull': 1.0}
-        self.procedure.append([DyadAsymForceTrackingTask('1-dyad',
+        self.procedure.append([dyad_topology.instantiate('1-dyad',
                                                          self.timestep,
                                                          self.datafolder,
                                                          duration,
@@ -498,7 +530,7 @@ class AsymmetricDyadSliderExperiment(MultiAgentExperiment):
         params2 = {'k': k,
                    'p1_push': 0.5, 'p1_pull': 1.0,
                    'p2_push': 0.5, 'p2_pull': 1.0}
-        self.procedure.append([DyadAsymForceTrackingTask('2-dyad',
+        self.procedure.append([dyad_topology.instantiate('2-dyad',
                                                          self.timestep,
                                                          self.datafolder,
                                                          duration,
@@ -510,7 +542,7 @@ class AsymmetricDyadSliderExperiment(MultiAgentExperiment):
         params3 = {'k': k,
                    'p1_push': 1.0, 'p1_pull': 0.5,
                    'p2_push': 1.0, 'p2_pull': 0.5}
-        self.procedure.append([DyadAsymForceTrackingTask('3-dyad',
+        self.procedure.append([dyad_topology.instantiate('3-dyad',
                                                          self.timestep,
                                                          self.datafolder,
                                                          duration,
@@ -525,12 +557,12 @@ class AsymmetricDyadSliderExperiment(MultiAgentExperiment):
                                            self.timestep,
                                            5.0)])
 
-        self.participants.append(HumanFalconParticipant('player1',
-                                                        self.timestep,
-                                                        0))
-        self.participants.append(HumanFalconParticipant('player2',
-                                                        self.timestep,
-                                                        1))
+        self.participants.append(HumanFalconParticipant(
+                                    'player1', self.timestep, 0,
+                                    falcon_serial=FALCON_SERIALS[0]))
+        self.participants.append(HumanFalconParticipant(
+                                    'player2', self.timestep, 1,
+                                    falcon_serial=FALCON_SERIALS[1]))
 
         pyglet.clock.schedule_interval(self.step, self.timestep)
 
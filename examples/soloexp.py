@@ -2,13 +2,14 @@
 import cProfile
 
 from asymsliderexperiment import \
+    FALCON_SERIALS, \
     MessageTask, \
     ResetHandleTask, \
     SoloAsymForceTrackingTask
 
-from humanfalconparticipant import HumanFalconParticipant
-
-from multiagentexperiment import MultiAgentExperiment
+from multiagentexperiment import \
+    HumanFalconParticipant, \
+    MultiAgentExperiment
 
 import pyglet
 
@@ -36,8 +37,9 @@ class SoloSliderExperiment(MultiAgentExperiment):
                                            "Experiment Complete. 1",
                                            self.timestep, 4.0)])
 
-        self.participants.append(HumanFalconParticipant("subject",
-                                                        self.timestep, 0))
+        self.participants.append(HumanFalconParticipant(
+                                    "subject", self.timestep, 0,
+                                    falcon_serial=FALCON_SERIALS[0]))
 
         pyglet.clock.schedule_interval(self.step, self.timestep)
 
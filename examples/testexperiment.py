@@ -3,11 +3,16 @@ import numpy as np
 
 import pyglet
 
-from humanfalconparticipant import HumanFalconParticipant
-from multiagentexperiment import Role, Participant, Perspective, FlippedPerspective, ReferenceTrajectory, MultiAgentTask, MultiAgentExperiment
-
-
-from dynamicobject import DynamicObject, TensionSpring
+from multiagentexperiment import \
+    DynamicObject, \
+    FlippedPerspective, \
+    HumanFalconParticipant, \
+    MultiAgentExperiment, \
+    MultiAgentTask, \
+    Perspective, \
+    ReferenceTrajectory, \
+    Role, \
+    TensionSpring
 
 
 def sos_gen():
@@ -63,8 +68,12 @@ class TestExperiment(MultiAgentExperiment):
         self.procedure.append(TestTask("test2", 20.0, self.datafolder, timestep=self.timestep))
         self.procedure.append(TestTask("test3", 20.0, self.datafolder, timestep=self.timestep))
         
-        self.participants.append(HumanFalconParticipant("player1", self.timestep, 0))
-        self.participants.append(HumanFalconParticipant("player2", self.timestep, 1))
+        self.participants.append(HumanFalconParticipant(
+                                    "player1", self.timestep, 0,
+                                    falcon_serial="default"))
+        self.participants.append(HumanFalconParticipant(
+                                    "player2", self.timestep, 1,
+                                    falcon_serial="default"))
        
         pyglet.clock.schedule_interval(self.step, self.timestep)
     
@@ -23,5 +23,9 @@ setuptools.setup(
     ],
     package_dir={"": "src"},
     packages=setuptools.find_packages(where="src"),
-    python_requires=">=3.6",
+    package_data={"multiagentexperiment": ["falcon_calibration.json"]},
+    python_requires=">=3.8",
+    install_requires=["numpy"],
+    extras_require={"human": ["pyglet<2"],
+                    "compression": ["zstandard", "lz4"]},
 )
\ No newline at end of file
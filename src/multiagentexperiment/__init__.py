@@ -0,0 +1,120 @@
+from .agents import \
+    MinimumJerkAgent, \
+    PDTrackerAgent, \
+    SimulatedParticipant, \
+    TrackingAgent, \
+    VirtualHandle
+
+from .analysis import \
+    Table, \
+    analyze_sessions, \
+    load_sessions, \
+    load_task_file, \
+    task_metrics
+
+from .columnstore import \
+    CompressedColumnWriter, \
+    available_codecs, \
+    load_compressed_columns
+
+from .datalogger import \
+    DataLogger, \
+    Decimate, \
+    LogPolicy, \
+    OnChange
+
+from .dynamicobject import \
+    BindPosition, \
+    CompressionSpring, \
+    Condition, \
+    ConditionAND, \
+    ConditionOR, \
+    Constraint, \
+    Damping, \
+    DynamicObject, \
+    InRangeForDuration, \
+    PositionLimits, \
+    PositionThreshold, \
+    SpringLawSolid, \
+    TensionSpring
+
+from .hapticrecorder import \
+    HapticRecorder, \
+    load_haptic_recording
+
+from .journal import \
+    SessionJournal, \
+    load_session_journal, \
+    recover_interrupted_trial, \
+    resume_trial_index
+
+from .metrics import \
+    ForceStats, \
+    HandleWork, \
+    Metric, \
+    RunningStats, \
+    TrackingError
+
+from .multiagentexperiment import \
+    FlippedPerspective, \
+    Handle, \
+    MultiAgentExperiment, \
+    MultiAgentTask, \
+    Participant, \
+    Perspective, \
+    ReferenceTrajectory, \
+    Role, \
+    VisibleStateDecoder, \
+    VisibleStateEncoder
+
+from .procedure import \
+    AdaptiveProcedure, \
+    QuestProcedure, \
+    StaircaseProcedure, \
+    TrialGenerator
+
+from .simulatedfalcon import \
+    ScriptedHand, \
+    SimulatedFalcon, \
+    StochasticHand
+
+from .stateestimator import \
+    IIRStateEstimator, \
+    SavitzkyGolayEstimator, \
+    StateEstimator
+
+from .taskspec import \
+    SpecTask, \
+    TaskTopology, \
+    compile_task_spec, \
+    load_task_spec, \
+    register_spec_type, \
+    register_trajectory
+
+from .telemetry import \
+    TelemetryMonitor, \
+    TelemetryPublisher
+
+from .timing import \
+    Clock, \
+    FrameLog, \
+    LatencyHistogram, \
+    LatencyTracer
+
+
+# Hardware and rendering backends are resolved on first use so that headless
+# runs never import pyglet or falcon_c.
+_lazy_attributes = {
+    "FalconHapticHandle": ".humanfalconparticipant",
+    "HumanFalconParticipant": ".humanfalconparticipant",
+    "TelemetryPlot": ".monitor",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        import importlib
+        module = importlib.import_module(_lazy_attributes[name], __name__)
+        return getattr(module, name)
+    raise AttributeError("module " + repr(__name__)
+                         + " has no attribute " + repr(name))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from .multiagentexperiment import Handle, Participant
+
+
+# Interpolates every row of times and values at its own x, like np.interp,
+# in one pass over all rows.
+def _interp_rows(x, times, values):
+    rows = np.arange(len(x))
+    upper = (times <= x[:, None]).sum(axis=1)
+    np.maximum(upper, 1, out=upper)
+    np.minimum(upper, times.shape[1] - 1, out=upper)
+    t0 = times[rows, upper - 1]
+    t1 = times[rows, upper]
+    v0 = values[rows, upper - 1]
+    v1 = values[rows, upper]
+    span = t1 - t0
+    fraction = np.divide(x - t0, span, out=np.zeros(len(x)),
+                         where=span > 0.0)
+    np.maximum(fraction, 0.0, out=fraction)
+    np.minimum(fraction, 1.0, out=fraction)
+    return v0 + (fraction * (v1 - v0))
+
+
+# Agents model the hand of one or more simulated participants. All state is
+# kept in arrays with one slot per participant, so a single agent can drive a
+# whole ensemble of tasks with one vectorized update per tick.
+#
+# Each participant reads the agent output from the previous update before
+# reporting what it sees, and the agent updates once every slot that reported
+# in the previous tick has reported again. Every slot therefore sees the same
+# one tick latency on top of the reaction delay. A slot reporting twice ends
+# the tick early, so slots left out of a trial, or joining one, only shift
+# the ensemble by a tick once. The tracking errors of all slots are then
+# looked up on their reference windows together.
+class TrackingAgent:
+
+    def __init__(self,
+                 timestep_s,
+                 slots=1,
+                 reference="sos",
+                 cursor="cursor",
+                 reaction_delay_s=0.15,
+                 preview_s=None,
+                 noise_std=0.0,
+                 seed=None):
+
+        self.timestep_s = timestep_s
+        self.slots = slots
+        self.reference = reference
+        self.cursor = cursor
+        self.noise_std = noise_std
+        # how far ahead on the visible reference window the agent aims, by
+        # default far enough to make up for its own reaction delay
+        if preview_s is None:
+            preview_s = reaction_delay_s
+        self.preview_s = preview_s
+        self.rng = np.random.default_rng(seed)
+
+        self.delay_steps = max(int(round(reaction_delay_s / timestep_s)), 1)
+        self.errors = np.zeros((self.delay_steps, slots))
+        self.error_ndx = 0
+
+        # what each slot saw this tick: the time it aims at, the times and
+        # values of its reference window, and the cursor position. valid is
+        # false for slots without a reference and cursor. The windows grow to
+        # the longest one seen.
+        self.aim = np.zeros((slots,))
+        self.windows = np.zeros((slots, 2, 1))
+        self.window_lengths = np.zeros((slots,), dtype=int)
+        self.cursor_pos = np.zeros((slots,))
+        self.valid = np.zeros((slots,), dtype=bool)
+        self.observations = np.zeros((slots,))
+        self.reported = np.zeros((slots,), dtype=bool)
+        self.expected = np.ones((slots,), dtype=bool)
+        self.missing = slots
+
+        self.position = np.zeros((slots,))
+        self.velocity = np.zeros((slots,))
+        self.acceleration = np.zeros((slots,))
+
+    def get_output(self, slot):
+        return (self.position[slot],
+                self.velocity[slot],
+                self.acceleration[slot])
+
+    # Stores what the slot sees and returns whether it can be tracked. Tasks
+    # without the reference or the cursor (messages, resets) give no error.
+    def view(self, slot, visible_state):
+        references = visible_state.get("reference_trajectories")
+        objects = visible_state.get("dynamic_objects")
+        if (not references or not objects or self.reference not in references
+                or self.cursor not in objects):
+            return False
+
+        reference = references[self.reference]
+        length = len(reference["timesteps"])
+        if length == 0:
+            return False
+        if length > self.windows.shape[2]:
+            self.windows = np.pad(self.windows, ((0, 0), (0, 0),
+                                                 (0, length
+                                                  - self.windows.shape[2])))
+
+        self.aim[slot] = visible_state["tasktime"] + self.preview_s
+        self.windows[slot, :, :length] = (reference["timesteps"],
+                                          reference["full"])
+        self.window_lengths[slot] = length
+        self.cursor_pos[slot] = objects[self.cursor]["state"][0]
+        return True
+
+    def observe(self, slot, visible_state):
+        if self.reported[slot]:
+            self.end_tick()
+        self.valid[slot] = self.view(slot, visible_state)
+        self.reported[slot] = True
+        if self.expected[slot]:
+            self.missing -= 1
+        if self.missing <= 0:
+            self.end_tick()
+
+    # Tracking errors of the slots that reported this tick. Slots that did
+    # not report keep their last error.
+    def end_tick(self):
+        self.observations[self.reported] = 0.0
+
+        # only slots that reported can have a valid view
+        if self.valid.all():
+            slots = slice(None)
+        else:
+            slots = np.flatnonzero(self.valid)
+        lengths = self.window_lengths[slots]
+        if len(lengths) > 0:
+            length = lengths.max()
+            windows = self.windows[slots, :, :length]
+            if lengths.min() < length:
+                # shorter windows are padded with their last sample
+                last = windows[np.arange(len(lengths)), :, lengths - 1]
+                windows = np.where(np.arange(length) < lengths[:, None, None],
+                                   windows, last[:, :, None])
+            if length == 1:
+                targets = windows[:, 1, 0]
+            else:
+                targets = _interp_rows(self.aim[slots], windows[:, 0],
+                                       windows[:, 1])
+            self.observations[slots] = targets - self.cursor_pos[slots]
+
+        self.expected[:] = self.reported
+        self.reported[:] = False
+        self.valid[:] = False
+        self.missing = np.count_nonzero(self.expected)
+        self.step()
+
+    def step(self):
+        # the ring slot about to be overwritten holds the oldest error
+        delayed_error = self.errors[self.error_ndx].copy()
+        self.errors[self.error_ndx] = self.observations
+        self.error_ndx = (self.error_ndx + 1) % self.delay_steps
+
+        self.update(delayed_error)
+
+    def noise(self):
+        if self.noise_std > 0.0:
+            return self.rng.normal(0.0, self.noise_std, self.slots)
+        return 0.0
+
+    def update(self, error):
+        pass
+
+
+class PDTrackerAgent(TrackingAgent):
+
+    def __init__(self, timestep_s, kp=100.0, kd=20.0, **kwargs):
+        self.kp = kp
+        self.kd = kd
+        super().__init__(timestep_s, **kwargs)
+
+    def update(self, error):
+        self.acceleration = ((self.kp * error)
+                             - (self.kd * self.velocity)
+                             + self.noise())
+        self.velocity = self.velocity + (self.acceleration * self.timestep_s)
+        self.position = self.position + (self.velocity * self.timestep_s)
+
+
+# Corrects the observed error with a sequence of minimum jerk submovements,
+# each planned from the current hand position and lasting submovement_s.
+class MinimumJerkAgent(TrackingAgent):
+
+    def __init__(self, timestep_s, submovement_s=0.2, gain=0.4, **kwargs):
+        super().__init__(timestep_s, **kwargs)
+        self.gain = gain
+        self.submovement_steps = max(int(round(submovement_s / timestep_s)), 1)
+        self.submovement_s = self.submovement_steps * timestep_s
+        self.step_ndx = 0
+        self.start = np.zeros((self.slots,))
+        self.distance = np.zeros((self.slots,))
+
+    def update(self, error):
+        if self.step_ndx == 0:
+            self.start = self.position.copy()
+            self.distance = (self.gain * error) + self.noise()
+        self.step_ndx = (self.step_ndx + 1) % self.submovement_steps
+
+        tau = ((self.step_ndx if self.step_ndx > 0 else self.submovement_steps)
+               / self.submovement_steps)
+        duration = self.submovement_s
+
+        self.position = self.start + (self.distance
+                                      * ((10 * tau**3)
+                                         - (15 * tau**4)
+                                         + (6 * tau**5)))
+        self.velocity = (self.distance / duration) * ((30 * tau**2)
+                                                      - (60 * tau**3)
+                                                      + (30 * tau**4))
+        self.acceleration = ((self.distance / duration**2)
+                             * ((60 * tau) - (180 * tau**2) + (120 * tau**3)))
+
+
+class VirtualHandle(Handle):
+
+    def __init__(self):
+        super().__init__()
+        self.state = (0.0, 0.0, 0.0)
+
+    def set_state(self, position, velocity, acceleration):
+        self.x = position
+        self.state = (position, velocity, acceleration)
+
+    def get_state(self):
+        return self.state
+
+
+class SimulatedParticipant(Participant):
+
+    def __init__(self, name, agent, slot=0):
+        self.agent = agent
+        self.slot = slot
+        super().__init__(name, VirtualHandle())
+
+    def get_action(self, visible_state):
+        self.handle.set_state(*self.agent.get_output(self.slot))
+        self.agent.observe(self.slot, visible_state)
+        return self.handle.get_position()
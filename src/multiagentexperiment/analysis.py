@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+
+from .columnstore import CompressedColumnWriter, load_compressed_columns
+from .multiagentexperiment import MultiAgentTask
+
+
+# Bump when the metrics change, so cached results are recomputed.
+ANALYSIS_VERSION = 1
+
+
+def _parse_value(value):
+    if value == "None":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+# Reads a task data file, as tab separated text or compressed columns, into
+# its name, parameters and a dict of column arrays. Empty cells are NaN.
+def load_task_file(filename):
+    with open(filename, 'rb') as data_file:
+        data = data_file.read()
+
+    if data.startswith(CompressedColumnWriter.MAGIC):
+        header, columns = load_compressed_columns(filename)
+        parameters = {key: _parse_value(value)
+                      for key, value in header["parameters"].items()}
+        return header["name"], parameters, columns
+
+    lines = data.decode().splitlines()
+    name = None
+    parameters = {}
+    for line_ndx, line in enumerate(lines):
+        key, _, value = line.partition('\t')
+        if key == "taskstate":
+            break
+        if key == "name":
+            name = value
+        else:
+            parameters[key] = _parse_value(value)
+    else:
+        raise ValueError(filename + " has no data header")
+
+    fieldnames = lines[line_ndx].split('\t')
+    body = '\n'.join(lines[line_ndx + 1:])
+    if body.strip():
+        table = np.genfromtxt(io.StringIO(body), delimiter='\t',
+                              dtype=float, filling_values=np.nan, ndmin=2)
+    else:
+        table = np.zeros((0, len(fieldnames)))
+    columns = {field: table[:, ndx] for ndx, field in enumerate(fieldnames)}
+    return name, parameters, columns
+
+
+def is_task_file(filename):
+    if not os.path.isfile(filename):
+        return False
+    with open(filename, 'rb') as data_file:
+        start = data_file.read(1 << 16)
+    if start.startswith(CompressedColumnWriter.MAGIC):
+        return True
+    # text data files start with the name and parameter lines, followed by
+    # the column header
+    return start.startswith(b"name\t") and b"\ntaskstate\t" in start
+
+
+# All task data files of the given session folders.
+def find_task_files(folders):
+    filenames = []
+    for folder in folders:
+        for entry in sorted(os.listdir(folder)):
+            filename = os.path.join(folder, entry)
+            if is_task_file(filename):
+                filenames.append(filename)
+    return filenames
+
+
+def _forward_fill(values):
+    # columns thinned out by logging policies hold their last written value
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return values
+    ndx = np.where(valid, np.arange(len(values)), 0)
+    np.maximum.accumulate(ndx, out=ndx)
+    return values[ndx]
+
+
+# Peak of the normalized cross-correlation of a and b and its lag in
+# samples, positive when b lags a.
+def cross_correlation(a, b, max_lag):
+    a = a - a.mean()
+    b = b - b.mean()
+    norm = np.sqrt(np.dot(a, a) * np.dot(b, b))
+    if norm == 0.0:
+        return np.nan, 0
+
+    size = 1 << int(np.ceil(np.log2(2 * len(a))))
+    corr = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size),
+                        size)
+    lags = np.arange(-max_lag, max_lag + 1)
+    values = corr[lags] / norm
+    peak = np.argmax(np.abs(values))
+    return float(values[peak]), int(lags[peak])
+
+
+# The standard metrics of one task data file.
+def task_metrics(columns,
+                 cursor="cursor",
+                 reference="sos",
+                 handles=("p1_handle", "p2_handle"),
+                 max_lag_s=0.5):
+    metrics = {}
+    tasktime = columns["tasktime"]
+    metrics["samples"] = len(tasktime)
+
+    completed = np.flatnonzero(columns["taskstate"]
+                               == MultiAgentTask.TASK_COMPLETED)
+    if len(completed) > 0:
+        metrics["completion_time"] = float(tasktime[completed[0]])
+    elif len(tasktime) > 0:
+        metrics["completion_time"] = float(tasktime[-1])
+    else:
+        metrics["completion_time"] = np.nan
+
+    cursor_pos = columns.get("object_" + cursor + "_pos")
+    reference_now = columns.get("reference_" + reference + "_now")
+    if cursor_pos is not None and reference_now is not None:
+        error = (_forward_fill(reference_now) - _forward_fill(cursor_pos))
+        metrics["tracking_rms"] = float(np.sqrt(np.nanmean(error**2)))
+    else:
+        metrics["tracking_rms"] = np.nan
+
+    forces = [columns.get("object_" + handle + "_force")
+              for handle in handles]
+    if all(force is not None for force in forces) and len(tasktime) > 1:
+        f1, f2 = [_forward_fill(force) for force in forces]
+        valid = ~(np.isnan(f1) | np.isnan(f2))
+        f1 = f1[valid]
+        f2 = f2[valid]
+
+        mean_abs = np.abs(f1).mean(), np.abs(f2).mean()
+        total = mean_abs[0] + mean_abs[1]
+        metrics["force_asymmetry"] = (float((mean_abs[0] - mean_abs[1])
+                                            / total)
+                                      if total > 0.0 else np.nan)
+
+        timestep = float(np.median(np.diff(tasktime)))
+        max_lag = min(int(round(max_lag_s / timestep)), len(f1) - 1)
+        peak, lag = cross_correlation(f1, f2, max_lag)
+        metrics["force_xcorr_peak"] = peak
+        metrics["force_xcorr_lag_s"] = lag * timestep
+    else:
+        metrics["force_asymmetry"] = np.nan
+        metrics["force_xcorr_peak"] = np.nan
+        metrics["force_xcorr_lag_s"] = np.nan
+
+    return metrics
+
+
+def file_hash(filename):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def analyze_file(filename, options={}):
+    name, parameters, columns = load_task_file(filename)
+    return {"session": os.path.basename(os.path.dirname(filename)),
+            "task": name,
+            "file": filename,
+            "parameters": parameters,
+            "metrics": task_metrics(columns, **options)}
+
+
+# Per-file results, stored as JSON under the content hash of the file and the
+# metric options.
+class AnalysisCache:
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, filename, options):
+        digest = hashlib.sha1()
+        digest.update(file_hash(filename).encode())
+        digest.update(json.dumps([ANALYSIS_VERSION, options],
+                                 sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.folder, key + ".json")) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        filename = os.path.join(self.folder, key + ".json")
+        with open(filename + ".tmp", 'w') as cache_file:
+            json.dump(result, cache_file)
+        os.replace(filename + ".tmp", filename)
+
+
+# A columnar table: a dict of equally long arrays.
+class Table:
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def keys(self):
+        return self.columns.keys()
+
+    # Rows where every given column equals the given value.
+    def select(self, **criteria):
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in criteria.items():
+            mask &= self.columns[name] == value
+        return Table({name: column[mask]
+                      for name, column in self.columns.items()})
+
+    def write(self, filename):
+        names = list(self.columns)
+        with open(filename, 'w') as table_file:
+            table_file.write('\t'.join(names) + '\n')
+            for row in zip(*[self.columns[name] for name in names]):
+                table_file.write('\t'.join(str(value) for value in row)
+                                 + '\n')
+
+
+def _column(values):
+    if all(isinstance(value, (int, float)) or value is None
+           for value in values):
+        return np.array([np.nan if value is None else value
+                         for value in values], dtype=float)
+    return np.array(values, dtype=object)
+
+
+def _results_table(results):
+    # parameters become param_<name> columns, missing where a task lacks them
+    parameter_names = sorted(set(key for result in results
+                                 for key in result["parameters"]))
+    metric_names = sorted(set(key for result in results
+                              for key in result["metrics"]))
+    columns = {}
+    for name in ["session", "task", "file"]:
+        columns[name] = np.array([result[name] for result in results],
+                                 dtype=object)
+    for name in parameter_names:
+        columns["param_" + name] = _column([result["parameters"].get(name)
+                                            for result in results])
+    for name in metric_names:
+        columns[name] = _column([result["metrics"].get(name)
+                                 for result in results])
+    return Table(columns)
+
+
+# Computes the metrics of every task data file in the session folders into
+# one table with a row per task, keyed by session, task and parameters.
+# Results are cached by file content, and archives of more than
+# pool_threshold uncached files are analyzed on a process pool.
+def analyze_sessions(folders,
+                     cache_folder="./data/.analysis_cache",
+                     processes=None,
+                     pool_threshold=16,
+                     **options):
+    filenames = find_task_files(folders)
+    cache = AnalysisCache(cache_folder) if cache_folder is not None else None
+
+    results = [None] * len(filenames)
+    keys = [None] * len(filenames)
+    missing = []
+    for ndx, filename in enumerate(filenames):
+        if cache is not None:
+            keys[ndx] = cache.key(filename, options)
+            results[ndx] = cache.get(keys[ndx])
+        if results[ndx] is not None:
+            # the same content may have been analyzed under another path
+            results[ndx]["session"] = os.path.basename(
+                                        os.path.dirname(filename))
+            results[ndx]["file"] = filename
+        else:
+            missing.append(ndx)
+
+    missing_files = [filenames[ndx] for ndx in missing]
+    if len(missing) > pool_threshold:
+        with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+            computed = list(pool.map(analyze_file, missing_files,
+                                     [options] * len(missing_files),
+                                     chunksize=4))
+    else:
+        computed = [analyze_file(filename, options)
+                    for filename in missing_files]
+
+    for ndx, result in zip(missing, computed):
+        results[ndx] = result
+        if cache is not None:
+            cache.put(keys[ndx], result)
+
+    return _results_table(results)
+
+
+# Loads the samples of all task data files of the session folders into one
+# table, with session, task and param_<name> columns added to every row.
+def load_sessions(folders):
+    loaded = [(os.path.basename(os.path.dirname(filename)),)
+              + load_task_file(filename)
+              for filename in find_task_files(folders)]
+
+    parameter_names = sorted(set(key for session, name, parameters, columns
+                                 in loaded for key in parameters))
+    field_names = []
+    for session, name, parameters, columns in loaded:
+        field_names.extend(field for field in columns
+                           if field not in field_names)
+
+    parts = {name: [] for name in ["session", "task"]
+             + ["param_" + key for key in parameter_names] + field_names}
+    for session, name, parameters, columns in loaded:
+        rows = len(columns["tasktime"])
+        parts["session"].append(np.full(rows, session, dtype=object))
+        parts["task"].append(np.full(rows, name, dtype=object))
+        for key in parameter_names:
+            value = _column([parameters.get(key)])
+            parts["param_" + key].append(np.repeat(value, rows))
+        for field in field_names:
+            parts[field].append(columns.get(field, np.full(rows, np.nan)))
+
+    return Table({name: (np.concatenate(values) if values
+                         else np.zeros(0))
+                  for name, values in parts.items()})
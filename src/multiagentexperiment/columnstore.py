@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import json
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+
+# Compressed columnar container for task data.
+#
+# Rows are collected into chunks of float64 columns. A background thread
+# filters every column (integer delta of the float bit patterns, then a byte
+# shuffle, both lossless) and compresses the chunk with the best codec that
+# is installed: zstd, lz4, or zlib from the standard library. Empty cells
+# left by logging policies are stored as NaN.
+#
+# The file is a magic line, a JSON header line and a sequence of chunks,
+# each a (rows, compressed length, crc32) header followed by the compressed
+# columns one after the other.
+class CompressedColumnWriter:
+    MAGIC = b"MAECOL1\n"
+    CHUNK = struct.Struct("<III")
+
+    def __init__(self,
+                 filename,
+                 fieldnames,
+                 header={},
+                 chunk_rows=1024,
+                 codec=None,
+                 level=3):
+
+        self.filename = filename
+        self.fieldnames = list(fieldnames)
+        self.columns = {field: ndx for ndx, field
+                        in enumerate(self.fieldnames)}
+        self.chunk_rows = chunk_rows
+
+        if codec is None:
+            codec = available_codecs()[0]
+        self.codec = codec
+        self.compress = _compressor(codec, level)
+
+        self.chunk = np.full((chunk_rows, len(self.fieldnames)), np.nan)
+        self.rows = 0
+
+        self.file = open(filename, 'wb')
+        file_header = dict(header)
+        file_header.update({"fields": self.fieldnames,
+                            "codec": codec,
+                            "filters": ["delta", "shuffle"]})
+        self.file.write(self.MAGIC)
+        self.file.write(json.dumps(file_header).encode() + b"\n")
+
+        self.chunk_queue = queue.Queue()
+        self.compress_thread = threading.Thread(target=self.compress_loop,
+                                                daemon=True)
+        self.compress_thread.start()
+
+    def writerow(self, row):
+        if self.rows == self.chunk_rows:
+            self.chunk_queue.put(self.chunk)
+            self.chunk = np.full_like(self.chunk, np.nan)
+            self.rows = 0
+
+        values = self.chunk[self.rows]
+        for field, value in row.items():
+            values[self.columns[field]] = value
+        self.rows += 1
+
+    def compress_loop(self):
+        while True:
+            chunk = self.chunk_queue.get()
+            if chunk is None:
+                return
+            self.write_chunk(chunk)
+
+    def write_chunk(self, chunk):
+        payload = self.compress(_encode_columns(chunk))
+        self.file.write(self.CHUNK.pack(len(chunk), len(payload),
+                                        zlib.crc32(payload)))
+        self.file.write(payload)
+
+    def close(self):
+        if self.rows > 0:
+            self.chunk_queue.put(self.chunk[:self.rows].copy())
+        self.chunk_queue.put(None)
+        self.compress_thread.join()
+        self.file.close()
+
+
+def _encode_columns(chunk):
+    bits = np.ascontiguousarray(chunk.T).view(np.uint64)
+    delta = np.empty_like(bits)
+    delta[:, 0] = bits[:, 0]
+    np.subtract(bits[:, 1:], bits[:, :-1], out=delta[:, 1:])
+    # byte shuffle: the n-th bytes of all values of a column are stored
+    # together
+    shuffled = delta.view(np.uint8).reshape(delta.shape[0], -1, 8)
+    return np.ascontiguousarray(shuffled.transpose(0, 2, 1)).tobytes()
+
+
+def _decode_columns(data, rows, columns):
+    shuffled = np.frombuffer(data, dtype=np.uint8).reshape(columns, 8, rows)
+    delta = np.ascontiguousarray(shuffled.transpose(0, 2, 1)).view(np.uint64)
+    bits = np.cumsum(delta.reshape(columns, rows), axis=1, dtype=np.uint64)
+    return bits.view(np.float64)
+
+
+def available_codecs():
+    codecs = []
+    try:
+        import zstandard  # noqa: F401
+        codecs.append("zstd")
+    except ImportError:
+        pass
+    try:
+        import lz4.frame  # noqa: F401
+        codecs.append("lz4")
+    except ImportError:
+        pass
+    codecs.append("zlib")
+    return codecs
+
+
+def _compressor(codec, level):
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress
+    if codec == "lz4":
+        import lz4.frame
+        return lambda data: lz4.frame.compress(data,
+                                               compression_level=level)
+    if codec == "zlib":
+        return lambda data: zlib.compress(data, level)
+    raise ValueError("unknown codec " + repr(codec))
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    if codec == "lz4":
+        import lz4.frame
+        return lz4.frame.decompress
+    if codec == "zlib":
+        return zlib.decompress
+    raise ValueError("unknown codec " + repr(codec))
+
+
+# Reads a container back as its header and a dict of column arrays.
+def load_compressed_columns(filename):
+    with open(filename, 'rb') as col_file:
+        if col_file.readline() != CompressedColumnWriter.MAGIC:
+            raise ValueError(filename + " is not a compressed column file")
+        header = json.loads(col_file.readline().decode())
+        data = col_file.read()
+
+    decompress = _decompressor(header["codec"])
+    fieldnames = header["fields"]
+    chunks = []
+    offset = 0
+    chunk_size = CompressedColumnWriter.CHUNK.size
+    while offset + chunk_size <= len(data):
+        rows, length, crc = CompressedColumnWriter.CHUNK.unpack_from(data,
+                                                                     offset)
+        payload = data[offset + chunk_size:offset + chunk_size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError(filename + " has a corrupt chunk at byte "
+                             + str(offset))
+        chunks.append(_decode_columns(decompress(payload), rows,
+                                      len(fieldnames)))
+        offset += chunk_size + length
+
+    if chunks:
+        table = np.concatenate(chunks, axis=1)
+    else:
+        table = np.zeros((len(fieldnames), 0))
+    return header, {field: table[ndx] for ndx, field in enumerate(fieldnames)}
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+from .dynamicobject import \
+    ConditionAND, \
+    ConditionOR, \
+    InRangeForDuration, \
+    PositionThreshold
+
+
+# Evaluates the end conditions of a task once per tick and tells listeners
+# when one of them changes.
+#
+# PositionThreshold and InRangeForDuration conditions are packed into arrays
+# of object indices and bounds. From vectorize_threshold of them on, they are
+# evaluated together from one array of the positions of the objects they
+# watch, with a few numpy operations per tick. The time a position entered
+# its range is kept as a timestamp, so a duration is the difference to the
+# task time. ConditionOR and ConditionAND are combined from the results of
+# their conditions, and any other condition is asked through its check().
+# Unlike ConditionOR.check and ConditionAND.check, every condition is
+# evaluated on every tick, so no duration is left unmeasured.
+#
+# Listeners are called as listener(condition, state, tasktime) whenever an
+# end condition becomes true or false, but not on the first tick.
+class ConditionMonitor:
+    LEAF = 0
+    ANY = 1
+    ALL = 2
+    POLL = 3
+
+    # durations of a whole number of ticks are not cut off by rounding
+    EPSILON_S = 1e-9
+
+    def __init__(self, conditions, vectorize_threshold=256):
+        self.conditions = list(conditions)
+        self.listeners = []
+
+        self.states = []
+        self.thresholds = []
+        self.ranges = []
+        slots = {}
+        self.nodes = [self.compile(condition, slots)
+                      for condition in self.conditions]
+
+        # the last position is 0.0, for thresholds without a reference
+        ndx = {id(state): ndx for ndx, state in enumerate(self.states)}
+        none = len(self.states)
+        self.positions = np.zeros(len(self.states) + 1)
+        self.leaves = np.zeros(len(slots), dtype=bool)
+
+        thresholds = self.thresholds
+        self.threshold_slot = np.array([slots[id(c)] for c in thresholds],
+                                       dtype=int)
+        self.threshold_target = np.array([ndx[id(c.target_state)]
+                                          for c in thresholds], dtype=int)
+        self.threshold_reference = np.array(
+                                    [none if c.reference_state is None
+                                     else ndx[id(c.reference_state)]
+                                     for c in thresholds], dtype=int)
+        self.threshold_offset = np.array([c.offset for c in thresholds],
+                                         dtype=float)
+        # sign * position > sign * bound is exact in both directions
+        self.threshold_sign = np.array([1.0 if c.check_greater else -1.0
+                                        for c in thresholds])
+
+        ranges = self.ranges
+        self.range_slot = np.array([slots[id(c)] for c in ranges], dtype=int)
+        self.range_target = np.array([ndx[id(c.target_state)]
+                                      for c in ranges], dtype=int)
+        self.range_upper = np.array([c.upper_bound for c in ranges],
+                                    dtype=float)
+        self.range_lower = np.array([c.lower_bound for c in ranges],
+                                    dtype=float)
+        self.range_duration = np.array([c.duration_s for c in ranges],
+                                       dtype=float)
+        self.range_threshold = self.range_duration - self.EPSILON_S
+        self.range_start = np.full(len(ranges), np.inf)
+
+        # numpy only pays off for many conditions, fewer are evaluated one
+        # by one from the same parameters. In benchmarks/end_conditions.py
+        # the two break even at about 256 conditions.
+        self.vectorized = len(slots) >= vectorize_threshold
+        self.leaf_results = [False] * len(slots)
+        zero = [0.0]
+        self.scalar_thresholds = [(slots[id(c)], c.target_state,
+                                   zero if c.reference_state is None
+                                   else c.reference_state,
+                                   c.offset, c.check_greater)
+                                  for c in thresholds]
+        # the last item is the time the position entered the range, or None
+        self.scalar_ranges = [[slots[id(c)], c.target_state, c.upper_bound,
+                               c.lower_bound,
+                               c.duration_s - self.EPSILON_S, None]
+                              for c in ranges]
+
+        # end conditions that are single thresholds or ranges are read
+        # straight from the leaf results
+        self.top_slots = None
+        if all(kind == self.LEAF for kind, item in self.nodes):
+            self.top_slots = [item for kind, item in self.nodes]
+
+        self.reset(0.0)
+
+    def compile(self, condition, slots):
+        condition_type = type(condition)
+        if condition_type in (PositionThreshold, InRangeForDuration):
+            if id(condition) not in slots:
+                slots[id(condition)] = len(slots)
+                self.watch(condition.target_state)
+                if condition_type is PositionThreshold:
+                    if condition.reference_state is not None:
+                        self.watch(condition.reference_state)
+                    self.thresholds.append(condition)
+                else:
+                    self.ranges.append(condition)
+            return (self.LEAF, slots[id(condition)])
+        if condition_type in (ConditionOR, ConditionAND):
+            return (self.ANY if condition_type is ConditionOR else self.ALL,
+                    tuple(self.compile(child, slots)
+                          for child in condition.conditions))
+        return (self.POLL, condition)
+
+    def watch(self, state):
+        if not any(state is watched for watched in self.states):
+            self.states.append(state)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def reset(self, tasktime):
+        self.last_time = tasktime
+        self.range_start[:] = np.inf
+        for entry in self.scalar_ranges:
+            entry[5] = None
+        self.results = None
+
+    # Returns the state of every end condition and whether any of them
+    # changed since the previous tick. The returned list is not modified
+    # afterwards, an unchanged state is returned as the same list.
+    #
+    # Few conditions are evaluated right here, one call per tick is a good
+    # part of their cost.
+    def update(self, tasktime, dt_s):
+        if self.vectorized:
+            leaves_changed = self.update_vectorized(tasktime)
+        else:
+            leaves = self.leaf_results
+            leaves_changed = False
+            for slot, target, reference, offset, greater \
+                    in self.scalar_thresholds:
+                bound = reference[0] + offset
+                result = (target[0] > bound) if greater \
+                    else (target[0] < bound)
+                if result != leaves[slot]:
+                    leaves[slot] = result
+                    leaves_changed = True
+
+            for entry in self.scalar_ranges:
+                slot, target, upper, lower, duration, start = entry
+                position = target[0]
+                if lower <= position <= upper:
+                    if start is None:
+                        entry[5] = start = self.last_time
+                    result = tasktime - start >= duration
+                else:
+                    entry[5] = None
+                    result = False
+                if result != leaves[slot]:
+                    leaves[slot] = result
+                    leaves_changed = True
+        self.last_time = tasktime
+
+        last_results = self.results
+        if self.top_slots is not None:
+            # end conditions read straight from the leaves only change with
+            # them
+            if not leaves_changed and last_results is not None:
+                return last_results, False
+            leaves = self.leaf_results
+            results = [leaves[slot] for slot in self.top_slots]
+        else:
+            results = [self.evaluate(node, dt_s) for node in self.nodes]
+
+        self.results = results
+        if last_results is None or results == last_results:
+            return results, False
+        for condition, old, new in zip(self.conditions, last_results,
+                                       results):
+            if old != new:
+                for listener in self.listeners:
+                    listener(condition, new, tasktime)
+        return results, True
+
+    # Returns whether any leaf result changed.
+    def update_vectorized(self, tasktime):
+        positions = self.positions
+        positions[:-1] = [state[0] for state in self.states]
+        leaves = self.leaves
+
+        if self.thresholds:
+            sign = self.threshold_sign
+            bound = positions[self.threshold_reference] + self.threshold_offset
+            leaves[self.threshold_slot] = ((sign
+                                            * positions[self.threshold_target])
+                                           > (sign * bound))
+
+        if self.ranges:
+            position = positions[self.range_target]
+            inside = ((position <= self.range_upper)
+                      & (position >= self.range_lower))
+            # a position counts as in range since the previous tick, the
+            # start of positions out of range is infinite
+            start = np.where(inside,
+                             np.minimum(self.range_start, self.last_time),
+                             np.inf)
+            self.range_start = start
+            leaves[self.range_slot] = (tasktime - start) >= self.range_threshold
+
+        leaf_results = leaves.tolist()
+        changed = leaf_results != self.leaf_results
+        self.leaf_results = leaf_results
+        return changed
+
+    def evaluate(self, node, dt_s):
+        kind, item = node
+        if kind == self.LEAF:
+            return self.leaf_results[item]
+        if kind == self.ANY:
+            return any([self.evaluate(child, dt_s) for child in item])
+        if kind == self.ALL:
+            return all([self.evaluate(child, dt_s) for child in item])
+        return bool(item.check(dt_s))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import heapq
+
+
+# Orders constraints so that every constraint setting an object's state runs
+# before the constraints that read it. A constraint that sets an object
+# without reading it, like BindPosition, runs before those that adjust it,
+# like PositionLimits. Constraints that both set an object, or both adjust
+# it, keep their insertion order. Otherwise insertion order breaks ties.
+#
+# A cycle through constraints that adjust objects, like two PositionLimits
+# clamping each other, is broken at its earliest constraint, which keeps
+# those constraints in insertion order. A cycle of pure setters, which write
+# an object without reading it, has no meaningful order and raises a
+# ValueError naming them.
+def dependency_order(constraints):
+    count = len(constraints)
+    reads = [set(id(obj) for obj in constraint.reads() if obj is not None)
+             for constraint in constraints]
+    writes = [set(id(obj) for obj in constraint.writes() if obj is not None)
+              for constraint in constraints]
+
+    successors = [set() for _ in range(count)]
+    for writer in range(count):
+        for other in range(count):
+            if other == writer:
+                continue
+            for obj in writes[writer] & (reads[other] | writes[other]):
+                if obj not in writes[other]:
+                    precedes = True
+                elif (obj in reads[writer]) != (obj in reads[other]):
+                    precedes = obj not in reads[writer]
+                else:
+                    precedes = other > writer
+                if precedes:
+                    successors[writer].add(other)
+
+    indegree = [0] * count
+    for ndx in range(count):
+        for successor in successors[ndx]:
+            indegree[successor] += 1
+
+    setters = [bool(writes[ndx]) and not (writes[ndx] & reads[ndx])
+               for ndx in range(count)]
+
+    ready = [ndx for ndx in range(count) if indegree[ndx] == 0]
+    heapq.heapify(ready)
+    done = [False] * count
+    order = []
+    while len(order) < count:
+        if not ready:
+            remaining = [ndx for ndx in range(count) if not done[ndx]]
+            cycle = _cycle([ndx for ndx in remaining if setters[ndx]],
+                           successors)
+            if cycle:
+                raise ValueError("constraint dependency cycle among: "
+                                 + ", ".join(_describe(constraints[ndx])
+                                             for ndx in cycle))
+            ready.append(remaining[0])
+        ndx = heapq.heappop(ready)
+        if done[ndx]:
+            continue
+        done[ndx] = True
+        order.append(ndx)
+        for successor in successors[ndx]:
+            indegree[successor] -= 1
+            if indegree[successor] == 0 and not done[successor]:
+                heapq.heappush(ready, successor)
+
+    return [constraints[ndx] for ndx in order]
+
+
+# The nodes left over by a topological sort of the subgraph of nodes, which
+# are the nodes on or after a cycle, or an empty list.
+def _cycle(nodes, successors):
+    members = set(nodes)
+    indegree = {ndx: 0 for ndx in nodes}
+    for ndx in nodes:
+        for successor in successors[ndx] & members:
+            indegree[successor] += 1
+    ready = [ndx for ndx in nodes if indegree[ndx] == 0]
+    while ready:
+        ndx = ready.pop()
+        members.discard(ndx)
+        for successor in successors[ndx]:
+            if successor in members:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    ready.append(successor)
+    return sorted(members)
+
+
+def _describe(constraint):
+    target = getattr(constraint, "target", None)
+    return (type(constraint).__name__ + "("
+            + ("" if target is None else target.name) + ")")
+
+
+# Applies constraints in the order given by dependency_order, which is
+# computed once.
+class ConstraintSchedule:
+
+    def __init__(self, constraints):
+        self.constraints = dependency_order(constraints)
+        self.applies = [constraint.apply for constraint in self.constraints]
+
+    def apply(self):
+        for apply in self.applies:
+            apply()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import collections
+import copy
+
+
+# Logging policies decide per column whether a value is written this tick.
+# A task compiles one copy of the policy per column when it starts, so
+# policies may keep per-column state.
+class LogPolicy:
+
+    def due(self, tick, value):
+        return True
+
+
+# Writes every `every`-th tick.
+class Decimate(LogPolicy):
+
+    def __init__(self, every):
+        self.every = every
+
+    def due(self, tick, value):
+        return tick % self.every == 0
+
+
+# Writes a value only when it moved more than `tolerance` since it was last
+# written.
+class OnChange(LogPolicy):
+
+    def __init__(self, tolerance=0.0):
+        self.tolerance = tolerance
+        self.last = None
+
+    def due(self, tick, value):
+        if self.last is not None and abs(value - self.last) <= self.tolerance:
+            return False
+        self.last = value
+        return True
+
+
+# Writes the task data file rows according to the compiled policies.
+#
+# A row is written when any of its columns is due, with the time columns and
+# the due columns filled in and the others left empty. Around every event,
+# a change of the task state or of an end condition, all columns are written
+# for burst_before ticks before and burst_after ticks after it. To know about
+# events ahead of a row, rows are held back by burst_before ticks.
+class DataLogger:
+    TIME_FIELDS = ("taskstate", "tasktime", "experimenttime", "clocktime")
+
+    def __init__(self,
+                 fieldnames,
+                 policies,
+                 write_row,
+                 burst_before=0,
+                 burst_after=0):
+
+        self.write_row = write_row
+        self.burst_before = burst_before
+        self.burst_after = burst_after
+
+        # columns without a policy are written every row
+        self.always = [field for field in fieldnames
+                       if field in self.TIME_FIELDS or field not in policies]
+        self.policies = [(field, copy.copy(policies[field]))
+                         for field in fieldnames
+                         if field not in self.TIME_FIELDS
+                         and field in policies]
+        self.full_rate = len(self.always) == len(fieldnames)
+        # whether some columns besides the time columns are always written
+        self.always_values = any(field not in self.TIME_FIELDS
+                                 for field in self.always)
+
+        self.tick = 0
+        self.held = collections.deque()
+        self.events = collections.deque()
+
+    def log(self, data, event=False):
+        if self.full_rate:
+            self.write_row(data)
+            return
+
+        if event:
+            self.events.append(self.tick)
+        self.held.append((self.tick, data))
+        self.tick += 1
+
+        if len(self.held) > self.burst_before:
+            self.release(*self.held.popleft())
+
+    def release(self, tick, data):
+        while self.events and self.events[0] < tick - self.burst_after:
+            self.events.popleft()
+        # every event seen so far is at most burst_before ticks ahead
+        if self.events and self.events[0] <= tick + self.burst_before:
+            self.write_row(data)
+            return
+
+        row = None
+        for field, policy in self.policies:
+            if policy.due(tick, data[field]):
+                if row is None:
+                    row = {field: data[field] for field in self.always}
+                row[field] = data[field]
+
+        if row is None and self.always_values:
+            row = {field: data[field] for field in self.always}
+        if row is not None:
+            self.write_row(row)
+
+    def flush(self):
+        while self.held:
+            self.release(*self.held.popleft())
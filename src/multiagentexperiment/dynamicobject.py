@@ -4,7 +4,13 @@
 import numpy as np
 
 
+# Tasks hold many of these, so they are slotted. The state list is created
+# once and reset in place, which lets constraints and conditions keep a direct
+# reference to it.
 class DynamicObject:
+    __slots__ = ("name", "appearance", "record_data", "mass", "state",
+                 "queued_force", "force", "initial_state")
+
     POS = 0
     VEL = 1
     ACC = 2
@@ -21,34 +27,86 @@ class DynamicObject:
         self.record_data = record_data
 
         self.mass = mass
-        self.state = np.zeros((3,))
+        self.state = [0.0, 0.0, 0.0]
         self.queued_force = 0.0
         self.force = 0.0
 
-        self.initial_state = initial_state
+        self.initial_state = tuple(initial_state)
         self.reset()
 
     def reset(self):
 
-        self.state = self.initial_state
+        self.state[:] = self.initial_state
 
+    # Objects without mass are kinematic: their state is set by a role or by
+    # constraints and is not integrated.
     def step(self, dt_s):
-        self.force = self.queued_force
-        if self.mass > 0.0:
-            self.state[self.ACC] = (self.force / self.mass)
+        state = self.state
+        self.force = force = self.queued_force
         self.queued_force = 0.0
-        self.state[self.VEL] += self.state[self.ACC] * dt_s
-        self.state[self.POS] += self.state[self.VEL] * dt_s
+        if self.mass > 0.0:
+            state[2] = acc = force / self.mass
+            state[1] += acc * dt_s
+            state[0] += state[1] * dt_s
 
     def add_force(self, force):
         self.queued_force += force
 
 
+def _get_references(item):
+    if hasattr(type(item), "reference"):
+        reference = getattr(item, "reference", None)
+        return [] if reference is None else [reference]
+    references = getattr(item, "_references", None)
+    if references is None:
+        references = item._references = []
+    return references
+
+
+def _set_references(item, references):
+    references = list(references)
+    if hasattr(type(item), "reference"):
+        if len(references) > 1:
+            raise ValueError(type(item).__name__
+                             + " takes a single reference")
+        item.reference = references[0] if references else None
+        item.reference_state = (None if item.reference is None
+                                else item.reference.state)
+    else:
+        item._references = references
+
+
+# Constraints and conditions keep the state lists of their target and of
+# their single reference object, so apply() and check() index them directly.
+# Assigning references sets that reference. Classes without a reference slot,
+# such as subclasses written against the former references list, keep the
+# list they are given or start from an empty one.
+#
+# reads() and writes() name the objects whose state apply() reads and sets,
+# which orders the constraints of a task. The defaults assume a constraint
+# reads its target and references and may set the target state, unless it
+# is marked as only adding force with SETS_STATE = False.
 class Constraint:
+    __slots__ = ("target", "target_state", "_references")
+    SETS_STATE = True
 
     def __init__(self, target):
         self.target = target
-        self.references = []
+        self.target_state = None if target is None else target.state
+
+    @property
+    def references(self):
+        return _get_references(self)
+
+    @references.setter
+    def references(self, references):
+        _set_references(self, references)
+
+    def reads(self):
+        return [self.target] + self.references
+
+    def writes(self):
+        return [self.target] if self.SETS_STATE else []
 
     def apply(self):
         pass
@@ -56,171 +114,214 @@ class Constraint:
 
 
 class Damping(Constraint):
+    __slots__ = ("b",)
+    SETS_STATE = False
 
     def __init__(self, b, target):
         self.b = b
         super().__init__(target)
 
     def apply(self):
-        force = (self.target.state[1] * -self.b)
-        self.target.add_force(force)
+        force = (self.target_state[1] * -self.b)
+        self.target.queued_force += force
 
 
 class CompressionSpring(Constraint):
+    __slots__ = ("spring_coeff", "resting_length", "reference",
+                 "reference_state")
+    SETS_STATE = False
 
     def __init__(self, target, reference, spring_coeff, resting_length):
         self.spring_coeff = spring_coeff
         self.resting_length = resting_length
         super().__init__(target)
-        self.references.append(reference)
+        self.reference = reference
+        self.reference_state = reference.state
 
     def apply(self):
 
-        pos1 = self.target.state[0]
-        pos2 = self.references[0].state[0]
+        pos1 = self.target_state[0]
+        pos2 = self.reference_state[0]
 
         compression = (pos2 + self.resting_length) - pos1
         if compression > 0:
             force = compression * self.spring_coeff
 
-            self.target.add_force(force)
+            self.target.queued_force += force
 
 
 class TensionSpring(Constraint):
+    __slots__ = ("spring_coeff", "resting_length", "reference",
+                 "reference_state")
+    SETS_STATE = False
 
     def __init__(self, target, reference, spring_coeff, resting_length):
         self.spring_coeff = spring_coeff
         self.resting_length = resting_length
         super().__init__(target)
-        self.references.append(reference)
+        self.reference = reference
+        self.reference_state = reference.state
 
     def apply(self):
 
-        pos1 = self.target.state[0]
-        pos2 = self.references[0].state[0]
+        pos1 = self.target_state[0]
+        pos2 = self.reference_state[0]
 
         tension = pos1 - (pos2 + self.resting_length)
         if tension > 0:
             force = tension * -self.spring_coeff
 
-            self.target.add_force(force)
+            self.target.queued_force += force
 
 
 class BindPosition(Constraint):
+    __slots__ = ("reference", "reference_state", "offset", "proportion")
 
     def __init__(self, target, reference, offset=0.0, proportion=1.0):
         super().__init__(target)
-        self.references.append(reference)
+        self.reference = reference
+        self.reference_state = reference.state
         self.offset = offset
         self.proportion = proportion
 
+    def reads(self):
+        return [self.reference]
+
     def apply(self):
-        self.target.state[0] = ((self.references[0].state[0]
+        self.target_state[0] = ((self.reference_state[0]
                                  * self.proportion)
                                 + self.offset)
 
 
 class PositionLimits(Constraint):
+    __slots__ = ("bound_pos", "bound_neg", "reference", "reference_state")
 
     def __init__(self, target, pos=None, neg=None, reference=None):
         self.bound_pos = pos
         self.bound_neg = neg
 
         super().__init__(target)
-        if reference is not None:
-            self.references.append(reference)
+        self.reference = reference
+        self.reference_state = None if reference is None else reference.state
 
     def apply(self):
         ref_offset = 0.0
-        if len(self.references) > 0:
-            ref_offset = self.references[0].state[0]
+        if self.reference_state is not None:
+            ref_offset = self.reference_state[0]
 
+        state = self.target_state
         if (self.bound_pos is not None
-           and (self.target.state[0] > (ref_offset + self.bound_pos))):
-            self.target.state[0] = (ref_offset + self.bound_pos)
+           and (state[0] > (ref_offset + self.bound_pos))):
+            state[0] = (ref_offset + self.bound_pos)
         if (self.bound_neg is not None
-           and (self.target.state[0] < (ref_offset + self.bound_neg))):
-            self.target.state[0] = (ref_offset + self.bound_neg)
+           and (state[0] < (ref_offset + self.bound_neg))):
+            state[0] = (ref_offset + self.bound_neg)
 
 
 class SpringLawSolid(Constraint):
+    __slots__ = ("spring_coeff", "offset", "sign", "reference",
+                 "reference_state")
+    SETS_STATE = False
 
     def __init__(self, target, reference, spring_coeff, offset):
         self.spring_coeff = spring_coeff
         self.offset = offset
+        self.sign = float(np.sign(spring_coeff))
         super().__init__(target)
-        self.references.append(reference)
+        self.reference = reference
+        self.reference_state = reference.state
 
     def apply(self):
-        target = self.target.state[0]
-        ref = self.references[0].state[0]
+        target = self.target_state[0]
+        ref = self.reference_state[0]
 
+        # the penetration has the sign of the spring coefficient
         penetration = (ref + self.offset) - target
-        if np.sign(penetration) == np.sign(self.spring_coeff):
-            force = (np.sign(self.spring_coeff)
+        if penetration * self.sign > 0.0:
+            force = (self.sign
                      * penetration
                      * self.spring_coeff)
-            self.target.add_force(force)
+            self.target.queued_force += force
 
 
 class Condition:
+    __slots__ = ("target", "target_state", "_references")
 
     def __init__(self, target):
         self.target = target
-        self.references = []
+        self.target_state = None if target is None else target.state
+
+    @property
+    def references(self):
+        return _get_references(self)
+
+    @references.setter
+    def references(self, references):
+        _set_references(self, references)
 
     def check(self, dt_s):
         return False
 
 
 class ConditionOR(Condition):
+    __slots__ = ("conditions",)
 
     def __init__(self, references):
         super().__init__(None)
 
         if(isinstance(references, list)):
-            for ref in references:
-                self.references.append(ref)
+            self.conditions = tuple(references)
         else:
-            self.references.append(references)
+            self.conditions = (references,)
+
+    @property
+    def references(self):
+        return list(self.conditions)
+
+    @references.setter
+    def references(self, references):
+        self.conditions = tuple(references)
 
     def check(self, dt_s):
-        for ref in self.references:
+        for ref in self.conditions:
             if(ref.check(dt_s)):
                 return True
         return False
 
 
 class ConditionAND(ConditionOR):
+    __slots__ = ()
 
     def check(self, dt_s):
-        for ref in self.references:
+        for ref in self.conditions:
             if(not ref.check(dt_s)):
                 return False
         return True
 
 
 class PositionThreshold(Condition):
+    __slots__ = ("reference", "reference_state", "check_greater", "offset")
 
     def __init__(self, target, offset=0.0, check_greater=True, reference=None):
         super().__init__(target)
-        if reference is not None:
-            self.references.append(reference)
+        self.reference = reference
+        self.reference_state = None if reference is None else reference.state
         self.check_greater = check_greater
         self.offset = offset
 
     def check(self, dt_s):
         ref_offset = 0.0
-        if len(self.references) > 0:
-            ref_offset = self.references[0].state[0]
+        if self.reference_state is not None:
+            ref_offset = self.reference_state[0]
 
         if self.check_greater:
-            return (self.target.state[0] > (ref_offset + self.offset))
+            return (self.target_state[0] > (ref_offset + self.offset))
         else:
-            return (self.target.state[0] < (ref_offset + self.offset))
+            return (self.target_state[0] < (ref_offset + self.offset))
 
 
 class InRangeForDuration(Condition):
+    __slots__ = ("upper_bound", "lower_bound", "duration_s", "elapsed_s")
 
     def __init__(self,
                  target,
@@ -236,8 +337,9 @@ class InRangeForDuration(Condition):
         self.elapsed_s = 0.0
 
     def check(self, dt_s):
-        if ((self.target.state[0] <= self.upper_bound)
-           and (self.target.state[0] >= self.lower_bound)):
+        position = self.target_state[0]
+        if ((position <= self.upper_bound)
+           and (position >= self.lower_bound)):
             self.elapsed_s += dt_s
         else:
             self.elapsed_s = 0.0
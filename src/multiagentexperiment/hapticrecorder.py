@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+
+import numpy as np
+
+
+# Records every sample of a haptic io loop into a preallocated ring buffer.
+# The io loop is the only writer of write_count and the drain thread the only
+# writer of read_count, so no lock is needed and record() never blocks. If the
+# drain thread falls a whole buffer behind, new samples are dropped and counted
+# rather than stalling the io loop.
+#
+# Sample times are on the clock of the handle, the session Clock once the
+# experiment starts tracing, as is the clocktime column of the task data.
+class HapticRecorder:
+    MAGIC = b"MAEHAPTIC1\n"
+    DTYPE = np.dtype([("time", "<f8"),
+                      ("position", "<f8"),
+                      ("velocity", "<f8"),
+                      ("force", "<f8")])
+
+    def __init__(self,
+                 filename,
+                 time_origin=0.0,
+                 capacity=2**16,
+                 drain_interval_s=0.05):
+
+        self.filename = filename
+        self.time_origin = time_origin
+        self.capacity = capacity
+        self.drain_interval_s = drain_interval_s
+
+        self.buffer = np.zeros((capacity,), dtype=self.DTYPE)
+        self.write_count = 0
+        self.read_count = 0
+        self.dropped = 0
+
+        self.file = open(filename, 'wb')
+        header = {"dtype": [list(field) for field in self.DTYPE.descr],
+                  "time_origin": time_origin}
+        self.file.write(self.MAGIC)
+        self.file.write(json.dumps(header).encode() + b"\n")
+
+        self.stop_flag = threading.Event()
+        self.drain_thread = threading.Thread(target=self.drain_loop,
+                                             daemon=True)
+        self.drain_thread.start()
+
+    def record(self, timestamp, position, velocity, force):
+        if self.write_count - self.read_count >= self.capacity:
+            self.dropped += 1
+            return
+
+        self.buffer[self.write_count % self.capacity] = (
+            timestamp - self.time_origin, position, velocity, force)
+        self.write_count += 1
+
+    def drain(self):
+        end = self.write_count
+        start = self.read_count
+        if end == start:
+            return
+
+        start_ndx = start % self.capacity
+        end_ndx = end % self.capacity
+        if start_ndx < end_ndx:
+            self.file.write(self.buffer[start_ndx:end_ndx].tobytes())
+        else:
+            self.file.write(self.buffer[start_ndx:].tobytes())
+            self.file.write(self.buffer[:end_ndx].tobytes())
+
+        self.read_count = end
+
+    def drain_loop(self):
+        while not self.stop_flag.wait(self.drain_interval_s):
+            self.drain()
+
+    def close(self):
+        self.stop_flag.set()
+        self.drain_thread.join()
+        self.drain()
+        self.file.close()
+
+        if self.dropped > 0:
+            print(self.filename, "dropped", self.dropped, "haptic samples")
+
+
+def load_haptic_recording(filename):
+    with open(filename, 'rb') as rec_file:
+        if rec_file.readline() != HapticRecorder.MAGIC:
+            raise ValueError(filename + " is not a haptic recording")
+        header = json.loads(rec_file.readline().decode())
+        dtype = np.dtype([tuple(field) for field in header["dtype"]])
+        samples = np.frombuffer(rec_file.read(), dtype=dtype)
+    return header, samples
@@ -1,43 +1,142 @@
 #!/usr/bin/env python3
 
+import bisect
+import collections
+import importlib
+import json
+import os
 import time
 import threading
+import warnings
+
+import numpy as np
+
+from .hapticrecorder import HapticRecorder
+from .multiagentexperiment import Participant, Handle
+from .stateestimator import SavitzkyGolayEstimator
+from .timing import Clock, FrameLog
+
+
+# pyglet opens a display connection and loads OpenGL on import, and falcon_c
+# loads the USB driver, so both are only imported once a human participant or
+# a hardware handle is actually created.
+pyglet = None
+
+
+def _load_pyglet():
+    global pyglet
+    if pyglet is None:
+        pyglet = importlib.import_module("pyglet")
+    return pyglet
+
+
+# installed with the package
+DEFAULT_CALIBRATION_FILE = os.path.join(os.path.dirname(__file__),
+                                        "falcon_calibration.json")
+
+
+# Returns the gain and offset that map the raw z axis of the falcon onto the
+# normalized task axis, -1 with the handle pulled fully toward the subject and
+# 1 pushed fully away. The bounds of the device serial are used, or the
+# "default" ones when serial is "default" or has no bounds of its own. The
+# falcon does not report its serial, so a file with bounds for particular
+# devices needs the serial of the device. Without a calibration file, or
+# without bounds for the device, the raw mapping of -z is kept.
+def load_calibration(calibration_file, serial=None):
+    if calibration_file is None:
+        return -1.0, 0.0
+    if not os.path.exists(calibration_file):
+        warnings.warn("no falcon calibration file " + calibration_file
+                      + ", using the raw handle position")
+        return -1.0, 0.0
+
+    with open(calibration_file) as cal_file:
+        calibrations = json.load(cal_file)
+
+    serials = sorted(key for key in calibrations if key != "default")
+    if serial is None and serials:
+        raise ValueError("falcon calibration file " + calibration_file
+                         + " has bounds for devices " + ", ".join(serials)
+                         + ", pass the serial of the falcon, or \"default\"")
+
+    bounds = calibrations.get(str(serial))
+    if bounds is None:
+        bounds = calibrations.get("default")
+        if bounds is not None and serial not in (None, "default"):
+            warnings.warn("no calibration for falcon " + str(serial)
+                          + " in " + calibration_file
+                          + ", using the default bounds")
+    if bounds is None:
+        warnings.warn("no calibration for falcon " + str(serial)
+                      + " and no default in " + calibration_file
+                      + ", using the raw handle position")
+        return -1.0, 0.0
+    z_range = bounds["z_max"] - bounds["z_min"]
+
+    gain = -2.0 / z_range
+    offset = 1.0 + (2.0 * bounds["z_min"] / z_range)
+    return gain, offset
 
-import pyglet
 
-from multiagentexperiment import Participant, Handle
-from falcon_c.falcon import NovintFalcon
+class FalconHapticHandle(Handle):
 
+    def __init__(self,
+                 falcon_device_num,
+                 serial=None,
+                 calibration_file=DEFAULT_CALIBRATION_FILE,
+                 estimator=None,
+                 device_factory=None):
 
-class FalconHapticHandle(Handle):
+        # device_factory(timestep_s, device_num) builds the device, e.g.
+        # SimulatedFalcon for running without hardware.
+        if device_factory is None:
+            from falcon_c.falcon import NovintFalcon
+            device_factory = NovintFalcon
 
-    def __init__(self, falcon_device_num):
+        self.gain, self.offset = load_calibration(calibration_file, serial)
+        # (sample time, (position, velocity, acceleration)) written as one
+        # tuple by the io loop so readers never mix values from two samples
+        self.sample = (None, (0.0, 0.0, 0.0))
 
         self.timestep_s = 1.0 / 1000
-        self.falcon = NovintFalcon(self.timestep_s, falcon_device_num)
+        if estimator is None:
+            estimator = SavitzkyGolayEstimator(self.timestep_s)
+        self.estimator = estimator
+        self.recorder = None
+
+        self.falcon = device_factory(self.timestep_s, falcon_device_num)
         if falcon_device_num==0:
             self.falcon.set_leds(0, 1, 0)
         elif falcon_device_num==1:
             self.falcon.set_leds(0, 0, 1)
 
         super().__init__()
+        self.clock = Clock()
 
         self.shutdown_flag = threading.Event()
         self.shutdown_flag.clear()
-        falcon_io_loop = threading.Thread(target=self.update_falcon)
-        falcon_io_loop.start()
+        self.falcon_io_loop = threading.Thread(target=self.update_falcon)
+        self.falcon_io_loop.start()
 
     def get_position(self):
-        pos = self.falcon.get_pos()
-        return -pos[2]
+        return self.sample[1][0]
 
     def get_velocity(self):
-        vel = self.falcon.get_vel()
-        return -vel[2]
+        return self.sample[1][1]
+
+    def get_state(self):
+        return self.sample[1]
+
+    def get_sample(self):
+        return self.sample
 
     def update_falcon(self):
         start_time = time.monotonic()
         io_loop_count = 0
+        traced_sample_time = None
+        last_clock = None
+        last_sample_time = None
+        period = None
         while not self.shutdown_flag.is_set():
 
             while True:
@@ -50,30 +149,240 @@ class FalconHapticHandle(Handle):
                     break
 
             self.falcon.update_state()
-
-            self.falcon.add_force(0, 0, self.force)
+            clock = self.clock
+            sample_time = clock.now()
+            raw_position = self.falcon.get_pos()[2]
+            self.sample = (sample_time,
+                           self.estimator.update((self.gain * raw_position)
+                                                 + self.offset))
+
+            force_sample_time = self.force_sample_time
+            force = self.force
+            self.falcon.add_force(0, 0, force)
             self.falcon.output_forces()
 
+            # time from the handle sample to the force computed from it
+            # reaching the device, traced once per new force command
+            if (self.tracer is not None
+               and force_sample_time is not traced_sample_time):
+                self.tracer.span("force_loop", force_sample_time)
+                traced_sample_time = force_sample_time
+
+            # the spread of the io loop period is its jitter
+            if self.tracer is not None:
+                if period is None:
+                    period = self.tracer.histogram("haptic_period",
+                                                   bin_s=0.00005, max_s=0.02)
+                # start_tracing replaces the clock
+                if clock is last_clock:
+                    period.add(sample_time - last_sample_time)
+                last_clock = clock
+                last_sample_time = sample_time
+
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.record(sample_time, raw_position,
+                                self.falcon.get_vel()[2], force)
+
             io_loop_count += 1
 
-    def update_force(self, force):
-        super().update_force(-force)
+    def update_force(self, force, sample_time=None):
+        super().update_force(-force, sample_time)
+
+    def start_recording(self, filename):
+        self.recorder = HapticRecorder(filename)
 
     def shutdown(self):
         self.shutdown_flag.set()
+        self.falcon_io_loop.join()
+        if self.recorder is not None:
+            self.recorder.close()
         super().shutdown()
 
 
+# Draws a reference trajectory window as one thick line strip held in a
+# persistent vertex list. Vertices are laid out in task time, x = t * scale,
+# and the strip is scrolled by translating it to the current task time, so a
+# segment is written once when its sample scrolls into the window. The vertex
+# list is a ring of segments: each tick zeroes the segments that scrolled out
+# and writes the new ones in their place. Triangles need no order, so the
+# ring is drawn as is. A window that does not continue the last one (a new
+# trial) or outgrows the ring rebuilds it.
+class TrajectoryLayer:
+
+    FLOATS_PER_SEGMENT = 12
+
+    def __init__(self, width=10, color=(200, 200, 200)):
+        self.width = width
+        self.color = color
+        self.batch = pyglet.graphics.Batch()
+        self.vertex_list = None
+        self.capacity = 0
+        self.head = 0
+        # start times of the segments in the ring, oldest first
+        self.segment_times = collections.deque()
+        self.last_time = None
+        self.last_point = None
+
+    def reset(self):
+        self.segment_times.clear()
+        self.last_time = None
+        self.last_point = None
+
+    def update(self, timesteps, values, scale, offset_y):
+        if not timesteps:
+            if self.last_time is not None:
+                self.write(0, np.zeros(self.capacity
+                                       * self.FLOATS_PER_SEGMENT))
+                self.reset()
+            return
+
+        new = bisect.bisect_right(timesteps, self.last_time) \
+            if self.last_time is not None else 0
+        if (self.last_time is None or new == 0
+                or timesteps[new - 1] != self.last_time):
+            self.rebuild(timesteps, values, scale, offset_y)
+            return
+
+        dropped = 0
+        while self.segment_times and self.segment_times[0] < timesteps[0]:
+            self.segment_times.popleft()
+            dropped += 1
+        added = len(timesteps) - new
+        if len(self.segment_times) + added > self.capacity:
+            self.rebuild(timesteps, values, scale, offset_y)
+            return
+
+        if dropped:
+            self.write(self.head, np.zeros(dropped * self.FLOATS_PER_SEGMENT))
+            self.head = (self.head + dropped) % self.capacity
+        if added:
+            x = np.asarray(timesteps[new:]) * scale
+            y = offset_y + (np.asarray(values[new:]) * scale)
+            first = (self.head + len(self.segment_times)) % self.capacity
+            self.write(first, self.segments(np.append(self.last_point[0], x),
+                                            np.append(self.last_point[1], y)))
+            self.segment_times.extend(timesteps[new - 1:-1])
+            self.last_time = timesteps[-1]
+            self.last_point = (x[-1], y[-1])
+
+    def rebuild(self, timesteps, values, scale, offset_y):
+        x = np.asarray(timesteps) * scale
+        y = offset_y + (np.asarray(values) * scale)
+        count = len(timesteps) - 1
+        # room for the window to grow and scroll without a rebuild
+        capacity = max(2 * count, 16)
+        if self.vertex_list is None or capacity > self.capacity:
+            if self.vertex_list is not None:
+                self.vertex_list.delete()
+            vertex_count = 6 * capacity
+            self.vertex_list = self.batch.add(
+                vertex_count, pyglet.gl.GL_TRIANGLES, None,
+                ('v2f/stream', (0.0,) * (2 * vertex_count)),
+                ('c3B/static', tuple(self.color) * vertex_count))
+            self.capacity = capacity
+
+        vertices = np.zeros(self.capacity * self.FLOATS_PER_SEGMENT)
+        if count > 0:
+            vertices[:count * self.FLOATS_PER_SEGMENT] = self.segments(x, y)
+        self.vertex_list.vertices[:] = vertices.tolist()
+        self.head = 0
+        self.segment_times = collections.deque(timesteps[:-1])
+        self.last_time = timesteps[-1]
+        self.last_point = (x[-1], y[-1])
+
+    # The vertices of the segments between consecutive points, two triangles
+    # each.
+    def segments(self, x, y):
+        dx = np.diff(x)
+        dy = np.diff(y)
+        length = np.maximum(np.hypot(dx, dy), 1e-9)
+        nx = -dy / length * (self.width / 2.0)
+        ny = dx / length * (self.width / 2.0)
+
+        x1, y1 = x[:-1], y[:-1]
+        x2, y2 = x[1:], y[1:]
+        return np.stack([x1 + nx, y1 + ny,
+                         x1 - nx, y1 - ny,
+                         x2 - nx, y2 - ny,
+                         x1 + nx, y1 + ny,
+                         x2 - nx, y2 - ny,
+                         x2 + nx, y2 + ny], axis=1).ravel()
+
+    # Writes consecutive segments from a ring slot on, wrapping at the end.
+    def write(self, slot, floats):
+        start = slot * self.FLOATS_PER_SEGMENT
+        end = self.capacity * self.FLOATS_PER_SEGMENT
+        split = min(len(floats), end - start)
+        vertices = self.vertex_list.vertices
+        vertices[start:start + split] = floats[:split].tolist()
+        if split < len(floats):
+            vertices[:len(floats) - split] = floats[split:].tolist()
+
+    def draw(self, origin_x, tasktime, scale):
+        if self.vertex_list is None:
+            return
+        pyglet.gl.glPushMatrix()
+        pyglet.gl.glTranslatef(origin_x - (tasktime * scale), 0.0, 0.0)
+        self.batch.draw()
+        pyglet.gl.glPopMatrix()
+
+
+# Lays out each distinct message once and keeps the label, keyed by text, font
+# and size, until it falls out of the cache. Messages with line breaks are laid
+# out as centered multiline text.
+class MessageLayer:
+
+    def __init__(self, font_name="FreeMono", font_size=12, max_cached=32):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.max_cached = max_cached
+        self.labels = collections.OrderedDict()
+
+    def get_label(self, text, x, y, width):
+        key = (text, self.font_name, self.font_size)
+        label = self.labels.get(key)
+        if label is None:
+            multiline = "\n" in text
+            label = pyglet.text.Label(text,
+                                      font_name=self.font_name,
+                                      font_size=self.font_size,
+                                      x=x, y=y,
+                                      width=width if multiline else None,
+                                      multiline=multiline,
+                                      align="center",
+                                      anchor_x="center", anchor_y="center")
+            self.labels[key] = label
+            if len(self.labels) > self.max_cached:
+                self.labels.popitem(last=False)
+        else:
+            self.labels.move_to_end(key)
+            if label.x != x or label.y != y:
+                label.position = (x, y)
+        return label
+
+    def draw(self, text, x, y, width):
+        self.get_label(text, x, y, width).draw()
+
+
 class HumanFalconParticipant(Participant):
 
-    def __init__(self, name, timestep_s, falcon_device_num):
+    # handle and window default to the falcon and the screen with the same
+    # number as the device. Passing them in allows running the renderer
+    # offscreen and without hardware, e.g. for benchmarks.
+    def __init__(self, name, timestep_s, falcon_device_num, falcon_serial=None,
+                 handle=None, window=None, refresh_rate_hz=60.0):
+
+        _load_pyglet()
 
-        display = pyglet.canvas.get_display()
-        screen = display.get_screens()[falcon_device_num]
-        self.window = pyglet.window.Window(screen.width, screen.height, 
-                                           screen=screen,
-                                           style=pyglet.window.Window.WINDOW_STYLE_BORDERLESS)
-        self.window.set_location(screen.x, screen.y)
+        if window is None:
+            display = pyglet.canvas.get_display()
+            screen = display.get_screens()[falcon_device_num]
+            window = pyglet.window.Window(screen.width, screen.height,
+                                          screen=screen,
+                                          style=pyglet.window.Window.WINDOW_STYLE_BORDERLESS)
+            window.set_location(screen.x, screen.y)
+        self.window = window
 
         window_size = self.window.get_size()
         self.scale = window_size[0] / 2;
@@ -81,27 +390,58 @@ class HumanFalconParticipant(Participant):
 
         self.visible_state = {}
         self.window.on_draw = self.on_draw
+        # the event loop flips the window after on_draw, wrap it to stamp the
+        # moment the frame is handed to the display
+        self.window_flip = self.window.flip
+        self.window.flip = self.flip
         self.fps_display = pyglet.window.FPSDisplay(window=self.window)
+        self.frame_log = FrameLog(refresh_rate_hz)
+        self.trajectory_layers = {}
+        self.message_layer = MessageLayer()
+        self.frame_start = 0.0
+        self.draw_end = 0.0
+
+        if handle is None:
+            handle = FalconHapticHandle(falcon_device_num,
+                                        serial=falcon_serial)
+        super().__init__(name, handle)
+        self.clock = Clock()
+
+    def start_recording(self, datafolder):
+        super().start_recording(datafolder)
+        self.frame_log.open(datafolder + "/" + self.name + "_frames.tsv")
+
+    def shutdown(self):
+        super().shutdown()
+        self.frame_log.close()
+
+    def flip(self):
+        swap_start = self.clock.now()
+        self.window_flip()
+        swap_end = self.clock.now()
+        self.frame_log.record(self.frame_start, self.draw_end,
+                              swap_start, swap_end)
 
-        super().__init__(name, FalconHapticHandle(falcon_device_num))
+        if self.tracer is not None:
+            self.tracer.span("motion_to_photon",
+                             self.visible_state.get("handle_sample_time"))
 
     def on_draw(self):
 
+        self.frame_start = self.clock.now()
+
         self.window.clear()
 
         if "reference_trajectories" in self.visible_state:
+            tasktime = self.visible_state["tasktime"]
             for key, value in self.visible_state["reference_trajectories"].items():
-                for point_ndx, point in enumerate(value["full"]):
-                    if point_ndx == 0:
-                        continue
-                    last_point = value["full"][point_ndx - 1]
-                    x1 = self.offset[0] + self.scale + ((value["timesteps"][point_ndx - 1] - self.visible_state["tasktime"]) * self.scale)
-                    y1 = self.offset[1] + self.scale + (last_point * self.scale)
-                    x2 = self.offset[0] + self.scale + ((value["timesteps"][point_ndx] - self.visible_state["tasktime"]) * self.scale)
-                    y2 = self.offset[1] + self.scale + (point * self.scale)
-                    pyglet.shapes.Line(x1, y1, x2, y2, 
-                                       width=10, 
-                                       color=(200,200,200)).draw()
+                layer = self.trajectory_layers.get(key)
+                if layer is None:
+                    layer = TrajectoryLayer()
+                    self.trajectory_layers[key] = layer
+                layer.update(value["timesteps"], value["full"], self.scale,
+                             self.offset[1] + self.scale)
+                layer.draw(self.offset[0] + self.scale, tasktime, self.scale)
 
         if "dynamic_objects" in self.visible_state:
             for key, value in self.visible_state["dynamic_objects"].items():
@@ -195,13 +535,20 @@ class HumanFalconParticipant(Participant):
                                                     color[0], color[1], color[2], 64,)))
 
         if "task_message" in self.visible_state:
-            pyglet.text.Label(self.visible_state["task_message"],
-                              font_name="FreeMono", font_size=12,
-                              x= self.offset[0] + self.scale, 
-                              y= self.offset[1] + (self.scale * 1.1),
-                              anchor_x="center", anchor_y="center").draw()
+            self.message_layer.draw(self.visible_state["task_message"],
+                                    self.offset[0] + self.scale,
+                                    self.offset[1] + (self.scale * 1.1),
+                                    self.scale * 1.8)
 
         self.fps_display.draw()
 
+        self.draw_end = self.clock.now()
+        if self.tracer is not None:
+            self.tracer.span("frame_draw", self.frame_start)
+
     def get_action(self, visible_state):
+        # a new scene starts a new trial, its windows restart the layers
+        if visible_state is not self.visible_state:
+            for layer in self.trajectory_layers.values():
+                layer.reset()
         self.visible_state = visible_state
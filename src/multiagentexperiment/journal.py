@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import collections
+import datetime
+import json
+import os
+import struct
+import threading
+import zlib
+
+
+# Write-ahead journal of a session: the procedure position, the header and
+# rows of every task data file and a snapshot of each task when its trial
+# ends.
+#
+# append() only puts the record on a deque, so the experiment tick never
+# waits for the disk. A writer thread packs everything appended since the
+# last sync into one chunk, framed by its length and crc32, and fsyncs it
+# every sync_interval_s. A crash loses at most that much of the session, and
+# a torn chunk at the end of the file is detected and ignored on load.
+class SessionJournal:
+    CHUNK = struct.Struct("<4sII")
+    MAGIC = b"MAEJ"
+
+    def __init__(self, filename, sync_interval_s=0.25, tracer=None):
+
+        self.filename = filename
+        self.sync_interval_s = sync_interval_s
+        self.tracer = tracer
+
+        self.pending = collections.deque()
+
+        # a resumed session appends after the last intact chunk, dropping a
+        # chunk torn by the crash
+        if os.path.exists(filename):
+            with open(filename, 'rb') as journal_file:
+                records, intact_length = read_chunks(journal_file.read())
+            os.truncate(filename, intact_length)
+        self.file = open(filename, 'ab')
+
+        self.stop_flag = threading.Event()
+        self.sync_thread = threading.Thread(target=self.sync_loop,
+                                            daemon=True)
+        self.sync_thread.start()
+
+    def append(self, record):
+        self.pending.append(record)
+
+    def session(self, datafolder, resume_trial):
+        self.append({"type": "session",
+                     "datafolder": datafolder,
+                     "resume_trial": resume_trial,
+                     "time": datetime.datetime.now().isoformat()})
+
+    # generator_state is the state of the TrialGenerator that made the trial,
+    # right after making it.
+    def trial_start(self, trial_index, trial, generator_state=None):
+        record = {"type": "trial_start",
+                  "trial": trial_index,
+                  "tasks": [task.name for task in trial]}
+        if generator_state is not None:
+            record["generator"] = generator_state
+        self.append(record)
+
+    def task_header(self, task, fieldnames):
+        self.append({"type": "header",
+                     "task": task.name,
+                     "filename": task.filename,
+                     "parameters": {str(key): str(value) for key, value
+                                    in task.parameters.items()},
+                     "fields": fieldnames})
+
+    def row(self, task, values):
+        self.append({"type": "row", "task": task.name, "values": values})
+
+    def trial_end(self, trial_index, trial):
+        self.append({"type": "trial_end",
+                     "trial": trial_index,
+                     "tasks": {task.name: {"taskstate": task.taskstate,
+                                           "time": task.time,
+                                           "metrics": task.metric_results()}
+                               for task in trial}})
+
+    def sync(self):
+        records = []
+        while self.pending:
+            records.append(self.pending.popleft())
+        if not records:
+            return
+
+        if self.tracer is not None:
+            sync_start = self.tracer.clock.now()
+
+        payload = json.dumps(records).encode()
+        self.file.write(self.CHUNK.pack(self.MAGIC, len(payload),
+                                        zlib.crc32(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        if self.tracer is not None:
+            self.tracer.span("journal_sync", sync_start)
+
+    def sync_loop(self):
+        while not self.stop_flag.wait(self.sync_interval_s):
+            self.sync()
+
+    def close(self):
+        self.stop_flag.set()
+        self.sync_thread.join()
+        self.sync()
+        self.file.close()
+
+
+# Decodes chunks up to the first one that is truncated or fails its
+# checksum. Returns the records and the length of the intact chunks.
+def read_chunks(data):
+    records = []
+    offset = 0
+    chunk_size = SessionJournal.CHUNK.size
+    while offset + chunk_size <= len(data):
+        magic, length, crc = SessionJournal.CHUNK.unpack_from(data, offset)
+        payload = data[offset + chunk_size:offset + chunk_size + length]
+        if (magic != SessionJournal.MAGIC or len(payload) != length
+                or zlib.crc32(payload) != crc):
+            break
+        records.extend(json.loads(payload.decode()))
+        offset += chunk_size + length
+
+    return records, offset
+
+
+def load_session_journal(filename):
+    with open(filename, 'rb') as journal_file:
+        records, intact_length = read_chunks(journal_file.read())
+    return records
+
+
+# Index of the trial a session should resume at: the trial that was running
+# when the journal ends, or the one after the last completed trial.
+def resume_trial_index(records):
+    resume_trial = 0
+    for record in records:
+        if record["type"] == "trial_start":
+            resume_trial = record["trial"]
+        elif record["type"] == "trial_end":
+            resume_trial = record["trial"] + 1
+    return resume_trial
+
+
+# Writes the journaled rows of the tasks of an interrupted trial into a
+# recovered subfolder of their data folder, under the name of their data
+# file, since the data files themselves may have lost their buffered rows.
+# The subfolder keeps them out of the analysis of the session folder, where
+# the trial appears once as rerun by the resumed session. Returns the names of
+# the files written.
+def recover_interrupted_trial(records):
+    headers = {}
+    rows = {}
+    interrupted = []
+    for record in records:
+        if record["type"] == "trial_start":
+            interrupted = record["tasks"]
+            rows = {name: [] for name in interrupted}
+        elif record["type"] == "trial_end":
+            interrupted = []
+        elif record["type"] == "header":
+            headers[record["task"]] = record
+        elif record["type"] == "row" and record["task"] in rows:
+            rows[record["task"]].append(record["values"])
+
+    recovered = []
+    for name in interrupted:
+        if name not in headers:
+            continue
+        header = headers[name]
+        folder = os.path.join(os.path.dirname(header["filename"]),
+                              "recovered")
+        os.makedirs(folder, exist_ok=True)
+        filename = os.path.join(folder,
+                                os.path.basename(header["filename"]))
+        with open(filename, 'w') as recovered_file:
+            recovered_file.write("name" + '\t' + name + '\n')
+            for key, value in header["parameters"].items():
+                if key == "name":
+                    continue
+                recovered_file.write(key + '\t' + value + '\n')
+            recovered_file.write('\t'.join(header["fields"]) + '\n')
+            for values in rows[name]:
+                recovered_file.write('\t'.join('' if value is None
+                                               else str(value)
+                                               for value in values) + '\n')
+        recovered.append(filename)
+
+    return recovered
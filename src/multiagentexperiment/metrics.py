@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import math
+
+
+# Welford's online mean and variance, plus extrema. O(1) per sample.
+class RunningStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+    def rms(self):
+        if self.count == 0:
+            return 0.0
+        return math.sqrt((self.m2 / self.count) + (self.mean * self.mean))
+
+    def results(self, prefix):
+        return {prefix + "_count": self.count,
+                prefix + "_mean": self.mean,
+                prefix + "_std": self.std(),
+                prefix + "_rms": self.rms(),
+                prefix + "_min": self.min if self.count > 0 else 0.0,
+                prefix + "_max": self.max if self.count > 0 else 0.0}
+
+
+# Metrics are updated by the task after every step and report their running
+# results as a flat dict, both live and when the task closes.
+class Metric:
+
+    def __init__(self, name):
+        self.name = name
+
+    def reset(self):
+        pass
+
+    def update(self, task):
+        pass
+
+    def results(self):
+        return {}
+
+
+class TrackingError(Metric):
+
+    def __init__(self, name, target, reference):
+        super().__init__(name)
+        self.target = target
+        self.reference = reference
+        self.stats = RunningStats()
+
+    def reset(self):
+        self.stats.reset()
+
+    def update(self, task):
+        self.stats.add(float(self.reference.now - self.target.state[0]))
+
+    def results(self):
+        return self.stats.results(self.name)
+
+
+class ForceStats(Metric):
+
+    def __init__(self, name, target):
+        super().__init__(name)
+        self.target = target
+        self.stats = RunningStats()
+
+    def reset(self):
+        self.stats.reset()
+
+    def update(self, task):
+        self.stats.add(float(self.target.force))
+
+    def results(self):
+        return self.stats.results(self.name)
+
+
+# Work done by a handle on the task. The force on the handle object is the
+# force the task applies to the hand, so the hand does the opposite work.
+class HandleWork(Metric):
+
+    def __init__(self, name, target):
+        super().__init__(name)
+        self.target = target
+        self.reset()
+
+    def reset(self):
+        self.last_position = None
+        self.positive_work = 0.0
+        self.negative_work = 0.0
+
+    def update(self, task):
+        position = float(self.target.state[0])
+        if self.last_position is not None:
+            work = -float(self.target.force) * (position - self.last_position)
+            if work > 0.0:
+                self.positive_work += work
+            else:
+                self.negative_work += work
+        self.last_position = position
+
+    def results(self):
+        return {self.name + "_positive": self.positive_work,
+                self.name + "_negative": self.negative_work,
+                self.name + "_net": self.positive_work + self.negative_work}
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+import importlib
+import sys
+import time
+
+from .telemetry import DEFAULT_PORT, TelemetryMonitor
+
+
+# The monitor runs in its own process, next to the experiment. pyglet is
+# imported when the plot window is opened, see humanfalconparticipant.
+pyglet = None
+
+
+def _load_pyglet():
+    global pyglet
+    if pyglet is None:
+        pyglet = importlib.import_module("pyglet")
+    return pyglet
+
+
+# Plots every series of a TelemetryMonitor as a strip chart of its last
+# history_s, each scaled to its own maximum.
+class TelemetryPlot:
+
+    def __init__(self, monitor, width=900, height=700, update_s=0.05):
+        _load_pyglet()
+        self.monitor = monitor
+        self.window = pyglet.window.Window(width, height, resizable=True,
+                                           caption="telemetry")
+        self.window.on_draw = self.on_draw
+        self.labels = {}
+        pyglet.clock.schedule_interval(self.update, update_s)
+
+    def update(self, dt):
+        self.monitor.poll()
+
+    def label(self, name, text, x, y):
+        label = self.labels.get(name)
+        if label is None:
+            label = self.labels[name] = pyglet.text.Label(
+                                            "", font_size=10,
+                                            anchor_x="left", anchor_y="top")
+        label.text = text
+        label.position = (x, y)
+        label.draw()
+
+    def on_draw(self):
+        self.window.clear()
+        width, height = self.window.get_size()
+        monitor = self.monitor
+        names = list(monitor.series)
+
+        row_height = height / (len(names) + 1)
+        self.label(None, monitor.status(), 4, height - 4)
+
+        start = monitor.clock - monitor.history_s
+        for row, name in enumerate(names):
+            bottom = height - (row + 2) * row_height
+            points = monitor.series[name]
+            values = [value for clock, value in points]
+            top = max(max(values), 1e-9)
+            coords = []
+            for clock, value in points:
+                coords.append((clock - start) / monitor.history_s * width)
+                coords.append(bottom + 2
+                              + (value / top) * (row_height - 18))
+            if len(points) > 1:
+                pyglet.graphics.draw(len(points), pyglet.gl.GL_LINE_STRIP,
+                                     ('v2f', coords))
+            self.label(name, "%s  %.4g  (max %.4g)"
+                       % (name, values[-1], top), 4, bottom + row_height - 2)
+
+
+# Prints the status and the latest value of every series once per interval.
+def print_telemetry(monitor, interval_s=1.0):
+    while True:
+        time.sleep(interval_s)
+        monitor.poll()
+        print(monitor.status())
+        print("  " + "  ".join("%s %.4g" % (name, series[-1][1])
+                               for name, series in monitor.series.items()))
+
+
+#   python -m multiagentexperiment.monitor [port] [--text]
+#
+# Plots the telemetry of an experiment created with telemetry_port, or prints
+# it with --text or when no window can be opened.
+def main(argv):
+    args = [arg for arg in argv[1:] if arg != "--text"]
+    port = int(args[0]) if args else DEFAULT_PORT
+    monitor = TelemetryMonitor(port)
+
+    if "--text" not in argv:
+        try:
+            TelemetryPlot(monitor)
+        except Exception as error:
+            print("cannot plot telemetry (%s), printing it instead" % error)
+        else:
+            pyglet.app.run()
+            return
+
+    print_telemetry(monitor)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,12 +1,30 @@
 #!/usr/bin/env python3
 
+import bisect
+import concurrent.futures
 import copy
 import csv
 import datetime
+import json
+import math
 import os
 
 import numpy as np
 
+from .columnstore import CompressedColumnWriter
+from .conditionmonitor import ConditionMonitor
+from .constraintschedule import ConstraintSchedule
+from .datalogger import DataLogger
+from .dynamicobject import Condition, DynamicObject
+from .journal import \
+    SessionJournal, \
+    load_session_journal, \
+    recover_interrupted_trial, \
+    resume_trial_index
+from .procedure import TrialGenerator
+from .telemetry import TelemetryPublisher
+from .timing import Clock, LatencyTracer
+
 
 class Role:
 
@@ -18,20 +36,31 @@ class Role:
 
         self.participant = None
         self.handle_object = handle_object
+        self.encoder = VisibleStateEncoder()
+        self.sample_time = None
 
     def assign(self, participant):
         self.participant = participant
+        self.encoder.reset()
 
     def get_positions(self, task_state):
-        self.participant.get_action(self.perspective.task_to_view(task_state))
-        self.handle_object.state[0] = self.perspective.handle_to_task(
-                                        self.participant.handle.get_position())
-        self.handle_object.state[1] = 0
-        self.handle_object.state[2] = 0
+        visible_state = self.perspective.task_to_view(task_state)
+        if self.sample_time is not None:
+            # the handle sample the shown state was computed from, used by
+            # renderers to trace motion to photon latency
+            visible_state = dict(visible_state)
+            visible_state["handle_sample_time"] = self.sample_time
+        message = self.encoder.encode(visible_state)
+        self.participant.receive_visible_state(message)
+
+        self.sample_time, handle_state = self.participant.handle.get_sample()
+        for ndx in range(3):
+            self.handle_object.state[ndx] = self.perspective.handle_to_task(
+                                                handle_state[ndx])
 
     def update_forces(self):
         force = self.perspective.task_to_handle(self.handle_object.queued_force)
-        self.participant.handle.update_force(force)
+        self.participant.handle.update_force(force, self.sample_time)
 
 
 class Perspective:
@@ -70,17 +99,263 @@ class FlippedPerspective(Perspective):
             for key, value in perspective_state["reference_trajectories"].items():
                 for point in range(len(value["full"])):
                     value["full"][point] *= -1
+                value["now"] *= -1
         return perspective_state
 
 
+def _values_equal(a, b):
+    if isinstance(a, (np.ndarray, list)) or isinstance(b, (np.ndarray, list)):
+        return np.array_equal(a, b)
+    return a == b
+
+
+_IMMUTABLE = (int, float, str, bytes, type(None))
+# compared with == without the array checks of _values_equal
+_SCALARS = frozenset([int, float, bool, str, type(None),
+                      np.float64, np.int64, np.bool_])
+_MISSING = object()
+
+
+# numpy scalars are sent as python numbers, which pickle to a fraction of
+# their size
+def _copy_value(value):
+    if isinstance(value, _IMMUTABLE):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return copy.deepcopy(value)
+
+
+# Samples to drop from the front of the window last sent and the index of
+# the first new sample in timesteps. Windows that do not continue the last
+# one are sent whole.
+def _window_delta(timesteps, sent):
+    if sent and timesteps:
+        start = bisect.bisect_right(timesteps, sent[-1])
+        drop = bisect.bisect_left(sent, timesteps[0])
+        if tuple(timesteps[:start]) == sent[drop:]:
+            return drop, start
+    return len(sent), 0
+
+
+# The first message of a task carries the whole visible state, including the
+# static scene description (appearance, messages) and the reference windows.
+# After that a delta carries the top level values and the fields of objects
+# and references that changed, compared by value against the last message,
+# the samples that scrolled into each reference window and the keys that
+# disappeared. Window samples are identified by their time, see
+# ReferenceTrajectory, so every sample is sent once.
+class VisibleStateEncoder:
+    SCENE = "scene"
+    DELTA = "delta"
+    OBJECTS = "dynamic_objects"
+    REFERENCES = "reference_trajectories"
+    WINDOW_FIELDS = ("timesteps", "full")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last_values = None
+        self.last_objects = None
+        self.last_references = None
+        self.last_windows = None
+
+    def encode(self, visible_state):
+        if self.last_values is None:
+            self.last_values = {}
+            self.last_objects = {}
+            self.last_references = {}
+            self.last_windows = {}
+            self.delta(visible_state)
+            return {"type": self.SCENE,
+                    "state": copy.deepcopy(visible_state)}
+        return self.delta(visible_state)
+
+    def delta(self, visible_state):
+        message = {"type": self.DELTA}
+        removed = []
+
+        values = {}
+        last_values = self.last_values
+        count = 0
+        for key, value in visible_state.items():
+            if key == self.OBJECTS or key == self.REFERENCES:
+                continue
+            count += 1
+            if (key not in last_values
+                    or not _values_equal(value, last_values[key])):
+                values[key] = _copy_value(value)
+                last_values[key] = _copy_value(value)
+        if len(last_values) > count:
+            for key in list(last_values):
+                if key not in visible_state:
+                    removed.append([key])
+                    del last_values[key]
+        if values:
+            message["state"] = values
+
+        objects = self.fields_delta(visible_state.get(self.OBJECTS),
+                                    self.last_objects, self.OBJECTS, removed)
+        if objects:
+            message["objects"] = objects
+
+        references = visible_state.get(self.REFERENCES)
+        fields = self.fields_delta(references, self.last_references,
+                                   self.REFERENCES, removed)
+        if fields:
+            message["references"] = fields
+        if references is None:
+            references = {}
+        windows = {}
+        last_windows = self.last_windows
+        for name, reference in references.items():
+            timesteps = reference["timesteps"]
+            sent = last_windows.get(name)
+            if sent is None:
+                drop, start = 0, 0
+            else:
+                drop, start = _window_delta(timesteps, sent)
+            if sent is None or drop or start < len(timesteps):
+                windows[name] = (drop, timesteps[start:],
+                                 list(reference["full"][start:]))
+                last_windows[name] = tuple(timesteps)
+        if len(last_windows) > len(references):
+            for name in list(last_windows):
+                if name not in references:
+                    del last_windows[name]
+        if windows:
+            message["windows"] = windows
+
+        if removed:
+            message["removed"] = removed
+        return message
+
+    # Changed fields of the entries of an object or reference dict. The
+    # position, velocity and acceleration of objects are compared as numbers.
+    def fields_delta(self, entries, last_entries, key, removed):
+        if entries is None:
+            if last_entries:
+                removed.append([key])
+                last_entries.clear()
+            return None
+
+        skipped = self.WINDOW_FIELDS if key == self.REFERENCES else ()
+        delta = {}
+        for name, entry in entries.items():
+            last = last_entries.get(name)
+            if last is None:
+                last = last_entries[name] = {}
+            changed = None
+            count = 0
+            for field, value in entry.items():
+                if field in skipped:
+                    continue
+                count += 1
+                last_value = last.get(field, _MISSING)
+                if field == "state":
+                    state = tuple(value)
+                    if last_value == state:
+                        continue
+                    last[field] = state
+                    value = [float(item) for item in state]
+                elif last_value is not _MISSING and (
+                        value == last_value if type(value) in _SCALARS
+                        else _values_equal(value, last_value)):
+                    continue
+                else:
+                    last[field] = _copy_value(value)
+                    value = _copy_value(value)
+                if changed is None:
+                    changed = delta[name] = {}
+                changed[field] = value
+            if len(last) > count:
+                for field in list(last):
+                    if field not in entry:
+                        removed.append([key, name, field])
+                        del last[field]
+
+        if len(last_entries) > len(entries):
+            for name in list(last_entries):
+                if name not in entries:
+                    removed.append([key, name])
+                    del last_entries[name]
+        return delta
+
+
+class VisibleStateDecoder:
+
+    def __init__(self):
+        self.visible_state = {}
+
+    def apply(self, message):
+        if message["type"] == VisibleStateEncoder.SCENE:
+            self.visible_state = message["state"]
+            return self.visible_state
+
+        state = self.visible_state
+        if "state" in message:
+            state.update(message["state"])
+        if "objects" in message:
+            self.update_fields(VisibleStateEncoder.OBJECTS, message["objects"])
+        if "references" in message:
+            self.update_fields(VisibleStateEncoder.REFERENCES,
+                               message["references"])
+        if "windows" in message:
+            references = state.setdefault(VisibleStateEncoder.REFERENCES, {})
+            for name, (drop, timesteps, values) \
+                    in message["windows"].items():
+                reference = references.setdefault(name, {})
+                window_times = reference.setdefault("timesteps", [])
+                window_values = reference.setdefault("full", [])
+                del window_times[:drop]
+                del window_values[:drop]
+                window_times.extend(timesteps)
+                window_values.extend(values)
+        for path in message.get("removed", ()):
+            parent = state
+            for key in path[:-1]:
+                parent = parent[key]
+            del parent[path[-1]]
+        return state
+
+    def update_fields(self, key, delta):
+        entries = self.visible_state.setdefault(key, {})
+        for name, fields in delta.items():
+            entry = entries.get(name)
+            if entry is None:
+                entries[name] = fields
+            else:
+                entry.update(fields)
+
+
 class Participant:
 
     def __init__(self, name, handle):
         self.name = name
         self.handle = handle
+        self.visible_state_decoder = VisibleStateDecoder()
+        self.clock = None
+        self.tracer = None
+
+    def start_tracing(self, clock, tracer):
+        self.clock = clock
+        self.tracer = tracer
+        self.handle.start_tracing(clock, tracer)
+
+    # Writes the participant's own recordings, such as raw handle samples,
+    # into the session data folder.
+    def start_recording(self, datafolder):
+        self.handle.start_recording(datafolder + "/" + self.name
+                                    + "_haptics.bin")
+
+    # Participants that forward or record the raw messages (remote or replay
+    # participants) override this instead of get_action.
+    def receive_visible_state(self, message):
+        visible_state = self.visible_state_decoder.apply(message)
+        return self.get_action(visible_state)
 
     def get_action(self, visible_state):
-        self.agent.get_action(visible_state, handle_state)
         return self.handle.get_position()
 
     def shutdown(self):
@@ -92,17 +367,45 @@ class Handle():
     def __init__(self):
         self.x = 0.0
         self.force = 0.0
+        self.force_sample_time = None
+        self.clock = None
+        self.tracer = None
 
     def get_position(self):
         return self.x
 
-    def update_force(self, force):
+    # position, velocity and acceleration
+    def get_state(self):
+        return (self.get_position(), 0.0, 0.0)
+
+    # Returns the clock time the state was sampled at, or None for handles
+    # without their own io loop, together with the state.
+    def get_sample(self):
+        return (None, self.get_state())
+
+    # sample_time is the handle sample the force was computed from.
+    def update_force(self, force, sample_time=None):
         self.force = force
+        self.force_sample_time = sample_time
+
+    def start_tracing(self, clock, tracer):
+        self.clock = clock
+        self.tracer = tracer
+
+    # Handles with a high rate io loop record every raw sample to filename,
+    # timestamped with the clock passed to start_tracing.
+    def start_recording(self, filename):
+        pass
 
     def shutdown(self):
         pass
 
 
+# The window of the trajectory around the current time is sampled every
+# timestep on a grid of absolute times, the multiples of timestep. Consecutive
+# windows share their samples, so only the samples scrolling into the window
+# are evaluated, and only those are sent to the participants. now is the
+# value at the current time itself, which generally lies between samples.
 class ReferenceTrajectory:
 
     def __init__(self, name,
@@ -123,30 +426,65 @@ class ReferenceTrajectory:
         self.time_window = time_window
         self.timestep = timestep
 
+        # grid index of the first sample of the window
+        self.first_ndx = 0
+        self.timesteps = []
+        self.full = []
+
         self.now = 0
         self.update(self.now)
 
     def update(self, time):
-        time_past = np.arange(time+self.time_window[0], time, self.timestep)
-        self.past = self.trajectory_function(time_past)
-
+        first = int(math.ceil((time + self.time_window[0]) / self.timestep))
+        last = int(math.floor((time + self.time_window[1]) / self.timestep))
+
+        keep = first - self.first_ndx
+        if 0 <= keep <= len(self.timesteps):
+            end = min(max(last + 1 - self.first_ndx, keep), len(self.timesteps))
+            timesteps = self.timesteps[keep:end]
+            full = self.full[keep:end]
+        else:
+            timesteps = []
+            full = []
+
+        new_first = first + len(timesteps)
+        if last >= new_first:
+            times = np.arange(new_first, last + 1) * self.timestep
+            values = np.broadcast_to(self.trajectory_function(times),
+                                     times.shape)
+            timesteps.extend(times.tolist())
+            full.extend(values.tolist())
+
+        self.first_ndx = first
+        self.timesteps = timesteps
+        self.full = full
+
+        split = bisect.bisect_left(timesteps, time)
+        self.past = full[:split]
+        self.future = full[split:]
         self.now = self.trajectory_function(time)
 
-        time_future = np.linspace(time,
-                                  time+self.time_window[1],
-                                  int(self.time_window[1]/self.timestep),
-                                  endpoint=True)
-        self.future = self.trajectory_function(time_future)
 
-        self.full = []
-        self.full.extend(self.past)
-        self.full.extend([self.now])
-        self.full.extend(self.future)
+# The dynamic objects a condition or metric reads, following the conditions
+# combined by ConditionOR and ConditionAND.
+def _objects_read(item):
+    candidates = [getattr(item, "target", None),
+                  getattr(item, "reference", None)]
+    candidates.extend(getattr(item, "references", []))
+
+    objects = []
+    for candidate in candidates:
+        if isinstance(candidate, DynamicObject):
+            objects.append(candidate)
+        elif isinstance(candidate, Condition):
+            objects.extend(_objects_read(candidate))
+    return objects
 
-        self.timesteps = []
-        self.timesteps.extend(time_past)
-        self.timesteps.extend([time])
-        self.timesteps.extend(time_future)
+
+# Whether a constraint sets the state of the given objects only.
+def _sets_only(constraint, objects):
+    writes = [id(obj) for obj in constraint.writes() if obj is not None]
+    return bool(writes) and all(obj in objects for obj in writes)
 
 
 class MultiAgentTask:
@@ -172,13 +510,41 @@ class MultiAgentTask:
         self.dynamic_objects = []
         self.pre_constraints = []
         self.constraints = []
+        self.pre_constraint_schedule = None
+        self.constraint_schedule = None
+        self.display_schedule = None
+        self.physics_objects = []
         self.reference_trajectories = []
         self.endconditions = []
+        self.endcondition_listeners = []
+        self.condition_monitor = None
+        self.metrics = []
+        self.log_policies = {}
+        self.log_burst_s = (0.0, 0.0)
 
         self.experimenttime = None
+        # When set, every data row is stamped with the time its tick started
+        # on this clock as clocktime. The experiment passes its session
+        # Clock, the time base of the haptic recordings and latency traces.
+        self.clock = None
+        self.clocktime = None
         
         self.datafolder = datafolder
         self.datafile = None
+        # "tsv" for tab separated text, "columns" for a compressed
+        # CompressedColumnWriter container using data_codec, by default the
+        # best one installed
+        self.data_format = "tsv"
+        self.data_codec = None
+        self.prepared = False
+        self.closed = False
+        self.journal = None
+        # metric results of a task completed in an interrupted session, see
+        # restore
+        self.restored_metrics = None
+        # when set, the phases of every step are traced as task_conditions,
+        # task_view, task_physics, task_metrics and task_logging spans
+        self.tracer = None
 
         self.timestep = timestep
         self.duration = duration
@@ -186,56 +552,239 @@ class MultiAgentTask:
 
     def add_obj(self, dynamicobject):
         self.dynamic_objects.append(dynamicobject)
+        self.constraint_schedule = None
 
     def add_constraint(self, constraint):
         self.constraints.append(constraint)
+        self.constraint_schedule = None
 
     def add_pre_constraint(self, constraint):
         self.pre_constraints.append(constraint)
+        self.pre_constraint_schedule = None
+
+    # Objects that are only drawn for the participants: massless, not
+    # recorded, not the handle of a role, and read by no end condition, no
+    # metric and no constraint other than those setting display objects.
+    # Constraints adding force to an object read it, so its target is never a
+    # display object.
+    def display_objects(self):
+        handles = set(id(role.handle_object) for role in self.roles)
+        display = set(id(obj) for obj in self.dynamic_objects
+                      if obj.mass == 0.0
+                      and not obj.record_data
+                      and id(obj) not in handles)
+
+        for item in self.endconditions + self.metrics:
+            for obj in _objects_read(item):
+                display.discard(id(obj))
+
+        constraints = self.pre_constraints + self.constraints
+        changed = True
+        while changed:
+            changed = False
+            for constraint in constraints:
+                if _sets_only(constraint, display):
+                    continue
+                for obj in constraint.reads():
+                    if id(obj) in display:
+                        display.discard(id(obj))
+                        changed = True
+        return display
+
+    # Both constraint phases are applied in dependency order, see
+    # ConstraintSchedule. Display objects are left out of the physics tick:
+    # the constraints setting them, from either phase, are applied once per
+    # tick right before the state is rendered, and they are not stepped.
+    def schedule_constraints(self):
+        display = self.display_objects()
+        self.pre_constraint_schedule = ConstraintSchedule(
+                                        [constraint for constraint
+                                         in self.pre_constraints
+                                         if not _sets_only(constraint,
+                                                           display)])
+        self.constraint_schedule = ConstraintSchedule(
+                                    [constraint for constraint
+                                     in self.constraints
+                                     if not _sets_only(constraint, display)])
+        self.display_schedule = ConstraintSchedule(
+                                    [constraint for constraint
+                                     in self.pre_constraints + self.constraints
+                                     if _sets_only(constraint, display)])
+        self.physics_objects = [obj for obj in self.dynamic_objects
+                                if id(obj) not in display]
 
     def add_ref(self, reference_trajectory):
         self.reference_trajectories.append(reference_trajectory)
 
     def add_endcond(self, condition):
         self.endconditions.append(condition)
+        self.constraint_schedule = None
+        self.condition_monitor = None
+
+    # listener(condition, state, tasktime) is called whenever an end
+    # condition becomes true or false.
+    def add_endcond_listener(self, listener):
+        self.endcondition_listeners.append(listener)
+        if self.condition_monitor is not None:
+            self.condition_monitor.add_listener(listener)
+
+    # End conditions are evaluated together each tick, see ConditionMonitor.
+    def monitor_conditions(self):
+        self.condition_monitor = ConditionMonitor(self.endconditions)
+        self.condition_monitor.reset(self.time)
+        for listener in self.endcondition_listeners:
+            self.condition_monitor.add_listener(listener)
+
+    def add_metric(self, metric):
+        self.metrics.append(metric)
+        self.constraint_schedule = None
+
+    # Sets the logging policy of a data file column, or of all columns of a
+    # dynamic object or reference trajectory when given its name. Column
+    # policies take precedence over object policies.
+    def set_log_policy(self, name, policy):
+        self.log_policies[name] = policy
+
+    # Writes all columns at the full task rate from before_s before to
+    # after_s after every change of the task state or of an end condition.
+    def set_log_burst(self, before_s, after_s):
+        self.log_burst_s = (before_s, after_s)
+
+    def compile_log_policies(self, fieldnames):
+        policies = {}
+        for obj in self.dynamic_objects + self.reference_trajectories:
+            if obj.name not in self.log_policies:
+                continue
+            prefixes = ("object_" + obj.name + "_",
+                        "reference_" + obj.name + "_")
+            for field in fieldnames:
+                if field.startswith(prefixes):
+                    policies[field] = self.log_policies[obj.name]
+
+        for field in fieldnames:
+            if field in self.log_policies:
+                policies[field] = self.log_policies[field]
+        return policies
 
     def reset(self):
         self.time = 0.0
         self.taskstate = self.TASK_WAITING
+        self.endcondition_states = None
+        self.last_taskstate = self.TASK_WAITING
+        if self.condition_monitor is not None:
+            self.condition_monitor.reset(self.time)
 
         for dyn_obj in self.dynamic_objects:
             dyn_obj.reset()
 
-    def start(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    # Allocates everything the task needs before its first step. The
+    # experiment calls this from a background thread while the previous trial
+    # is still running, so start() itself is cheap.
+    def prepare(self):
+        for ref_traj in self.reference_trajectories:
+            ref_traj.update(self.time)
+
+        self.schedule_constraints()
+        self.monitor_conditions()
+
         if self.datafolder is not None:
             time_now = datetime.datetime.now()
             datetime_str = time_now.strftime("%Y-%b%d-%H%M")
 
             self.filename = (self.datafolder + "/"
                              + self.name + "_" + datetime_str)
-            self.datafile = open(self.filename, 'w')
+            fieldnames = self.get_header()
 
-            self.datafile.write("name" + '\t' + self.name + '\n')
-            for key, value in self.parameters.items():
-                if key == "name":
-                    continue
-                self.datafile.write(str(key)+'\t'+str(value)+'\n')
+            if self.data_format == "columns":
+                header = {"name": self.name,
+                          "parameters": {str(key): str(value) for key, value
+                                         in self.parameters.items()
+                                         if key != "name"}}
+                self.datawriter = CompressedColumnWriter(
+                                    self.filename + ".maecol",
+                                    fieldnames,
+                                    header=header,
+                                    codec=self.data_codec)
+            else:
+                self.datafile = open(self.filename, 'w')
+
+                self.datafile.write("name" + '\t' + self.name + '\n')
+                for key, value in self.parameters.items():
+                    if key == "name":
+                        continue
+                    self.datafile.write(str(key)+'\t'+str(value)+'\n')
+
+                self.datawriter = csv.DictWriter(self.datafile,
+                                                 fieldnames=fieldnames,
+                                                 delimiter='\t')
+                self.datawriter.writeheader()
+
+            before_s, after_s = self.log_burst_s
+            self.datalogger = DataLogger(
+                                fieldnames,
+                                self.compile_log_policies(fieldnames),
+                                self.write_row,
+                                burst_before=int(round(before_s
+                                                       / self.timestep)),
+                                burst_after=int(round(after_s
+                                                      / self.timestep)))
+
+        self.prepared = True
 
-            fieldnames = self.get_header()
-            self.datawriter = csv.DictWriter(self.datafile,
-                                             fieldnames=fieldnames,
-                                             delimiter='\t')
-            self.datawriter.writeheader()
+    def start(self):
+        if not self.prepared:
+            self.prepare()
+
+        if self.journal is not None and self.datafolder is not None:
+            self.journal.task_header(self, self.datawriter.fieldnames)
 
     def close(self):
         if self.datafolder is not None:
-            self.datafile.close()
+            self.datalogger.flush()
+            if self.datafile is not None:
+                self.datafile.close()
+            else:
+                self.datawriter.close()
+
+            if self.metrics:
+                with open(self.filename + "_metrics", 'w') as metricsfile:
+                    for key, value in self.metric_results().items():
+                        metricsfile.write(str(key) + '\t' + str(value) + '\n')
+
+        self.closed = True
+
+    # Marks the task as completed with the state journaled when it ended in an
+    # interrupted session, so a resumed session can replay the trials before
+    # the interrupted one without running them.
+    def restore(self, snapshot):
+        self.taskstate = snapshot["taskstate"]
+        self.time = snapshot["time"]
+        self.restored_metrics = snapshot["metrics"]
+        self.closed = True
+
+    # Running results of all metrics, available while the task runs.
+    def metric_results(self):
+        if self.restored_metrics is not None:
+            return dict(self.restored_metrics)
+        results = {}
+        for metric in self.metrics:
+            results.update(metric.results())
+        return results
 
     # The experiment is responsible for repeatedly calling step each timestep.
     # the task will assume that the time has elapsed.
     # This allows for faster than real-time execution
     # for simulated participants.
     def step(self, experimenttime):
+        if self.clock is not None:
+            self.clocktime = self.clock.now()
+        tracer = self.tracer
+        if tracer is not None:
+            phase_start = tracer.clock.now()
+
         self.time += self.timestep
         self.experimenttime = experimenttime
 
@@ -244,33 +793,64 @@ class MultiAgentTask:
         else:
             self.taskstate = self.TASK_RUNNING
 
-        for endcondition in self.endconditions:
-            if endcondition.check(self.timestep):
-                self.taskstate = self.TASK_COMPLETED
+        if self.condition_monitor is None:
+            self.monitor_conditions()
+        endcondition_states, changed = self.condition_monitor.update(
+                                        self.time, self.timestep)
+        if any(endcondition_states):
+            self.taskstate = self.TASK_COMPLETED
+
+        # changes of the task state and end conditions trigger log bursts
+        log_event = (self.endcondition_states is not None
+                     and (changed or self.taskstate != self.last_taskstate))
+        self.endcondition_states = endcondition_states
+        self.last_taskstate = self.taskstate
+
+        if tracer is not None:
+            phase_start = tracer.phase("task_conditions", phase_start)
 
         state = self.get_state_dict()
 
         for ref_traj in self.reference_trajectories:
             ref_traj.update(self.time)
 
-        for constraint in self.pre_constraints:
-            constraint.apply()
+        if (self.pre_constraint_schedule is None
+                or self.constraint_schedule is None):
+            self.schedule_constraints()
+
+        self.pre_constraint_schedule.apply()
+
+        # display objects are derived from the latest state as it is rendered
+        self.display_schedule.apply()
 
         for role in self.roles:
             role.get_positions(state)
 
-        for constraint in self.constraints:
-            constraint.apply()
+        if tracer is not None:
+            phase_start = tracer.phase("task_view", phase_start)
+
+        self.constraint_schedule.apply()
 
         for role in self.roles:
             role.update_forces()
 
-        for dyn_obj in self.dynamic_objects:
+        for dyn_obj in self.physics_objects:
             dyn_obj.step(self.timestep)
 
+        if tracer is not None:
+            phase_start = tracer.phase("task_physics", phase_start)
+
+        for metric in self.metrics:
+            metric.update(self)
+
+        if tracer is not None:
+            phase_start = tracer.phase("task_metrics", phase_start)
 
         if self.datafolder is not None:
-            self.write_data(state)
+            self.write_data(state, log_event)
+
+        if tracer is not None:
+            tracer.phase("task_logging", phase_start)
 
         return self.taskstate
 
@@ -308,6 +888,7 @@ class MultiAgentTask:
         fieldnames.append("taskstate")
         fieldnames.append("tasktime")
         fieldnames.append("experimenttime")
+        fieldnames.append("clocktime")
 
         for dyn_obj in self.dynamic_objects:
             if dyn_obj.record_data:
@@ -321,11 +902,12 @@ class MultiAgentTask:
 
         return fieldnames
 
-    def write_data(self, state_dict):
+    def write_data(self, state_dict, log_event=False):
         data = {}
         data["taskstate"] = state_dict["taskstate"]
         data["tasktime"] = state_dict["tasktime"]
         data["experimenttime"] = state_dict["experimenttime"]
+        data["clocktime"] = self.clocktime
 
         for key, value in state_dict["dynamic_objects"].items():
             if value["record"]:
@@ -337,47 +919,253 @@ class MultiAgentTask:
         for key, value in state_dict["reference_trajectories"].items():
             data["reference_"+key+"_now"] = value["now"]
 
-        self.datawriter.writerow(data)
+        self.datalogger.log(data, log_event)
+
+    def write_row(self, row):
+        self.datawriter.writerow(row)
+
+        if self.journal is not None:
+            self.journal.row(self, [row.get(field) for field
+                                    in self.datawriter.fieldnames])
 
 
 class MultiAgentExperiment:
 
     def __init__(self,
-                 datafolder_prefix):
+                 datafolder_prefix,
+                 record_participants=True,
+                 journal_sync_interval_s=0.25,
+                 resume_folder=None,
+                 data_format=None,
+                 telemetry_port=None):
 
         self.participants = []
         self.procedure = []
         self.datafolder_prefix = datafolder_prefix
 
-        time_now = datetime.datetime.now()
-        datetime_str = time_now.strftime("%Y-%b%d-%H%M%S")
+        # A resumed session keeps writing into the folder of the interrupted
+        # one and restarts at the trial that was running when it stopped.
+        # Trials produced by a TrialGenerator before that are generated again
+        # from the journaled results, see replay_procedure. Recordings and
+        # latencies of a resumed session go to a subfolder so they do not
+        # overwrite those of the interrupted one.
+        self.resume_trial = 0
+        self.resume_records = None
+        if resume_folder is not None:
+            self.datafolder = resume_folder
+            records = load_session_journal(self.datafolder
+                                           + "/session.journal")
+            self.resume_trial = resume_trial_index(records)
+            self.resume_records = records
+            for filename in recover_interrupted_trial(records):
+                print("recovered", filename)
+
+            self.sessionfolder = (self.datafolder + "/resumed_"
+                                  + datetime.datetime.now().strftime("%H%M%S"))
+            os.mkdir(self.sessionfolder)
+        else:
+            time_now = datetime.datetime.now()
+            datetime_str = time_now.strftime("%Y-%b%d-%H%M%S")
 
-        self.datafolder = "./data/" + self.datafolder_prefix + "_" + datetime_str
+            self.datafolder = ("./data/" + self.datafolder_prefix + "_"
+                               + datetime_str)
 
-        os.mkdir(self.datafolder)
+            os.mkdir(self.datafolder)
+            self.sessionfolder = self.datafolder
         print(self.datafolder)
 
         self.time = 0.0
 
-    def assign(self):
+        self.record_participants = record_participants
+
+        self.clock = Clock()
+        self.tracer = LatencyTracer(self.clock)
+
+        self.journal_sync_interval_s = journal_sync_interval_s
+        self.journal = None
+
+        # overrides the data_format of every task when set
+        self.data_format = data_format
+
+        # When set, the session streams live telemetry to a monitor on this
+        # local port, see TelemetryPublisher, and the phases of every task
+        # step are traced.
+        self.telemetry_port = telemetry_port
+        self.telemetry = None
+
+    # Compiles the procedure into a plan of trial indices and role to
+    # participant assignments, then starts the first trial. Trials produced
+    # by a TrialGenerator are assigned as they are generated.
+    def assign(self, verbose=True):
+
+        self.verbose = verbose
+        self.plan = []
+        for trial_ndx, trial in enumerate(self.procedure):
+            if isinstance(trial, TrialGenerator):
+                self.plan.append(None)
+            else:
+                self.plan.append(self.assign_trial(trial_ndx, trial))
+        if self.resume_records is not None:
+            self.replay_procedure(self.resume_records)
+
+        self.prepare_executor = concurrent.futures.ThreadPoolExecutor(
+                                    max_workers=1)
+        self.prepare_future = None
+
+        # experimenttime is accumulated from the step dt, which starts
+        # counting now
+        self.clock.start()
+        for participant in self.participants:
+            participant.start_tracing(self.clock, self.tracer)
+            if self.record_participants:
+                participant.start_recording(self.sessionfolder)
+
+        if self.journal_sync_interval_s is not None:
+            self.journal = SessionJournal(self.datafolder + "/session.journal",
+                                          self.journal_sync_interval_s,
+                                          self.tracer)
+            self.journal.session(self.datafolder, self.resume_trial)
+
+        if self.telemetry_port is not None:
+            self.telemetry = TelemetryPublisher(self, self.telemetry_port)
+
+        self.start_trial(self.resume_trial)
+
+    # Brings the procedure of a resumed session to where the interrupted one
+    # stopped. The journal counts trials in the procedure as expanded by its
+    # generators, so every generator is asked again for the trials it made
+    # before the interrupted one, and each trial is restored as completed
+    # from its journaled snapshot for the generators to score. Raises
+    # ValueError when the trials or the generator states do not match the
+    # journal, e.g. for a generator that does not report its state.
+    def replay_procedure(self, records):
+        started = {}
+        ended = {}
+        for record in records:
+            if record["type"] == "trial_start":
+                started[record["trial"]] = record
+            elif record["type"] == "trial_end":
+                ended[record["trial"]] = record
+
+        trial_index = 0
+        while trial_index < self.resume_trial:
+            if trial_index >= len(self.procedure):
+                raise ValueError("the journal has more trials than the "
+                                 "procedure")
+            trial = self.procedure[trial_index]
+            generator = None
+            if isinstance(trial, TrialGenerator):
+                generator = trial
+                trial = generator.next_trial(self)
+                if trial is None:
+                    del self.procedure[trial_index]
+                    del self.plan[trial_index]
+                    continue
+
+            start = started.get(trial_index)
+            end = ended.get(trial_index)
+            if (start is None or end is None
+                    or start["tasks"] != [task.name for task in trial]):
+                raise ValueError("trial " + str(trial_index)
+                                 + " does not match the journal")
+            if generator is not None:
+                state = generator.state()
+                if (state is None or "generator" not in start
+                        or json.loads(json.dumps(state))
+                        != start["generator"]):
+                    raise ValueError("cannot resume the generator of trial "
+                                     + str(trial_index)
+                                     + ", its state does not match the "
+                                     "journal")
+                self.procedure.insert(trial_index, trial)
+                self.plan.insert(trial_index,
+                                 self.assign_trial(trial_index, trial))
 
-        for trial in self.procedure:
-            print("simultaneous tasks in this trial:", len(trial))
-            participant_ndx = 0
             for task in trial:
-                print(task.name, "roles:", len(task.roles), "participant:", end=" ")
-                for role in task.roles:
-                    print(participant_ndx, end=" ")
-                    role.assign(self.participants[participant_ndx])
-                    participant_ndx += 1
-                print()
-        self.active_trial = self.procedure[0]
+                task.restore(end["tasks"][task.name])
+            trial_index += 1
+
+    def assign_trial(self, trial_ndx, trial):
+        assignments = []
+        participant_ndx = 0
+        for task in trial:
+            for role in task.roles:
+                role.assign(self.participants[participant_ndx])
+                assignments.append((task, role, participant_ndx))
+                participant_ndx += 1
+
+        if self.verbose:
+            print("trial", trial_ndx,
+                  "simultaneous tasks in this trial:", len(trial))
+            for task in trial:
+                print(task.name, "roles:", len(task.roles), "participant:",
+                      *[ndx for t, r, ndx in assignments if t is task])
+
+        return assignments
+
+    # Returns the prepared trial at trial_index, asking a generator for its
+    # next trial. None means the generator is exhausted.
+    def prepare_trial(self, trial_index):
+        trial = self.procedure[trial_index]
+        if isinstance(trial, TrialGenerator):
+            trial = trial.next_trial(self)
+            if trial is None:
+                return None
+
+        for task in trial:
+            if self.data_format is not None:
+                task.data_format = self.data_format
+            task.prepare()
+        return trial
+
+    def start_trial(self, trial_index):
+        if self.prepare_future is not None:
+            trial = self.prepare_future.result()
+            self.prepare_future = None
+        else:
+            trial = self.prepare_trial(trial_index)
+
+        while trial is None:
+            del self.procedure[trial_index]
+            del self.plan[trial_index]
+            if trial_index >= len(self.procedure):
+                self.completed()
+                return
+            trial = self.prepare_trial(trial_index)
+
+        # generated trials are inserted ahead of their generator
+        generator_state = None
+        if isinstance(self.procedure[trial_index], TrialGenerator):
+            generator_state = self.procedure[trial_index].state()
+            self.procedure.insert(trial_index, trial)
+            self.plan.insert(trial_index,
+                             self.assign_trial(trial_index, trial))
+
+        self.trial_index = trial_index
+        self.active_trial = trial
+        if self.journal is not None:
+            self.journal.trial_start(trial_index, trial, generator_state)
         for task in self.active_trial:
+            task.journal = self.journal
+            task.clock = self.clock
+            if self.telemetry is not None:
+                task.tracer = self.tracer
             task.start()
 
+        # Warm up the next trial in the background while this one runs. A
+        # generator that still waits for the result of a running trial is
+        # asked when that trial ends instead.
+        next_index = trial_index + 1
+        if next_index < len(self.procedure):
+            next_trial = self.procedure[next_index]
+            if (not isinstance(next_trial, TrialGenerator)
+                    or next_trial.ready()):
+                self.prepare_future = self.prepare_executor.submit(
+                                        self.prepare_trial, next_index)
 
     def step(self, dt):
 
+        tick_start = self.clock.now()
         self.time += dt
 
         complete_tasks = 0
@@ -386,23 +1174,34 @@ class MultiAgentExperiment:
 
             if taskstate == MultiAgentTask.TASK_COMPLETED:
                 complete_tasks += 1
+        self.tracer.span("task_tick", tick_start)
+        if self.telemetry is not None:
+            self.telemetry.sample(tick_start, self.time, self.trial_index,
+                                  self.active_trial)
 
         if complete_tasks == len(self.active_trial):
             # all tasks done
-            trialindex = self.procedure.index(self.active_trial)
-
             for task in self.active_trial:
                 task.close()
+            if self.journal is not None:
+                self.journal.trial_end(self.trial_index, self.active_trial)
 
-            if (len(self.procedure) > trialindex + 1):
-                self.active_trial = self.procedure[trialindex + 1]
-
-                for task in self.active_trial:
-                    task.start()
+            if (len(self.procedure) > self.trial_index + 1):
+                self.start_trial(self.trial_index + 1)
             else:
                 self.completed()
 
     def completed(self):
 
+        self.prepare_executor.shutdown()
+
         for participant in self.participants:
             participant.shutdown()
+
+        if self.journal is not None:
+            self.journal.close()
+
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+        self.tracer.write(self.sessionfolder + "/latency.tsv")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import abc
+import math
+
+import numpy as np
+
+
+# A trial generator stands in the experiment procedure for a sequence of
+# trials that is only decided while the experiment runs. The experiment asks
+# it for one trial at a time and drops it from the procedure once it returns
+# None.
+#
+# next_trial is called from the background thread that prepares the next
+# trial while the current one runs, but only once ready() says the decision
+# can be made. Otherwise the experiment builds the trial when it starts.
+#
+# state() returns what decides the trials still to come, as plain JSON
+# values. It is journaled with every generated trial and checked when a
+# session resumes, by generating the trials before the interrupted one again
+# from their journaled results. Generators that return None cannot be resumed
+# past their first trial.
+class TrialGenerator:
+
+    def ready(self):
+        return True
+
+    def next_trial(self, experiment):
+        return None
+
+    def state(self):
+        return None
+
+
+# Base for adaptive procedures that set one parameter of a measured trial
+# from the metric results of the previous measured trials.
+#
+# make_trial(value, number) returns the list of tasks of a measured trial.
+# The trial is scored on the first of its tasks whose metric_results() holds
+# `metric`, and counts as a success when the result is below `threshold`
+# (above it, if success_below is False).
+#
+# reset_trial(number), when given, returns a trial that runs after every
+# measured trial, e.g. to re-center the handles. The measured trial is scored
+# while it runs and the next one is built in the background, so the session
+# continues without a gap.
+#
+# Subclasses choose the value of the next measured trial in next_value and
+# learn from each scored trial in update.
+class AdaptiveProcedure(TrialGenerator, abc.ABC):
+
+    def __init__(self,
+                 make_trial,
+                 metric,
+                 threshold,
+                 success_below=True,
+                 max_trials=20,
+                 reset_trial=None):
+
+        self.make_trial = make_trial
+        self.metric = metric
+        self.threshold = threshold
+        self.success_below = success_below
+        self.max_trials = max_trials
+        self.reset_trial = reset_trial
+
+        # (value, result, success) of every scored trial
+        self.history = []
+        self.pending = None
+        self.reset_due = False
+        self.trial_number = 0
+
+    def ready(self):
+        if self.reset_due or self.pending is None:
+            return True
+        value, trial = self.pending
+        return all(task.closed for task in trial)
+
+    def next_trial(self, experiment):
+        if self.reset_due:
+            self.reset_due = False
+            return self.reset_trial(self.trial_number - 1)
+
+        self.score_pending()
+        if self.finished():
+            return None
+
+        value = self.next_value()
+        trial = self.make_trial(value, self.trial_number)
+        self.pending = (value, trial)
+        self.trial_number += 1
+        self.reset_due = self.reset_trial is not None
+        return trial
+
+    def score_pending(self):
+        if self.pending is None:
+            return
+        value, trial = self.pending
+        self.pending = None
+
+        for task in trial:
+            results = task.metric_results()
+            if self.metric in results:
+                result = results[self.metric]
+                break
+        else:
+            raise KeyError("no task in the trial reports metric "
+                           + repr(self.metric))
+
+        if self.success_below:
+            success = result < self.threshold
+        else:
+            success = result > self.threshold
+
+        self.history.append((value, result, success))
+        self.update(value, success)
+
+    def finished(self):
+        return self.trial_number >= self.max_trials
+
+    def state(self):
+        return {"history": [[float(value), float(result), bool(success)]
+                            for value, result, success in self.history],
+                "trial_number": self.trial_number,
+                "reset_due": self.reset_due}
+
+    @abc.abstractmethod
+    def next_value(self):
+        pass
+
+    def update(self, value, success):
+        pass
+
+
+# Transformed up/down staircase. The value moves by step_success after
+# `successes_to_step` successes in a row and by step_failure after every
+# failure. With successes_to_step=2, step_success=-step_failure it converges
+# on the 70.7% point of the psychometric function.
+class StaircaseProcedure(AdaptiveProcedure):
+
+    def __init__(self,
+                 make_trial,
+                 metric,
+                 threshold,
+                 start,
+                 step_success,
+                 step_failure,
+                 successes_to_step=1,
+                 minimum=-math.inf,
+                 maximum=math.inf,
+                 max_reversals=None,
+                 **kwargs):
+
+        super().__init__(make_trial, metric, threshold, **kwargs)
+
+        self.value = start
+        self.step_success = step_success
+        self.step_failure = step_failure
+        self.successes_to_step = successes_to_step
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_reversals = max_reversals
+
+        self.successes = 0
+        self.last_step = 0.0
+        self.reversals = []
+
+    def finished(self):
+        if (self.max_reversals is not None
+                and len(self.reversals) >= self.max_reversals):
+            return True
+        return super().finished()
+
+    def next_value(self):
+        return self.value
+
+    def state(self):
+        state = super().state()
+        state.update({"value": float(self.value),
+                      "successes": self.successes,
+                      "last_step": float(self.last_step),
+                      "reversals": [float(value)
+                                    for value in self.reversals]})
+        return state
+
+    def update(self, value, success):
+        if success:
+            self.successes += 1
+            if self.successes < self.successes_to_step:
+                return
+            step = self.step_success
+        else:
+            step = self.step_failure
+        self.successes = 0
+
+        if step * self.last_step < 0.0:
+            self.reversals.append(value)
+        self.last_step = step
+
+        self.value = min(max(value + step, self.minimum), self.maximum)
+
+    # Mean of the values at the last reversals, the usual threshold estimate.
+    def estimate(self, reversals=6):
+        if not self.reversals:
+            return self.value
+        return float(np.mean(self.reversals[-reversals:]))
+
+
+# Bayesian adaptive design in the style of QUEST. The threshold of a logistic
+# psychometric function
+#
+#   p(success | x) = guess + (1 - guess - lapse) / (1 + exp(-slope (x - t)))
+#
+# is tracked as a posterior over `grid`, and every trial is placed at the
+# posterior mean. A negative slope means success becomes less likely as the
+# value grows.
+class QuestProcedure(AdaptiveProcedure):
+
+    def __init__(self,
+                 make_trial,
+                 metric,
+                 threshold,
+                 grid,
+                 slope,
+                 guess=0.0,
+                 lapse=0.02,
+                 prior_mean=None,
+                 prior_std=None,
+                 **kwargs):
+
+        super().__init__(make_trial, metric, threshold, **kwargs)
+
+        self.grid = np.asarray(grid, dtype=float)
+        self.slope = slope
+        self.guess = guess
+        self.lapse = lapse
+
+        if prior_mean is None:
+            prior_mean = float(np.mean(self.grid))
+        if prior_std is None:
+            prior_std = float(np.ptp(self.grid))
+        self.log_posterior = -0.5 * ((self.grid - prior_mean) / prior_std)**2
+
+    def posterior(self):
+        posterior = np.exp(self.log_posterior - self.log_posterior.max())
+        return posterior / posterior.sum()
+
+    def p_success(self, value):
+        scale = 1.0 - self.guess - self.lapse
+        return self.guess + scale / (1.0 + np.exp(-self.slope
+                                                  * (value - self.grid)))
+
+    def next_value(self):
+        return float(np.dot(self.grid, self.posterior()))
+
+    def state(self):
+        state = super().state()
+        state["next_value"] = self.next_value()
+        return state
+
+    def update(self, value, success):
+        p = self.p_success(value)
+        if not success:
+            p = 1.0 - p
+        self.log_posterior += np.log(np.maximum(p, 1e-12))
+
+    def estimate(self):
+        return self.next_value()
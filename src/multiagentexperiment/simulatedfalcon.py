@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+# Hand models return the force the simulated hand applies to the handle along
+# the z axis of the falcon, in newtons.
+class ScriptedHand:
+
+    def __init__(self,
+                 trajectory_function=lambda t: 0.125,
+                 stiffness=200.0,
+                 damping=5.0):
+        self.trajectory_function = trajectory_function
+        self.stiffness = stiffness
+        self.damping = damping
+
+    def reset(self):
+        pass
+
+    def target(self, time_s, dt_s):
+        return self.trajectory_function(time_s)
+
+    def force(self, time_s, dt_s, position, velocity):
+        return ((self.stiffness * (self.target(time_s, dt_s) - position))
+                - (self.damping * velocity))
+
+
+# The hand target wanders as an Ornstein-Uhlenbeck process around center.
+class StochasticHand(ScriptedHand):
+
+    def __init__(self,
+                 center=0.125,
+                 sigma=0.02,
+                 time_constant_s=0.5,
+                 stiffness=200.0,
+                 damping=5.0,
+                 seed=None):
+        self.center = center
+        self.sigma = sigma
+        self.time_constant_s = time_constant_s
+        self.rng = np.random.default_rng(seed)
+        super().__init__(stiffness=stiffness, damping=damping)
+        self.reset()
+
+    def reset(self):
+        self.current_target = self.center
+
+    def target(self, time_s, dt_s):
+        decay = dt_s / self.time_constant_s
+        self.current_target += ((self.center - self.current_target) * decay
+                                + (self.sigma * np.sqrt(2.0 * decay)
+                                   * self.rng.standard_normal()))
+        return self.current_target
+
+
+# Stand-in for falcon_c.falcon.NovintFalcon with the same interface. The handle
+# is modelled as a point mass on the z axis with viscous and coulomb friction,
+# stiff walls at the workspace bounds and a motor force limit, driven by the
+# commanded force and a hand model. x and y stay at the workspace center.
+class SimulatedFalcon:
+
+    def __init__(self,
+                 timestep_s,
+                 device_num=0,
+                 mass=0.15,
+                 viscous_friction=0.5,
+                 coulomb_friction=0.05,
+                 z_min=0.075,
+                 z_max=0.175,
+                 wall_stiffness=2000.0,
+                 max_force=9.0,
+                 hand=None):
+
+        self.timestep_s = timestep_s
+        self.device_num = device_num
+
+        self.mass = mass
+        self.viscous_friction = viscous_friction
+        self.coulomb_friction = coulomb_friction
+        self.z_min = z_min
+        self.z_max = z_max
+        self.wall_stiffness = wall_stiffness
+        self.max_force = max_force
+
+        if hand is None:
+            hand = ScriptedHand(lambda t: (z_min + z_max) / 2.0)
+        self.hand = hand
+
+        self.leds = (0, 0, 0)
+        self.reset()
+
+    def reset(self):
+        self.time = 0.0
+        self.pos = np.array([0.0, 0.0, (self.z_min + self.z_max) / 2.0])
+        self.vel = np.zeros((3,))
+        self.queued_force = np.zeros((3,))
+        self.motor_force = np.zeros((3,))
+        self.hand.reset()
+
+    def update_state(self):
+        dt_s = self.timestep_s
+        z = self.pos[2]
+        v = self.vel[2]
+
+        force = (self.motor_force[2]
+                 + self.hand.force(self.time, dt_s, z, v)
+                 - (self.viscous_friction * v)
+                 - (self.coulomb_friction * np.sign(v)))
+        if z < self.z_min:
+            force += self.wall_stiffness * (self.z_min - z)
+        elif z > self.z_max:
+            force -= self.wall_stiffness * (z - self.z_max)
+
+        v += (force / self.mass) * dt_s
+        self.vel[2] = v
+        self.pos[2] = z + (v * dt_s)
+        self.time += dt_s
+
+    def get_pos(self):
+        return self.pos
+
+    def get_vel(self):
+        return self.vel
+
+    def add_force(self, x, y, z):
+        self.queued_force[0] += x
+        self.queued_force[1] += y
+        self.queued_force[2] += z
+
+    def output_forces(self):
+        np.clip(self.queued_force, -self.max_force, self.max_force,
+                out=self.motor_force)
+        self.queued_force[:] = 0.0
+
+    def set_leds(self, red, green, blue):
+        self.leds = (red, green, blue)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+
+import numpy as np
+
+
+# Estimators turn a stream of handle positions sampled every timestep_s into
+# filtered (position, velocity, acceleration). They run inside the haptic io
+# loop, so update() must stay cheap and allocation free.
+class StateEstimator:
+
+    def __init__(self, timestep_s):
+        self.timestep_s = timestep_s
+        self.reset()
+
+    def reset(self):
+        pass
+
+    def update(self, position):
+        return (position, 0.0, 0.0)
+
+
+class IIRStateEstimator(StateEstimator):
+
+    def __init__(self, timestep_s, cutoff_hz=20.0):
+        time_constant = 1.0 / (2.0 * np.pi * cutoff_hz)
+        self.alpha = timestep_s / (time_constant + timestep_s)
+        super().__init__(timestep_s)
+
+    def reset(self):
+        self.state = None
+
+    def update(self, position):
+        if self.state is None:
+            self.state = (position, 0.0, 0.0)
+            return self.state
+
+        last_pos, last_vel, last_acc = self.state
+
+        pos = last_pos + (self.alpha * (position - last_pos))
+        vel = last_vel + (self.alpha
+                          * (((pos - last_pos) / self.timestep_s) - last_vel))
+        acc = last_acc + (self.alpha
+                          * (((vel - last_vel) / self.timestep_s) - last_acc))
+
+        self.state = (pos, vel, acc)
+        return self.state
+
+
+class SavitzkyGolayEstimator(StateEstimator):
+
+    def __init__(self, timestep_s, window=15, order=2):
+        self.window = window
+
+        # Least squares polynomial fit over the window, evaluated at the newest
+        # sample. The fit is linear in the samples, so value, slope and
+        # curvature reduce to one precomputed coefficient matrix.
+        times = (np.arange(window) - (window - 1)) * timestep_s
+        fit = np.linalg.pinv(np.vander(times, order + 1, increasing=True))
+
+        self.coefficients = np.zeros((3, window))
+        derivatives = min(order + 1, 3)
+        self.coefficients[:derivatives] = (fit[:derivatives]
+                                           * np.array([[1.0], [1.0], [2.0]])
+                                           [:derivatives])
+        super().__init__(timestep_s)
+
+    def reset(self):
+        self.samples = None
+        self.index = 0
+
+    def update(self, position):
+        # Every sample is stored twice so the window is always one contiguous,
+        # oldest to newest slice of the ring buffer.
+        if self.samples is None:
+            self.samples = np.full((2 * self.window,), float(position))
+
+        self.samples[self.index] = position
+        self.samples[self.index + self.window] = position
+        self.index = (self.index + 1) % self.window
+
+        pos, vel, acc = self.coefficients.dot(
+                            self.samples[self.index:self.index + self.window])
+        return (pos, vel, acc)
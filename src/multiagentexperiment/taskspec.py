@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+
+import ast
+import hashlib
+import json
+import os
+
+from .datalogger import \
+    Decimate, \
+    OnChange
+from .dynamicobject import \
+    BindPosition, \
+    CompressionSpring, \
+    ConditionAND, \
+    ConditionOR, \
+    Damping, \
+    DynamicObject, \
+    InRangeForDuration, \
+    PositionLimits, \
+    PositionThreshold, \
+    SpringLawSolid, \
+    TensionSpring
+from .metrics import \
+    ForceStats, \
+    HandleWork, \
+    TrackingError
+from .multiagentexperiment import \
+    FlippedPerspective, \
+    MultiAgentTask, \
+    Perspective, \
+    ReferenceTrajectory, \
+    Role
+
+
+# Constraint, condition and perspective classes a spec can name by "type".
+# Experiments register their own classes (and trajectory generators) before
+# compiling specs that use them.
+SPEC_TYPES = {}
+TRAJECTORY_GENERATORS = {}
+
+# Compiled topologies by spec hash. They hold the classes a spec named when it
+# was compiled, so registering a type or trajectory drops them all.
+_topology_cache = {}
+
+# Arguments holding object names, resolved to the task's DynamicObjects.
+OBJECT_ARGUMENTS = ("target", "reference")
+# Arguments holding nested condition specs.
+CONDITION_ARGUMENTS = ("references",)
+
+
+def register_spec_type(cls, name=None):
+    SPEC_TYPES[cls.__name__ if name is None else name] = cls
+    _topology_cache.clear()
+    return cls
+
+
+def register_trajectory(name, generator):
+    TRAJECTORY_GENERATORS[name] = generator
+    _topology_cache.clear()
+
+
+for _cls in [BindPosition, CompressionSpring, ConditionAND, ConditionOR,
+             Damping, Decimate, FlippedPerspective, ForceStats, HandleWork,
+             InRangeForDuration, OnChange, Perspective, PositionLimits,
+             PositionThreshold, SpringLawSolid, TensionSpring, TrackingError]:
+    register_spec_type(_cls)
+
+
+_operators = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub,
+              ast.UAdd)
+_literals = (str, int, float, bool, type(None))
+
+
+def _load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+# Checks that node only does arithmetic on numbers and parameter names, and
+# rewrites the names into lookups in params.
+def _parameter_lookups(node, source, names):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node
+    if isinstance(node, ast.Name):
+        names.add(node.id)
+        return ast.Subscript(value=_load("params"),
+                             slice=ast.Constant(value=node.id),
+                             ctx=ast.Load())
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, _operators):
+        node.operand = _parameter_lookups(node.operand, source, names)
+        return node
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _operators):
+        node.left = _parameter_lookups(node.left, source, names)
+        node.right = _parameter_lookups(node.right, source, names)
+        return node
+    raise ValueError("unsupported expression in task spec: " + source)
+
+
+# The values compiled task code refers to by name.
+class _Namespace(dict):
+
+    def __init__(self):
+        super().__init__(__builtins__={})
+
+    def name(self, value):
+        name = "_%d" % len(self)
+        self[name] = value
+        return _load(name)
+
+    def evaluate(self, node, params):
+        expression = ast.Expression(node)
+        ast.fix_missing_locations(expression)
+        return eval(compile(expression, "<task spec>", "eval"), self,
+                    {"params": params})
+
+
+# Strings starting with "=" are arithmetic expressions over the task
+# parameters, e.g. "=k*p1_push" or "=-obj_radius/2". Everything else is a
+# literal. Returns the names of the parameters the value depends on and the
+# syntax tree of an expression over params that builds the value.
+def compile_value(value, namespace):
+    names = set()
+    if isinstance(value, str) and value.startswith("="):
+        node = _parameter_lookups(ast.parse(value[1:], mode="eval").body,
+                                  value, names)
+    elif isinstance(value, dict):
+        items = [compile_value(item, namespace) for item in value.values()]
+        for item_names, item in items:
+            names.update(item_names)
+        node = ast.Dict(keys=[ast.Constant(value=key) for key in value],
+                        values=[item for item_names, item in items])
+    elif isinstance(value, list):
+        items = [compile_value(item, namespace) for item in value]
+        for item_names, item in items:
+            names.update(item_names)
+        node = ast.List(elts=[item for item_names, item in items],
+                        ctx=ast.Load())
+    elif isinstance(value, _literals):
+        node = ast.Constant(value=value)
+    else:
+        # other literals, e.g. dates in YAML, are kept as they are
+        node = namespace.name(value)
+    return frozenset(names), node
+
+
+# Values that depend on none of the changed parameters are evaluated once
+# with the spec defaults.
+def _bind_value(compiled, changed, defaults, namespace):
+    names, node = compiled
+    if names & changed or isinstance(node, (ast.Constant, ast.Name)):
+        return node
+    return namespace.name(namespace.evaluate(node, defaults))
+
+
+class _CompiledInstance:
+
+    # cls is named by the "type" of the spec unless given
+    def __init__(self, spec, namespace, cls=None):
+        spec = dict(spec)
+        self.cls = SPEC_TYPES[spec.pop("type")] if cls is None else cls
+        self.args = {}
+        for key, value in spec.items():
+            if key in CONDITION_ARGUMENTS:
+                self.args[key] = tuple(_CompiledInstance(item, namespace)
+                                       for item in value)
+            elif key in OBJECT_ARGUMENTS:
+                self.args[key] = value
+            else:
+                self.args[key] = compile_value(value, namespace)
+
+    # The call that constructs the instance. Arguments that do not depend on
+    # the changed parameters are evaluated here, and the objects they name
+    # are loaded from the variables in objects.
+    def call(self, changed, defaults, namespace, objects):
+        keywords = []
+        for key, value in self.args.items():
+            if key in CONDITION_ARGUMENTS:
+                node = ast.List(elts=[item.call(changed, defaults, namespace,
+                                                objects)
+                                      for item in value],
+                                ctx=ast.Load())
+            elif key in OBJECT_ARGUMENTS:
+                if value is None:
+                    node = ast.Constant(value=None)
+                elif value in objects:
+                    node = _load(objects[value])
+                else:
+                    raise ValueError("unknown object " + repr(value)
+                                     + " in task spec")
+            else:
+                node = _bind_value(value, changed, defaults, namespace)
+            keywords.append(ast.keyword(arg=key, value=node))
+        return ast.Call(func=namespace.name(self.cls), args=[],
+                        keywords=keywords)
+
+
+class SpecTask(MultiAgentTask):
+
+    def __init__(self, name, timestep, datafolder=None, duration=None,
+                 parameters={}, message=None):
+        super().__init__(name, timestep, datafolder=datafolder,
+                         duration=duration, parameters=parameters)
+        self.message = message
+
+    def get_state_dict(self):
+        state = super().get_state_dict()
+        if self.message is not None:
+            state["task_message"] = self.message
+        return state
+
+
+# A task spec parsed, validated and compiled once. Instantiating it runs a
+# function compiled from the spec that constructs the objects as a hand
+# written task would. The function is compiled for every set of parameters
+# an instantiation changes from the spec defaults, with the values that do
+# not depend on them evaluated once and shared by the tasks it builds.
+#
+# The task data files only list the parameters given to instantiate, so the
+# spec defaults show up in them only when given explicitly.
+class TaskTopology:
+
+    # parameters MultiAgentTask sets for every task
+    TASK_PARAMETERS = frozenset(["name", "duration"])
+
+    def __init__(self, spec):
+        self.spec_hash = spec_hash(spec)
+        self.name = spec.get("name", "task")
+        self.defaults = dict(spec.get("parameters", {}))
+        self.message = spec.get("message")
+        self.namespace = _Namespace()
+        self.populate = {}
+
+        namespace = self.namespace
+        self.objects = tuple((obj["name"],
+                              _CompiledInstance(
+                                  {"name": obj["name"],
+                                   "mass": obj.get("mass", 0.0),
+                                   "initial_state": obj.get("initial_state",
+                                                            [0.0, 0.0, 0.0]),
+                                   "record_data": obj.get("record_data",
+                                                          True),
+                                   "appearance": obj.get("appearance")},
+                                  namespace, cls=DynamicObject))
+                             for obj in spec.get("objects", []))
+        names = set(obj[0] for obj in self.objects)
+        if len(names) != len(self.objects):
+            raise ValueError("duplicate object names in task spec "
+                             + self.name)
+
+        self.references = tuple((ref["name"],
+                                 ref["trajectory"],
+                                 compile_value(ref.get("args", {}),
+                                               namespace),
+                                 compile_value(ref.get("time_window",
+                                                       [-1.0, 1.0]),
+                                               namespace),
+                                 compile_value(ref.get("timestep", 0.1),
+                                               namespace))
+                                for ref in spec.get("references", []))
+        for ref in self.references:
+            if ref[1] not in TRAJECTORY_GENERATORS:
+                raise ValueError("unknown trajectory " + repr(ref[1])
+                                 + " in task spec " + self.name)
+
+        def compile_all(items):
+            return tuple(_CompiledInstance(item, namespace) for item in items)
+
+        self.pre_constraints = compile_all(spec.get("pre_constraints", []))
+        self.constraints = compile_all(spec.get("constraints", []))
+        self.endconditions = compile_all(spec.get("endconditions", []))
+        self.metrics = compile_all(spec.get("metrics", []))
+        logging = spec.get("logging", {})
+        self.log_policies = tuple((name, _CompiledInstance(policy, namespace))
+                                  for name, policy
+                                  in logging.get("policies", {}).items())
+        self.log_burst_s = compile_value(logging.get("burst_s", [0.0, 0.0]),
+                                         namespace)
+
+        self.roles = tuple((role["handle"],
+                            None if "perspective" not in role
+                            else _CompiledInstance(role["perspective"],
+                                                   namespace))
+                           for role in spec.get("roles", []))
+        for handle, perspective in self.roles:
+            if handle not in names:
+                raise ValueError("role handle " + repr(handle)
+                                 + " is not an object of task spec "
+                                 + self.name)
+
+    # Compiles populate(task, params), which adds the objects, references,
+    # constraints, conditions, metrics, log policies and roles to the task.
+    def compile_populate(self, changed):
+        namespace = self.namespace
+        defaults = self.defaults
+        body = []
+
+        def bind(compiled):
+            return _bind_value(compiled, changed, defaults, namespace)
+
+        def assign(variable, value):
+            body.append(ast.Assign(targets=[ast.Name(id=variable,
+                                                     ctx=ast.Store())],
+                                   value=value))
+
+        def call(function, *args):
+            body.append(ast.Expr(ast.Call(func=function, args=list(args),
+                                          keywords=[])))
+
+        def task_method(name):
+            return ast.Attribute(value=_load("task"), attr=name,
+                                 ctx=ast.Load())
+
+        objects = {}
+        for ndx, (obj_name, obj) in enumerate(self.objects):
+            objects[obj_name] = "obj_%d" % ndx
+            assign(objects[obj_name],
+                   obj.call(changed, defaults, namespace, {}))
+            call(task_method("add_obj"), _load(objects[obj_name]))
+
+        # metrics may also refer to reference trajectories by name
+        named = dict(objects)
+        generators = namespace.name(TRAJECTORY_GENERATORS)
+        for ndx, (ref_name, trajectory, args, time_window, ref_timestep) \
+                in enumerate(self.references):
+            named[ref_name] = "ref_%d" % ndx
+            generator = ast.Subscript(value=generators,
+                                      slice=ast.Constant(value=trajectory),
+                                      ctx=ast.Load())
+            assign(named[ref_name], ast.Call(
+                func=namespace.name(ReferenceTrajectory),
+                args=[ast.Constant(value=ref_name)],
+                keywords=[ast.keyword(arg="trajectory_function",
+                                      value=ast.Call(
+                                          func=generator, args=[],
+                                          keywords=[ast.keyword(
+                                              arg=None, value=bind(args))])),
+                          ast.keyword(arg="time_window",
+                                      value=bind(time_window)),
+                          ast.keyword(arg="timestep",
+                                      value=bind(ref_timestep))]))
+            call(task_method("add_ref"), _load(named[ref_name]))
+
+        for method, items in [("add_pre_constraint", self.pre_constraints),
+                              ("add_constraint", self.constraints),
+                              ("add_endcond", self.endconditions)]:
+            for item in items:
+                call(task_method(method),
+                     item.call(changed, defaults, namespace, objects))
+        for metric in self.metrics:
+            call(task_method("add_metric"),
+                 metric.call(changed, defaults, namespace, named))
+
+        for log_name, policy in self.log_policies:
+            call(task_method("set_log_policy"), ast.Constant(value=log_name),
+                 policy.call(changed, defaults, namespace, objects))
+        call(task_method("set_log_burst"),
+             ast.Starred(value=bind(self.log_burst_s), ctx=ast.Load()))
+
+        roles = ast.Attribute(value=_load("task"), attr="roles",
+                              ctx=ast.Load())
+        for handle, perspective in self.roles:
+            call(ast.Attribute(value=roles, attr="append", ctx=ast.Load()),
+                 ast.Call(func=namespace.name(Role),
+                          args=[_load(objects[handle])],
+                          keywords=[ast.keyword(
+                              arg="perspective",
+                              value=ast.Constant(value=None)
+                              if perspective is None
+                              else perspective.call(changed, defaults,
+                                                    namespace, objects))]))
+
+        module = ast.parse("def populate(task, params):\n    pass")
+        module.body[0].body = body or module.body[0].body
+        ast.fix_missing_locations(module)
+        exec(compile(module, "<task spec " + self.name + ">", "exec"),
+             namespace)
+        return namespace.pop("populate")
+
+    def instantiate(self, name, timestep, datafolder=None, duration=None,
+                    parameters={}):
+        task = SpecTask(name, timestep, datafolder=datafolder,
+                        duration=duration, parameters=dict(parameters),
+                        message=self.message)
+
+        params = dict(self.defaults)
+        params.update(task.parameters)
+        # parameters equal to their default, type included, leave every value
+        # that depends on them as it was evaluated with the defaults
+        changed = self.TASK_PARAMETERS.union(
+                    key for key, value in parameters.items()
+                    if key not in self.defaults
+                    or type(value) is not type(self.defaults[key])
+                    or value != self.defaults[key])
+        populate = self.populate.get(changed)
+        if populate is None:
+            populate = self.populate[changed] = self.compile_populate(changed)
+        populate(task, params)
+        return task
+
+
+def spec_hash(spec):
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def compile_task_spec(spec):
+    key = spec_hash(spec)
+    topology = _topology_cache.get(key)
+    if topology is None:
+        topology = TaskTopology(spec)
+        _topology_cache[key] = topology
+    return topology
+
+
+# JSON needs nothing extra, YAML needs PyYAML and TOML needs Python 3.11 or
+# the tomli package.
+def load_task_spec(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".yaml", ".yml"):
+        import yaml
+        with open(filename) as spec_file:
+            spec = yaml.safe_load(spec_file)
+    elif extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(filename, 'rb') as spec_file:
+            spec = tomllib.load(spec_file)
+    else:
+        with open(filename) as spec_file:
+            spec = json.load(spec_file)
+    return compile_task_spec(spec)
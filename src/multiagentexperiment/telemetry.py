@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import collections
+import json
+import socket
+import threading
+
+import numpy as np
+
+from .columnstore import CompressedColumnWriter
+
+
+DEFAULT_PORT = 5602
+
+
+# Streams live samples of a running experiment as UDP datagrams to a monitor
+# on the local host.
+#
+# The experiment tick only appends the state of its tasks to a bounded deque.
+# That never blocks, and once the deque is full the oldest tick is dropped.
+# Every interval_s a sender thread drains the deque and adds two things: a
+# summary of every latency tracer span over the interval (task tick phases,
+# haptic loop period, force loop latency), and the backlogs of the journal,
+# column compression and haptic recorder threads. It sends the result as one
+# JSON datagram from a non-blocking socket. If no monitor is listening, or one
+# reads too slowly, datagrams are dropped and counted, so the experiment never
+# waits for a monitor.
+class TelemetryPublisher:
+
+    def __init__(self,
+                 experiment,
+                 port=DEFAULT_PORT,
+                 host="127.0.0.1",
+                 interval_s=0.1,
+                 capacity=1024,
+                 max_ticks=128):
+
+        self.experiment = experiment
+        self.address = (host, port)
+        self.interval_s = interval_s
+        self.max_ticks = max_ticks
+
+        # appending and popping either end of a deque is atomic, so the tick
+        # thread and the sender thread share it without a lock
+        self.ticks = collections.deque(maxlen=capacity)
+        self.tick_count = 0
+        self.snapshots = {}
+        self.sent = 0
+        self.dropped = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+        self.stop_flag = threading.Event()
+        self.send_thread = threading.Thread(target=self.send_loop,
+                                            daemon=True)
+        self.send_thread.start()
+
+    # Called by the experiment after every tick.
+    def sample(self, clock_time, experimenttime, trial_index, tasks):
+        self.tick_count += 1
+        self.ticks.append((self.tick_count, clock_time, experimenttime,
+                           trial_index,
+                           [(task.name, task.taskstate, task.time)
+                            for task in tasks]))
+
+    # Latencies of every span since the previous message, with percentiles
+    # at the upper edge of their histogram bin.
+    def spans(self):
+        spans = {}
+        for name, histogram in list(self.experiment.tracer.histograms.items()):
+            counts, total_s = histogram.snapshot()
+            last_counts, last_total_s = self.snapshots.get(name, (0, 0.0))
+            self.snapshots[name] = (counts, total_s)
+
+            window = counts - last_counts
+            count = int(window.sum())
+            if count == 0:
+                continue
+            cumulative = np.cumsum(window)
+            bin_s = histogram.bin_s
+            spans[name] = {
+                "count": count,
+                "mean_s": (total_s - last_total_s) / count,
+                "p50_s": float((np.searchsorted(cumulative, count * 0.5) + 1)
+                               * bin_s),
+                "p99_s": float((np.searchsorted(cumulative, count * 0.99) + 1)
+                               * bin_s),
+                "max_s": float((np.flatnonzero(window)[-1] + 1) * bin_s)}
+        return spans
+
+    # Work queued for the writer threads of the experiment.
+    def backlog(self):
+        experiment = self.experiment
+        journal = experiment.journal
+        backlog = {"journal_records": (0 if journal is None
+                                       else len(journal.pending)),
+                   "column_chunks": 0,
+                   "haptic_samples": 0,
+                   "haptic_dropped": 0}
+
+        for task in getattr(experiment, "active_trial", []):
+            writer = getattr(task, "datawriter", None)
+            if isinstance(writer, CompressedColumnWriter):
+                backlog["column_chunks"] += writer.chunk_queue.qsize()
+
+        for participant in experiment.participants:
+            recorder = getattr(participant.handle, "recorder", None)
+            if recorder is not None:
+                backlog["haptic_samples"] += (recorder.write_count
+                                              - recorder.read_count)
+                backlog["haptic_dropped"] += recorder.dropped
+        return backlog
+
+    def send(self):
+        ticks = []
+        while self.ticks:
+            ticks.append(self.ticks.popleft())
+
+        message = {"clock": self.experiment.clock.now(),
+                   "ticks": ticks[-self.max_ticks:],
+                   "spans": self.spans(),
+                   "backlog": self.backlog(),
+                   "dropped": self.dropped}
+        try:
+            self.socket.sendto(json.dumps(message).encode(), self.address)
+            self.sent += 1
+        except OSError:
+            # nobody listening, the monitor's buffer is full or the message
+            # is too large
+            self.dropped += 1
+
+    def send_loop(self):
+        while not self.stop_flag.wait(self.interval_s):
+            self.send()
+
+    def close(self):
+        self.stop_flag.set()
+        self.send_thread.join()
+        self.send()
+        self.socket.close()
+
+
+# Receives the telemetry of an experiment and keeps the last history_s of
+# every series: the tick rate, the p99 of every span, the backlogs and the
+# datagrams the publisher dropped.
+class TelemetryMonitor:
+
+    def __init__(self, port=DEFAULT_PORT, host="127.0.0.1", history_s=30.0):
+        self.history_s = history_s
+        self.series = collections.OrderedDict()
+        self.clock = 0.0
+        self.last_tick = None
+        self.last_clock = None
+        self.tasks = []
+        self.trial_index = None
+        self.lost_ticks = 0
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+
+    # Handles every datagram received since the last call.
+    def poll(self):
+        received = 0
+        while True:
+            try:
+                data = self.socket.recv(1 << 16)
+            except BlockingIOError:
+                return received
+            self.receive(json.loads(data.decode()))
+            received += 1
+
+    def add(self, name, value):
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = collections.deque()
+        series.append((self.clock, value))
+        while series[0][0] < self.clock - self.history_s:
+            series.popleft()
+
+    def receive(self, message):
+        self.clock = message["clock"]
+
+        ticks = message["ticks"]
+        if ticks:
+            tick, clock_time, experimenttime, trial_index, tasks = ticks[-1]
+            if self.last_tick is not None and clock_time > self.last_clock:
+                self.add("tick rate Hz", (tick - self.last_tick)
+                         / (clock_time - self.last_clock))
+            # ticks dropped by the publisher, or left out of the message
+            first_tick = ticks[0][0]
+            if self.last_tick is not None:
+                self.lost_ticks += (first_tick - self.last_tick - 1)
+            self.lost_ticks += tick - first_tick + 1 - len(ticks)
+            self.last_tick = tick
+            self.last_clock = clock_time
+            self.trial_index = trial_index
+            self.tasks = tasks
+
+        for name, span in message["spans"].items():
+            self.add(name + " p99 ms", span["p99_s"] * 1000.0)
+        for name, value in message["backlog"].items():
+            self.add(name, value)
+        self.add("telemetry dropped", message["dropped"])
+
+    def status(self):
+        return ("trial %s  " % self.trial_index
+                + "  ".join("%s state %d %.1f s" % tuple(task)
+                            for task in self.tasks)
+                + "  lost ticks %d" % self.lost_ticks)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import numpy as np
+
+
+# Single time base for the handle io loops, the task ticks and the renderers.
+# All timestamps are seconds since the clock was started.
+class Clock:
+
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.origin = time.monotonic()
+
+    def now(self):
+        return time.monotonic() - self.origin
+
+
+class LatencyHistogram:
+
+    def __init__(self, name, bin_s=0.0005, max_s=0.25):
+        self.name = name
+        self.bin_s = bin_s
+        # the last bin collects everything above max_s
+        self.counts = np.zeros((int(max_s / bin_s) + 1,), dtype=np.int64)
+        self.total_s = 0.0
+        self.max_latency_s = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, latency_s):
+        ndx = min(int(latency_s / self.bin_s), len(self.counts) - 1)
+        with self.lock:
+            self.counts[ndx] += 1
+            self.total_s += latency_s
+            if latency_s > self.max_latency_s:
+                self.max_latency_s = latency_s
+
+    def count(self):
+        return int(np.sum(self.counts))
+
+    # A consistent copy of the counts and their total, to summarize the
+    # latencies added since an earlier snapshot.
+    def snapshot(self):
+        with self.lock:
+            return self.counts.copy(), self.total_s
+
+    def percentile(self, percent):
+        count = self.count()
+        if count == 0:
+            return 0.0
+        ndx = np.searchsorted(np.cumsum(self.counts), count * percent / 100.0)
+        return min((ndx + 1) * self.bin_s, self.max_latency_s)
+
+    def summary(self):
+        count = self.count()
+        return {"name": self.name,
+                "count": count,
+                "mean_s": self.total_s / count if count > 0 else 0.0,
+                "p50_s": self.percentile(50),
+                "p95_s": self.percentile(95),
+                "p99_s": self.percentile(99),
+                "max_s": self.max_latency_s}
+
+
+# Collects spans, the time from a stamped event until now, into one histogram
+# per span name. Spans are cheap enough to close from the 1 kHz io loops.
+class LatencyTracer:
+    FIELDNAMES = ["name", "count", "mean_s", "p50_s", "p95_s", "p99_s", "max_s"]
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    # bin_s and max_s only apply when the histogram is created.
+    def histogram(self, name, bin_s=0.0005, max_s=0.25):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(
+                                name, LatencyHistogram(name, bin_s, max_s))
+        return histogram
+
+    def span(self, name, start_time):
+        if start_time is not None:
+            self.histogram(name).add(self.clock.now() - start_time)
+
+    # Closes the span of one phase of a sequence and returns its end, the
+    # start of the next phase. Phases are short, so their bins are finer.
+    def phase(self, name, start_time, bin_s=0.00001, max_s=0.05):
+        now = self.clock.now()
+        self.histogram(name, bin_s, max_s).add(now - start_time)
+        return now
+
+    def write(self, filename):
+        with open(filename, 'w') as trace_file:
+            trace_file.write('\t'.join(self.FIELDNAMES) + '\n')
+            for name in sorted(self.histograms):
+                summary = self.histograms[name].summary()
+                trace_file.write('\t'.join(str(summary[field])
+                                           for field in self.FIELDNAMES)
+                                 + '\n')
+
+
+# Per frame timing of a renderer: CPU time spent drawing, time spent in the
+# buffer swap and the interval between swaps. With vsync on, an interval of n
+# refresh periods means n - 1 refreshes showed a stale frame.
+class FrameLog:
+    FIELDNAMES = ["frame", "time", "draw_s", "swap_s", "interval_s",
+                  "missed_vsyncs"]
+
+    def __init__(self, refresh_rate_hz=60.0):
+        self.refresh_period_s = 1.0 / refresh_rate_hz
+        self.frames = 0
+        self.missed_vsyncs = 0
+        self.last_swap_end = None
+        self.draw = LatencyHistogram("draw", bin_s=0.0001, max_s=0.1)
+        self.swap = LatencyHistogram("swap", bin_s=0.0001, max_s=0.1)
+        self.file = None
+
+    def open(self, filename):
+        self.file = open(filename, 'w')
+        self.file.write('\t'.join(self.FIELDNAMES) + '\n')
+
+    def record(self, frame_start, draw_end, swap_start, swap_end):
+        draw_s = draw_end - frame_start
+        swap_s = swap_end - swap_start
+        self.draw.add(draw_s)
+        self.swap.add(swap_s)
+
+        interval_s = 0.0
+        missed = 0
+        if self.last_swap_end is not None:
+            interval_s = swap_end - self.last_swap_end
+            missed = max(int(round(interval_s / self.refresh_period_s)) - 1, 0)
+        self.last_swap_end = swap_end
+        self.missed_vsyncs += missed
+
+        if self.file is not None:
+            self.file.write('\t'.join(str(value) for value in (
+                self.frames, frame_start, draw_s, swap_s, interval_s, missed))
+                + '\n')
+        self.frames += 1
+
+    def summary(self):
+        return {"frames": self.frames,
+                "missed_vsyncs": self.missed_vsyncs,
+                "draw": self.draw.summary(),
+                "swap": self.swap.summary()}
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,81 @@
+import os
+import shutil
+
+import numpy as np
+
+from multiagentexperiment import \
+    DynamicObject, \
+    MultiAgentTask, \
+    ReferenceTrajectory, \
+    analyze_sessions, \
+    load_sessions
+from multiagentexperiment.analysis import \
+    find_task_files, \
+    is_task_file
+
+
+TIMESTEP_S = 0.1
+
+
+def write_task(folder, name, data_format, gain):
+    task = MultiAgentTask(name, TIMESTEP_S, datafolder=str(folder),
+                          duration=1.0, parameters={"gain": gain})
+    task.add_obj(DynamicObject("cursor", 0.0,
+                               initial_state=[gain, 0.0, 0.0]))
+    task.add_ref(ReferenceTrajectory("sos",
+                                     trajectory_function=np.zeros_like))
+    task.data_format = data_format
+    task.data_codec = "zlib"
+    task.start()
+    while task.step(task.time) != task.TASK_COMPLETED:
+        pass
+    task.close()
+    return task.filename + ("" if data_format == "tsv" else ".maecol")
+
+
+# A session folder with a text and a column task file, the other files a
+# session writes, and a recovered copy of a task file.
+def make_session(folder):
+    folder.mkdir()
+    text = write_task(folder, "text", "tsv", 0.5)
+    columns = write_task(folder, "columns", "columns", 0.25)
+    (folder / "latency.tsv").write_text("span\tcount\tmean_s\n")
+    (folder / "p1_frames.tsv").write_text("frame_start\tdraw_end\n")
+    (folder / "session.journal").write_bytes(b"MAEJ\x00\x00")
+    (folder / "recovered").mkdir()
+    shutil.copy(text, str(folder / "recovered" / os.path.basename(text)))
+    return text, columns
+
+
+def test_only_task_files_are_found(tmp_path):
+    text, columns = make_session(tmp_path / "session")
+
+    assert is_task_file(text)
+    assert is_task_file(columns)
+    assert not is_task_file(str(tmp_path / "session" / "latency.tsv"))
+    assert not is_task_file(str(tmp_path / "session" / "recovered"))
+    assert sorted(find_task_files([str(tmp_path / "session")])) \
+        == sorted([text, columns])
+
+
+def test_sessions_are_analyzed_per_task_file(tmp_path):
+    make_session(tmp_path / "session")
+    cache = str(tmp_path / "cache")
+
+    for attempt in range(2):
+        # the second pass reads every result from the cache
+        table = analyze_sessions([str(tmp_path / "session")],
+                                 cache_folder=cache)
+        assert sorted(table["task"]) == ["columns", "text"]
+        assert list(table["session"]) == ["session", "session"]
+        rows = {task: ndx for ndx, task in enumerate(table["task"])}
+        assert table["param_gain"][rows["text"]] == 0.5
+        assert table["param_gain"][rows["columns"]] == 0.25
+        assert table["tracking_rms"][rows["text"]] == 0.5
+        assert table["tracking_rms"][rows["columns"]] == 0.25
+        assert table["samples"][rows["text"]] \
+            == table["samples"][rows["columns"]]
+
+    samples = load_sessions([str(tmp_path / "session")])
+    assert len(samples) == table["samples"].sum()
+    assert sorted(set(samples["task"])) == ["columns", "text"]
@@ -0,0 +1,42 @@
+import warnings
+
+import pytest
+
+from multiagentexperiment.humanfalconparticipant import \
+    DEFAULT_CALIBRATION_FILE, \
+    load_calibration
+
+
+# the raw z of the falcon at both ends of the calibrated range
+def mapped_ends(gain, offset, z_min, z_max):
+    return (gain * z_min) + offset, (gain * z_max) + offset
+
+
+def test_device_bounds_need_the_serial():
+    with pytest.raises(ValueError, match="15001183"):
+        load_calibration(DEFAULT_CALIBRATION_FILE)
+
+
+def test_serial_picks_its_bounds():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        gain, offset = load_calibration(DEFAULT_CALIBRATION_FILE, 15001189)
+        assert mapped_ends(gain, offset, 0.074, 0.175) \
+            == pytest.approx((1.0, -1.0))
+        gain, offset = load_calibration(DEFAULT_CALIBRATION_FILE, "default")
+        assert mapped_ends(gain, offset, 0.075, 0.175) \
+            == pytest.approx((1.0, -1.0))
+
+
+def test_unknown_serial_warns_and_uses_default():
+    with pytest.warns(UserWarning, match="default bounds"):
+        calibration = load_calibration(DEFAULT_CALIBRATION_FILE, "123")
+    assert calibration == load_calibration(DEFAULT_CALIBRATION_FILE,
+                                           "default")
+
+
+def test_default_only_file_needs_no_serial(tmp_path):
+    calibration_file = tmp_path / "calibration.json"
+    calibration_file.write_text('{"default": {"z_min": 0.1, "z_max": 0.2}}')
+    gain, offset = load_calibration(str(calibration_file))
+    assert mapped_ends(gain, offset, 0.1, 0.2) == pytest.approx((1.0, -1.0))
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+
+from multiagentexperiment import \
+    Decimate, \
+    DynamicObject, \
+    Handle, \
+    MultiAgentTask, \
+    Participant, \
+    ReferenceTrajectory, \
+    Role, \
+    SpringLawSolid, \
+    available_codecs, \
+    load_task_file
+
+
+TIMESTEP_S = 0.01
+
+
+class SineParticipant(Participant):
+
+    def __init__(self):
+        super().__init__("subject", Handle())
+
+    def get_action(self, visible_state):
+        self.handle.x = 0.3 * math.sin(3.0 * visible_state["tasktime"])
+        return self.handle.get_position()
+
+
+# More rows than one column chunk, with a decimated reference so that some
+# cells are left empty.
+def run_task(folder, data_format, codec=None):
+    task = MultiAgentTask("columns", TIMESTEP_S, datafolder=str(folder),
+                          duration=15.0, parameters={"k": 5.0})
+    handle = DynamicObject("handle", 0.0)
+    cursor = DynamicObject("cursor", 0.1)
+    task.add_obj(handle)
+    task.add_obj(cursor)
+    task.add_constraint(SpringLawSolid(cursor, handle, 5.0, 0.0))
+    task.add_ref(ReferenceTrajectory("sine",
+                                     trajectory_function=np.sin))
+    task.set_log_policy("sine", Decimate(7))
+    task.roles.append(Role(handle))
+    task.roles[0].assign(SineParticipant())
+
+    task.data_format = data_format
+    task.data_codec = codec
+    task.start()
+    while task.step(task.time) != task.TASK_COMPLETED:
+        pass
+    task.close()
+    return task.filename + ("" if data_format == "tsv" else ".maecol")
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_columns_match_text(tmp_path, codec):
+    (tmp_path / "tsv").mkdir()
+    (tmp_path / codec).mkdir()
+    text_name, text_parameters, text = load_task_file(
+        run_task(tmp_path / "tsv", "tsv"))
+    name, parameters, columns = load_task_file(
+        run_task(tmp_path / codec, "columns", codec))
+
+    assert name == text_name
+    assert parameters == text_parameters
+    assert list(columns) == list(text)
+    assert len(columns["tasktime"]) > 1024
+    for field in text:
+        assert np.array_equal(columns[field], text[field], equal_nan=True), \
+            field
+    assert np.isnan(columns["reference_sine_now"]).any()
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from multiagentexperiment import \
+    ConditionAND, \
+    ConditionOR, \
+    DynamicObject, \
+    InRangeForDuration, \
+    PositionThreshold
+from multiagentexperiment.conditionmonitor import ConditionMonitor
+
+
+TIMESTEP_S = 1.0 / 70.0
+
+
+def make_monitors(conditions):
+    scalar = ConditionMonitor(conditions,
+                              vectorize_threshold=len(conditions) + 1000)
+    vectorized = ConditionMonitor(conditions, vectorize_threshold=0)
+    assert not scalar.vectorized and vectorized.vectorized
+    return scalar, vectorized
+
+
+def record_changes(monitor):
+    changes = []
+    monitor.add_listener(lambda condition, state, tasktime:
+                         changes.append((id(condition), state, tasktime)))
+    return changes
+
+
+def test_scalar_and_vectorized_agree():
+    rng = np.random.default_rng(0)
+    objects = [DynamicObject("obj%d" % ndx, 0.0) for ndx in range(12)]
+
+    leaves = []
+    for ndx, obj in enumerate(objects):
+        leaves.append(PositionThreshold(obj, offset=rng.uniform(-0.5, 0.5),
+                                        check_greater=bool(ndx % 2)))
+        leaves.append(PositionThreshold(obj, offset=rng.uniform(-0.2, 0.2),
+                                        check_greater=bool(ndx % 3),
+                                        reference=objects[ndx - 1]))
+        leaves.append(InRangeForDuration(obj, upper_bound=0.3,
+                                         lower_bound=-0.3,
+                                         duration_s=(1 + ndx) * TIMESTEP_S))
+    conditions = leaves[:10] + [ConditionOR(leaves[10:20]),
+                                ConditionAND(leaves[20:25]),
+                                ConditionOR([ConditionAND(leaves[25:30]),
+                                             leaves[30]])]
+
+    scalar, vectorized = make_monitors(conditions)
+    scalar_changes = record_changes(scalar)
+    vectorized_changes = record_changes(vectorized)
+
+    tasktime = 0.0
+    for tick in range(2000):
+        tasktime += TIMESTEP_S
+        for obj in objects:
+            obj.state[0] = float(np.clip(obj.state[0]
+                                         + rng.normal(0.0, 0.05), -1.0, 1.0))
+        assert (scalar.update(tasktime, TIMESTEP_S)
+                == vectorized.update(tasktime, TIMESTEP_S))
+        assert scalar.leaf_results == vectorized.leaf_results
+
+    assert scalar_changes == vectorized_changes
+    assert len(scalar_changes) > 10
+
+
+@pytest.mark.parametrize("ticks", [1, 7, 70, 350])
+@pytest.mark.parametrize("vectorize", [False, True])
+def test_range_holds_for_whole_ticks(ticks, vectorize):
+    obj = DynamicObject("obj", 0.0, initial_state=[5.0, 0.0, 0.0])
+    condition = InRangeForDuration(obj, upper_bound=1.0, lower_bound=-1.0,
+                                   duration_s=ticks * TIMESTEP_S)
+    monitor = ConditionMonitor([condition],
+                               vectorize_threshold=0 if vectorize else 1000)
+
+    tasktime = 0.0
+    for tick in range(5):
+        tasktime += TIMESTEP_S
+        assert monitor.update(tasktime, TIMESTEP_S)[0] == [False]
+
+    obj.state[0] = 0.0
+    for tick in range(1, ticks + 3):
+        tasktime += TIMESTEP_S
+        results, changed = monitor.update(tasktime, TIMESTEP_S)
+        # true on the tick the position has been in range for ticks ticks
+        assert results == [tick >= ticks]
+        assert changed == (tick == ticks)
+
+    obj.state[0] = 2.0
+    tasktime += TIMESTEP_S
+    assert monitor.update(tasktime, TIMESTEP_S) == ([False], True)
@@ -0,0 +1,49 @@
+import pytest
+
+from multiagentexperiment import \
+    BindPosition, \
+    Damping, \
+    DynamicObject, \
+    PositionLimits
+from multiagentexperiment.constraintschedule import dependency_order
+
+
+def test_setters_run_before_readers():
+    a = DynamicObject("a", 0.0)
+    b = DynamicObject("b", 0.0)
+    c = DynamicObject("c", 0.0)
+    limit_c = PositionLimits(c, pos=0.5, reference=b)
+    bind_c = BindPosition(c, b)
+    bind_b = BindPosition(b, a)
+    damping = Damping(1.0, a)
+
+    order = dependency_order([limit_c, bind_c, bind_b, damping])
+    assert order.index(bind_b) < order.index(bind_c)
+    assert order.index(bind_c) < order.index(limit_c)
+    assert len(order) == 4
+
+
+def test_cycle_raises():
+    a = DynamicObject("a", 0.0)
+    b = DynamicObject("b", 0.0)
+    c = DynamicObject("c", 0.0)
+    constraints = [BindPosition(c, b), BindPosition(a, b),
+                   BindPosition(b, a), Damping(1.0, c)]
+
+    with pytest.raises(ValueError, match=r"BindPosition\(a\)"):
+        dependency_order(constraints)
+
+
+def test_mutual_clamps_keep_insertion_order():
+    a = DynamicObject("a", 0.0)
+    b = DynamicObject("b", 0.0)
+    c = DynamicObject("c", 0.0)
+    clamp_a = PositionLimits(a, pos=0.0, reference=b)
+    clamp_b = PositionLimits(b, neg=0.0, reference=a)
+    bind_a = BindPosition(a, c)
+
+    assert dependency_order([clamp_a, clamp_b]) == [clamp_a, clamp_b]
+    assert dependency_order([clamp_b, clamp_a]) == [clamp_b, clamp_a]
+    # the setter still runs before the clamps that read its object
+    assert dependency_order([clamp_a, clamp_b, bind_a]) == [bind_a, clamp_a,
+                                                             clamp_b]
@@ -0,0 +1,78 @@
+from multiagentexperiment import \
+    Decimate, \
+    OnChange
+from multiagentexperiment.datalogger import DataLogger
+
+
+FIELDS = ["taskstate", "tasktime", "experimenttime", "clocktime", "x", "y"]
+
+
+def log_ticks(logger, xs, events=()):
+    for tick, x in enumerate(xs):
+        logger.log({"taskstate": 1, "tasktime": tick,
+                    "experimenttime": tick, "clocktime": None,
+                    "x": x, "y": -x},
+                   event=tick in events)
+    logger.flush()
+
+
+def test_without_policies_every_row_is_written():
+    rows = []
+    logger = DataLogger(FIELDS, {}, rows.append, burst_before=2,
+                        burst_after=2)
+    log_ticks(logger, range(5))
+    assert [row["x"] for row in rows] == list(range(5))
+    assert all(set(row) == set(FIELDS) for row in rows)
+
+
+def test_decimate_leaves_other_columns_every_row():
+    rows = []
+    logger = DataLogger(FIELDS, {"x": Decimate(3)}, rows.append)
+    log_ticks(logger, range(7))
+
+    assert [row["y"] for row in rows] == [-x for x in range(7)]
+    assert [row.get("x") for row in rows] == [0, None, None, 3, None, None,
+                                              6]
+
+
+def test_rows_are_written_when_any_column_is_due():
+    rows = []
+    logger = DataLogger(FIELDS, {"x": Decimate(3), "y": Decimate(2)},
+                        rows.append)
+    log_ticks(logger, range(7))
+
+    assert [row["tasktime"] for row in rows] == [0, 2, 3, 4, 6]
+    assert [(row.get("x"), row.get("y")) for row in rows] == [
+        (0, 0), (None, -2), (3, None), (None, -4), (6, -6)]
+
+
+def test_on_change_writes_moves_beyond_tolerance():
+    rows = []
+    policies = {"x": OnChange(0.5), "y": OnChange(0.5)}
+    logger = DataLogger(FIELDS, policies, rows.append)
+    log_ticks(logger, [0.0, 0.2, 0.4, 0.6, 0.7, 1.2, 1.2])
+
+    # each value is compared to the last one written, not the last one seen
+    assert [row["x"] for row in rows] == [0.0, 0.6, 1.2]
+    assert [row["tasktime"] for row in rows] == [0, 3, 5]
+
+
+def test_burst_writes_all_columns_around_events():
+    rows = []
+    policies = {"x": Decimate(100), "y": Decimate(100)}
+    logger = DataLogger(FIELDS, policies, rows.append, burst_before=2,
+                        burst_after=1)
+    log_ticks(logger, range(12), events=(5,))
+
+    assert [row["x"] for row in rows] == [0, 3, 4, 5, 6]
+    assert all(set(row) == set(FIELDS) for row in rows)
+
+
+def test_burst_at_the_start_and_end():
+    rows = []
+    policies = {"x": Decimate(100), "y": Decimate(100)}
+    logger = DataLogger(FIELDS, policies, rows.append, burst_before=3,
+                        burst_after=2)
+    log_ticks(logger, range(8), events=(1, 7))
+
+    assert [row["x"] for row in rows] == [0, 1, 2, 3, 4, 5, 6, 7]
@@ -0,0 +1,60 @@
+import pytest
+
+from multiagentexperiment import \
+    BindPosition, \
+    Constraint, \
+    DynamicObject, \
+    PositionThreshold
+from multiagentexperiment.constraintschedule import dependency_order
+
+
+# Written against the former references list, without slots of its own.
+class FollowFirst(Constraint):
+
+    def __init__(self, target, reference):
+        super().__init__(target)
+        self.references = [reference]
+
+    def apply(self):
+        self.target.state[0] = self.references[0].state[0]
+
+
+class FollowAppended(FollowFirst):
+
+    def __init__(self, target, reference):
+        Constraint.__init__(self, target)
+        self.references.append(reference)
+
+
+@pytest.mark.parametrize("constraint_type", [FollowFirst, FollowAppended])
+def test_assigned_references_are_kept(constraint_type):
+    a = DynamicObject("a", 0.0, initial_state=[0.5, 0.0, 0.0])
+    b = DynamicObject("b", 0.0)
+    c = DynamicObject("c", 0.0)
+    follow = constraint_type(b, a)
+    bind = BindPosition(c, b)
+
+    assert follow.references == [a]
+    assert dependency_order([bind, follow]) == [follow, bind]
+    follow.apply()
+    assert b.state[0] == 0.5
+
+
+def test_assigning_references_sets_the_reference():
+    a = DynamicObject("a", 0.0, initial_state=[0.5, 0.0, 0.0])
+    b = DynamicObject("b", 0.0)
+    c = DynamicObject("c", 0.0, initial_state=[-1.0, 0.0, 0.0])
+    bind = BindPosition(b, a)
+    bind.references = [c]
+    bind.apply()
+    assert b.state[0] == -1.0
+
+    threshold = PositionThreshold(b, offset=0.0)
+    threshold.references = [a]
+    assert threshold.references == [a]
+    assert not threshold.check(0.0)
+    threshold.references = []
+    assert threshold.reference_state is None
+
+    with pytest.raises(ValueError):
+        bind.references = [a, c]
@@ -0,0 +1,216 @@
+import os
+
+import pytest
+
+from multiagentexperiment import \
+    DynamicObject, \
+    Handle, \
+    MultiAgentExperiment, \
+    MultiAgentTask, \
+    Participant, \
+    ReferenceTrajectory, \
+    Role, \
+    SessionJournal, \
+    StaircaseProcedure, \
+    TrackingError, \
+    TrialGenerator, \
+    analyze_sessions, \
+    load_session_journal, \
+    resume_trial_index
+from multiagentexperiment.journal import read_chunks
+
+
+TIMESTEP_S = 0.1
+
+
+# Tracks a flat reference with the handle held at the offset parameter, so the
+# rms tracking error of a trial is its offset.
+class OffsetTask(MultiAgentTask):
+
+    def __init__(self, name, offset, datafolder=None):
+        super().__init__(name, TIMESTEP_S, datafolder=datafolder,
+                         duration=0.5, parameters={"offset": offset})
+        handle = DynamicObject("handle", 0.0)
+        reference = ReferenceTrajectory("flat",
+                                        trajectory_function=lambda t: 0.0)
+        self.add_obj(handle)
+        self.add_ref(reference)
+        self.add_metric(TrackingError("tracking_error", handle, reference))
+        self.roles.append(Role(handle))
+
+    def get_state_dict(self):
+        state = super().get_state_dict()
+        state["offset"] = self.parameters["offset"]
+        return state
+
+
+class OffsetParticipant(Participant):
+
+    def __init__(self):
+        super().__init__("subject", Handle())
+
+    def get_action(self, visible_state):
+        self.handle.x = -visible_state.get("offset", 0.0)
+        return self.handle.get_position()
+
+
+class ListGenerator(TrialGenerator):
+
+    def __init__(self, offsets):
+        self.offsets = list(offsets)
+
+    def next_trial(self, experiment):
+        if not self.offsets:
+            return None
+        offset = self.offsets.pop(0)
+        return [OffsetTask("list-" + str(offset), offset)]
+
+
+class StaircaseExperiment(MultiAgentExperiment):
+
+    def __init__(self, prefix, resume_folder=None, generator=None,
+                 write_data=False):
+        super().__init__(prefix, record_participants=False,
+                         resume_folder=resume_folder)
+        self.finished = False
+        self.task_folder = self.datafolder if write_data else None
+
+        self.procedure.append([OffsetTask("first", 0.0, self.task_folder)])
+        if generator is None:
+            generator = StaircaseProcedure(
+                            self.make_trial,
+                            "tracking_error_rms",
+                            threshold=0.5,
+                            start=1.0,
+                            step_success=0.2,
+                            step_failure=-0.3,
+                            max_trials=6,
+                            reset_trial=self.make_reset_trial)
+        self.generator = generator
+        self.procedure.append(generator)
+        self.procedure.append([OffsetTask("last", 0.0, self.task_folder)])
+        self.participants.append(OffsetParticipant())
+
+    def make_trial(self, offset, number):
+        return [OffsetTask(str(number) + "-measure", offset,
+                           self.task_folder)]
+
+    def make_reset_trial(self, number):
+        return [OffsetTask(str(number) + "-reset", 0.0, self.task_folder)]
+
+    def run(self, max_steps=10000):
+        self.assign(verbose=False)
+        for step in range(max_steps):
+            if self.finished:
+                return
+            self.step(TIMESTEP_S)
+        raise AssertionError("the experiment did not complete")
+
+    # leaves the experiment as a crash would, with the journal synced
+    def crash_in(self, task_name):
+        self.assign(verbose=False)
+        while task_name not in [task.name for task in self.active_trial]:
+            self.step(TIMESTEP_S)
+        self.step(TIMESTEP_S)
+        self.journal.close()
+        self.prepare_executor.shutdown()
+
+    def completed(self):
+        super().completed()
+        self.finished = True
+
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    return tmp_path
+
+
+def trial_names(experiment):
+    return [task.name for trial in experiment.procedure
+            if not isinstance(trial, TrialGenerator) for task in trial]
+
+
+def test_resume_into_staircase(session_dir):
+    uninterrupted = StaircaseExperiment("uninterrupted")
+    uninterrupted.run()
+    assert len(uninterrupted.generator.history) == 6
+
+    crashed = StaircaseExperiment("crashed")
+    crashed.crash_in("3-measure")
+
+    resumed = StaircaseExperiment("resumed", resume_folder=crashed.datafolder)
+    # trial 0 is "first", then a measured and a reset trial per value
+    assert resumed.resume_trial == 7
+    resumed.run()
+
+    assert resumed.generator.history == uninterrupted.generator.history
+    assert resumed.generator.reversals == uninterrupted.generator.reversals
+    assert trial_names(resumed) == trial_names(uninterrupted)
+
+
+def test_resumed_session_analyzes_each_trial_once(session_dir):
+    crashed = StaircaseExperiment("crashed", write_data=True)
+    crashed.crash_in("3-measure")
+
+    resumed = StaircaseExperiment("resumed", resume_folder=crashed.datafolder,
+                                  write_data=True)
+    resumed.run()
+
+    recovered = os.listdir(os.path.join(crashed.datafolder, "recovered"))
+    assert [name.split("_")[0] for name in recovered] == ["3-measure"]
+
+    table = analyze_sessions([crashed.datafolder], cache_folder=None)
+    assert sorted(table["task"]) == sorted(trial_names(resumed))
+
+
+def test_resume_refuses_generator_without_state(session_dir):
+    crashed = StaircaseExperiment("crashed",
+                                  generator=ListGenerator([0.1, 0.2, 0.3]))
+    crashed.crash_in("list-0.2")
+
+    resumed = StaircaseExperiment("resumed",
+                                  resume_folder=crashed.datafolder,
+                                  generator=ListGenerator([0.1, 0.2, 0.3]))
+    with pytest.raises(ValueError):
+        resumed.assign(verbose=False)
+
+
+def write_journal(filename, chunks):
+    journal = SessionJournal(str(filename), sync_interval_s=60.0)
+    for records in chunks:
+        for record in records:
+            journal.append(record)
+        journal.sync()
+    journal.close()
+
+
+@pytest.mark.parametrize("damage", ["truncated", "corrupt"])
+def test_journal_drops_damaged_tail(tmp_path, damage):
+    filename = tmp_path / "session.journal"
+    intact = [[{"type": "trial_start", "trial": 0, "tasks": ["a"]}],
+              [{"type": "trial_end", "trial": 0, "tasks": {}}]]
+    write_journal(filename, intact)
+    intact_length = filename.stat().st_size
+    write_journal(filename, [[{"type": "trial_start", "trial": 1,
+                               "tasks": ["b"]}]])
+
+    data = filename.read_bytes()
+    if damage == "truncated":
+        data = data[:-5]
+    else:
+        data = data[:-5] + b"xxxxx"
+    filename.write_bytes(data)
+
+    records, length = read_chunks(data)
+    assert records == intact[0] + intact[1]
+    assert length == intact_length
+    assert load_session_journal(str(filename)) == records
+    assert resume_trial_index(records) == 1
+
+    # reopening for a resumed session drops the damaged chunk and appends
+    # after the intact ones
+    resumed = [{"type": "session"}]
+    write_journal(filename, [resumed])
+    assert load_session_journal(str(filename)) == records + resumed
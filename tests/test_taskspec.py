@@ -0,0 +1,114 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from multiagentexperiment import \
+    PDTrackerAgent, \
+    SimulatedParticipant, \
+    compile_task_spec, \
+    register_spec_type, \
+    register_trajectory
+
+# the example registers the trajectories and perspectives its spec names
+pytest.importorskip("pyglet")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "examples"))
+
+import asymsliderexperiment  # noqa: E402
+
+
+TIMESTEP_S = 1.0 / 70.0
+PARAMETERS = {"k": 5.0,
+              "p1_push": 0.5, "p1_pull": 1.0,
+              "p2_push": 1.0, "p2_pull": 0.5}
+
+
+def run_task(build, steps):
+    # the same reference trajectory for both builds
+    np.random.seed(0)
+    task = build()
+    agent = PDTrackerAgent(TIMESTEP_S, slots=2, seed=0)
+    for slot, role in enumerate(task.roles):
+        role.assign(SimulatedParticipant("p%d" % slot, agent, slot))
+
+    states = []
+    task.start()
+    for step in range(steps):
+        task.step(task.time)
+        states.append({obj.name: list(obj.state)
+                       for obj in task.dynamic_objects})
+    task.close()
+    return states, task.metric_results()
+
+
+def test_dyad_spec_matches_python_task():
+    steps = 700
+    python_states, python_metrics = run_task(
+        lambda: asymsliderexperiment.DyadAsymForceTrackingTask(
+            "dyad", TIMESTEP_S, None, 60.0, parameters=PARAMETERS),
+        steps)
+    spec_states, spec_metrics = run_task(
+        lambda: asymsliderexperiment.dyad_topology.instantiate(
+            "dyad", TIMESTEP_S, duration=60.0, parameters=PARAMETERS),
+        steps)
+
+    assert spec_states == python_states
+    assert spec_metrics == python_metrics
+    # the cursor has to have moved for the comparison to mean anything
+    assert any(state["cursor"][0] != 0.0 for state in spec_states)
+
+
+def test_registering_drops_compiled_specs():
+    spec = {"name": "swap",
+            "references": [{"name": "ref", "trajectory": "swap_test"}],
+            "objects": [{"name": "handle"}],
+            "roles": [{"handle": "handle"}]}
+
+    register_trajectory("swap_test", lambda: lambda t: 1.0)
+    first = compile_task_spec(spec)
+    assert compile_task_spec(spec) is first
+
+    register_trajectory("swap_test", lambda: lambda t: 2.0)
+    second = compile_task_spec(spec)
+    assert second is not first
+    reference = second.instantiate("swap", TIMESTEP_S).reference_trajectories
+    assert reference[0].trajectory_function(0.0) == 2.0
+
+    register_spec_type(asymsliderexperiment.HiddenObjectsPerspective)
+    assert compile_task_spec(spec) is not second
+
+
+def test_dyad_spec_writes_the_given_parameters():
+    python_task = asymsliderexperiment.DyadAsymForceTrackingTask(
+        "dyad", TIMESTEP_S, None, 60.0, parameters=dict(PARAMETERS))
+    spec_task = asymsliderexperiment.dyad_topology.instantiate(
+        "dyad", TIMESTEP_S, duration=60.0, parameters=PARAMETERS)
+    assert spec_task.parameters == python_task.parameters
+
+
+def test_changed_defaults_are_evaluated_again():
+    topology = asymsliderexperiment.dyad_topology
+
+    def contact(parameters):
+        task = topology.instantiate("dyad", TIMESTEP_S,
+                                    parameters=parameters)
+        objects = {obj.name: obj for obj in task.dynamic_objects}
+        offsets = [constraint.offset for constraint in task.pre_constraints]
+        return (objects["p1_self_contact"].appearance["radius"], offsets,
+                task.parameters)
+
+    radius, offsets, parameters = contact(PARAMETERS)
+    assert radius == 0.025
+    assert offsets == [-0.05, 0.05, 0.05, -0.05]
+    assert "obj_radius" not in parameters
+
+    radius, offsets, parameters = contact(dict(PARAMETERS, obj_radius=0.1))
+    assert radius == 0.05
+    assert offsets == [-0.1, 0.1, 0.1, -0.1]
+    assert parameters["obj_radius"] == 0.1
+
+    # a parameter given as its default is written but changes nothing
+    radius, offsets, parameters = contact(dict(PARAMETERS, obj_radius=0.05))
+    assert radius == 0.025
+    assert parameters["obj_radius"] == 0.05
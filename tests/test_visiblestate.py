@@ -0,0 +1,164 @@
+import copy
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from multiagentexperiment import \
+    DynamicObject, \
+    FlippedPerspective, \
+    Handle, \
+    MultiAgentTask, \
+    Participant, \
+    Perspective, \
+    ReferenceTrajectory, \
+    Role, \
+    SpringLawSolid
+
+
+TIMESTEP_S = 0.01
+
+
+# Keeps a copy of the last view the wrapped perspective handed to the
+# encoder.
+class RecordingPerspective(Perspective):
+
+    def __init__(self, perspective):
+        self.perspective = perspective
+        self.view = None
+
+    def task_to_handle(self, force):
+        return self.perspective.task_to_handle(force)
+
+    def handle_to_task(self, position):
+        return self.perspective.handle_to_task(position)
+
+    def task_to_view(self, task_state):
+        view = self.perspective.task_to_view(task_state)
+        self.view = copy.deepcopy(view)
+        return view
+
+
+class RecordingParticipant(Participant):
+
+    def __init__(self, name, phase):
+        super().__init__(name, Handle())
+        self.phase = phase
+        self.states = []
+
+    def get_action(self, visible_state):
+        self.states.append(copy.deepcopy(visible_state))
+        self.handle.x = 0.3 * math.sin(3.0 * visible_state["tasktime"]
+                                       + self.phase)
+        return self.handle.get_position()
+
+
+# Hides an object, a field of an object, the references and all objects in
+# turn, and shows a message part of the time, so that keys are removed from
+# and added back to the decoded state.
+class ChangingPerspective(FlippedPerspective):
+
+    def task_to_view(self, task_state):
+        view = super().task_to_view(task_state)
+        phase = int(round(view["tasktime"] / TIMESTEP_S)) // 40 % 4
+        if phase == 1:
+            del view["dynamic_objects"]["cursor"]
+            view["task_message"] = "hold"
+        elif phase == 2:
+            del view["dynamic_objects"]["h0"]["appearance"]
+            del view["reference_trajectories"]
+        elif phase == 3:
+            del view["dynamic_objects"]
+            view["task_message"] = "release"
+        return view
+
+
+def assert_same(decoded, view):
+    if isinstance(view, dict):
+        assert isinstance(decoded, dict)
+        assert sorted(decoded) == sorted(view)
+        for key in view:
+            assert_same(decoded[key], view[key])
+    elif isinstance(view, (list, tuple, np.ndarray)):
+        assert len(decoded) == len(view)
+        for decoded_item, view_item in zip(decoded, view):
+            assert_same(decoded_item, view_item)
+    else:
+        assert decoded == view
+
+
+# Runs the task with a recording participant in every role and checks the
+# state each participant decoded against the view of its perspective.
+def run_task(task, ticks):
+    perspectives = []
+    participants = []
+    for ndx, role in enumerate(task.roles):
+        role.perspective = RecordingPerspective(role.perspective)
+        role.assign(RecordingParticipant("p%d" % ndx, ndx))
+        perspectives.append(role.perspective)
+        participants.append(role.participant)
+
+    task.start()
+    for tick in range(ticks):
+        task.step(task.time)
+        for perspective, participant in zip(perspectives, participants):
+            assert_same(participant.states[-1], perspective.view)
+    task.close()
+    return participants
+
+
+def test_decoded_state_matches_each_perspective():
+    task = MultiAgentTask("view", TIMESTEP_S, duration=10.0)
+    handles = [DynamicObject("h%d" % ndx, 0.0,
+                             appearance={"shape": "circle", "radius": 0.05})
+               for ndx in range(3)]
+    cursor = DynamicObject("cursor", 0.1,
+                           appearance={"shape": "circle", "radius": 0.1})
+    for handle in handles:
+        task.add_obj(handle)
+        task.add_constraint(SpringLawSolid(cursor, handle, 5.0, 0.0))
+    task.add_obj(cursor)
+    task.add_ref(ReferenceTrajectory("sine", trajectory_function=np.sin))
+    task.roles.append(Role(handles[0]))
+    task.roles.append(Role(handles[1], perspective=FlippedPerspective()))
+    task.roles.append(Role(handles[2], perspective=ChangingPerspective()))
+
+    participants = run_task(task, 400)
+
+    states = participants[2].states
+    assert any("task_message" not in state for state in states[40:])
+    assert any("dynamic_objects" not in state for state in states)
+    assert any("reference_trajectories" not in state for state in states)
+    # the reference window scrolled and the cursor moved
+    windows = [state["reference_trajectories"]["sine"]["timesteps"][0]
+               for state in participants[0].states]
+    assert len(set(windows)) > 10
+    assert any(state["dynamic_objects"]["cursor"]["state"][0] != 0.0
+               for state in participants[1].states)
+
+
+def test_decoded_state_matches_the_dyad_perspectives():
+    # the example registers the trajectories and perspectives its spec names
+    pytest.importorskip("pyglet")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..",
+                                    "examples"))
+    import asymsliderexperiment
+
+    np.random.seed(0)
+    task = asymsliderexperiment.dyad_topology.instantiate(
+        "dyad", TIMESTEP_S, duration=10.0,
+        parameters={"k": 5.0, "p1_push": 0.5, "p1_pull": 1.0,
+                    "p2_push": 1.0, "p2_pull": 0.5})
+    assert [type(role.perspective) for role in task.roles] == [
+        asymsliderexperiment.HiddenObjectsPerspective,
+        asymsliderexperiment.FlippedHiddenObjectsPerspective]
+
+    participants = run_task(task, 400)
+
+    # each role hides the handle the other participant draws
+    for participant, hidden in zip(participants, ["p2_handle_draw",
+                                                  "p1_handle_draw"]):
+        assert all(hidden not in state["dynamic_objects"]
+                   for state in participant.states)